@@ -0,0 +1,99 @@
+"""Batch question mode: throughput of my_agent.batch versus one graph.invoke per question.
+
+Replays the offline corpus (benchmarks/corpus.json and its cassette) against the
+seeded dataset, with every question asked BENCH_REPEATS times, as nightly batches
+repeat common questions, along with benchmarks/corpus_paraphrases.json: the same
+questions worded differently, which share their queries but not their text.
+Answers the batch one question at a time with graph.invoke, then with run_batch at
+concurrency 1 (sharing work only) and at BENCH_CONCURRENCY, and reports questions
+per minute, LLM calls and the work shared between questions. Exits with status 1
+when the paraphrases share no step with the questions they reword. Usage:
+
+    python benchmarks/bench_batch.py
+
+The paraphrases are recorded into the cassette like the corpus:
+
+    BENCH_MODE=script BENCH_CORPUS=benchmarks/corpus_paraphrases.json python benchmarks/bench_offline.py
+"""
+import asyncio
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("QUERY_CACHE_MAXSIZE", "0")
+
+import mongomock  # noqa: E402
+
+from benchmarks.cassettes import Cassette, cassette_factory  # noqa: E402
+from benchmarks.dataset import seed_database  # noqa: E402
+from benchmarks.fakes import FakeAsyncClient  # noqa: E402
+from my_agent.utils import models, mongo  # noqa: E402
+from my_agent.utils.instrumentation import Instrumentation  # noqa: E402
+from my_agent.utils.schemas import load_schema_registry  # noqa: E402
+
+HERE = os.path.dirname(__file__)
+REPEATS = int(os.environ.get("BENCH_REPEATS", 4))
+CONCURRENCY = int(os.environ.get("BENCH_CONCURRENCY", 8))
+REPLAY_LATENCY = float(os.environ.get("BENCH_REPLAY_LATENCY", 0.2))
+
+
+def _llm_calls(recorder: Instrumentation) -> int:
+    return sum(stats["count"] for (kind, _), stats in recorder.stats().items() if kind == "llm")
+
+
+def main():
+    corpus = []
+    for name in ("corpus.json", "corpus_paraphrases.json"):
+        with open(os.path.join(HERE, name)) as f:
+            corpus += json.load(f)
+    questions = [{"id": f"{entry['id']}-{i}", "question": entry["question"]} for i in range(REPEATS) for entry in corpus]
+    cassette = Cassette(os.path.join(HERE, "cassettes", "offline.json"))
+    db = mongomock.MongoClient().abraham_baldwin
+    seed_database(db, load_schema_registry())
+    mongo.set_client_factory(lambda: db.client)
+    mongo.set_async_client_factory(lambda: FakeAsyncClient(db, 0))
+    models.set_chat_model_factory(cassette_factory(cassette, latency_scale=REPLAY_LATENCY))
+    from my_agent import agent, batch
+
+    recorder = Instrumentation(enabled=True)
+    agent.instrumentation = recorder
+    graph = recorder.instrument(agent.builder.compile())
+    agent.rollup_store.refresh()
+
+    start = time.perf_counter()
+    for entry in questions:
+        cassette.rewind()
+        agent.get_response_cache().backend.clear()
+        graph.invoke({"messages": [("user", entry["question"])]})
+    sequential = time.perf_counter() - start
+    sequential_calls = _llm_calls(recorder)
+    print(
+        f"{len(questions)} questions one at a time: {sequential:.1f}s, "
+        f"{len(questions) / sequential * 60:.0f} questions/min, {sequential_calls} LLM calls"
+    )
+
+    failures = []
+    for concurrency in (1, CONCURRENCY):
+        recorder.reset()
+        agent.get_response_cache().backend.clear()
+        output = io.StringIO()
+        report = asyncio.run(batch.run_batch(questions, output, concurrency, graph=graph))
+        answers = [json.loads(line) for line in output.getvalue().splitlines()]
+        assert len(answers) == len(questions) and not report["errors"], report
+        print(
+            f"batch, concurrency {concurrency}: {report['seconds']:.1f}s, {report['questions_per_minute']:.0f} questions/min "
+            f"({sequential / report['seconds']:.1f}x), {_llm_calls(recorder)} LLM calls, "
+            f"{report['unique_questions']} unique questions, shared {report['shared']}"
+        )
+        if not report["shared"]:
+            failures.append(f"concurrency {concurrency}: paraphrased questions shared no step")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
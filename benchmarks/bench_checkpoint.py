@@ -0,0 +1,151 @@
+"""Checkpoint write/read latency and on-disk size over long threads: full snapshots versus deltas.
+
+Runs BENCH_THREADS threads of BENCH_TURNS turns through the graph, cycling
+through the offline corpus questions against the seeded dataset, with an instant
+fake model. It does this once with a saver that stores every checkpoint in full,
+and once with DeltaSQLiteSaver. Reports put and read latencies, the database
+size on disk, and a cold read of each thread's latest state from a new saver on
+the same file. A last run applies a retention of BENCH_KEEP_LAST checkpoints. Usage:
+
+    python benchmarks/bench_checkpoint.py
+"""
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("QUERY_CACHE_MAXSIZE", "0")
+
+import mongomock  # noqa: E402
+
+from benchmarks.dataset import seed_database  # noqa: E402
+from benchmarks.fakes import FakeChatModel, corpus_policy  # noqa: E402
+from my_agent.utils import models, mongo  # noqa: E402
+from my_agent.utils.checkpoint import DeltaSQLiteSaver  # noqa: E402
+from my_agent.utils.schemas import load_schema_registry  # noqa: E402
+
+THREADS = int(os.environ.get("BENCH_THREADS", 3))
+TURNS = int(os.environ.get("BENCH_TURNS", 30))
+KEEP_LAST = int(os.environ.get("BENCH_KEEP_LAST", 50))
+READS = 20
+
+
+class FullSnapshotSaver(DeltaSQLiteSaver):
+    """Stores every channel value and write in full and uncompressed, like savers without deltas."""
+
+    def _encode(self, value):
+        type_, data = self.serde.dumps_typed(value)
+        return type_, b"r" + data
+
+    def _put_channel(self, thread_id, checkpoint_ns, channel, version, value, empty):
+        type_, data = ("empty", b"") if empty else self._encode(value)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO channel_values (thread_id, checkpoint_ns, channel, version, type, value, base, depth) "
+            "VALUES (?, ?, ?, ?, ?, ?, NULL, 0)",
+            (thread_id, checkpoint_ns, channel, str(version), type_, data),
+        )
+
+
+def _timed(method, timings: list):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            timings.append(time.perf_counter() - start)
+
+    return wrapper
+
+
+def _size(path: str) -> int:
+    return sum(os.path.getsize(p) for p in (path, f"{path}-wal") if os.path.exists(p))
+
+
+def _ms(values: list[float], q: float) -> float:
+    return sorted(values)[min(len(values) - 1, int(q * len(values)))] * 1000
+
+
+def run(agent, corpus, saver_class, path: str, **kwargs) -> dict:
+    saver = saver_class(path, **kwargs)
+    puts, reads = [], []
+    saver.put = _timed(saver.put, puts)
+    graph = agent.builder.compile(checkpointer=saver)
+    start = time.perf_counter()
+    for turn in range(TURNS):
+        for thread in range(THREADS):
+            agent.get_response_cache().backend.clear()
+            question = corpus[(turn + thread) % len(corpus)]["question"]
+            graph.invoke({"messages": [("user", question)]}, {"configurable": {"thread_id": f"thread-{thread}"}})
+    elapsed = time.perf_counter() - start
+    saver._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    stats = saver.stats()
+    messages = len(graph.get_state({"configurable": {"thread_id": "thread-0"}}).values["messages"])
+    for _ in range(READS):
+        for thread in range(THREADS):
+            config = {"configurable": {"thread_id": f"thread-{thread}"}}
+            start_read = time.perf_counter()
+            saver.get_tuple(config)
+            reads.append(time.perf_counter() - start_read)
+    saver.close()
+
+    # A new process: no caches
+    cold_saver = saver_class(path, **kwargs)
+    start_cold = time.perf_counter()
+    cold = cold_saver.get_tuple({"configurable": {"thread_id": "thread-0"}})
+    cold_read = time.perf_counter() - start_cold
+    assert len(cold.checkpoint["channel_values"]["messages"]) == messages
+    cold_saver.close()
+    return {
+        "turns_per_s": TURNS * THREADS / elapsed,
+        "puts": len(puts),
+        "put_p50": _ms(puts, 0.5),
+        "put_p95": _ms(puts, 0.95),
+        "read_p50": statistics.median(reads) * 1000,
+        "cold_read": cold_read * 1000,
+        "messages": messages,
+        "bytes": _size(path),
+        "stats": stats,
+    }
+
+
+def main():
+    with open(os.path.join(os.path.dirname(__file__), "corpus.json")) as f:
+        corpus = json.load(f)
+    db = mongomock.MongoClient().abraham_baldwin
+    seed_database(db, load_schema_registry())
+    mongo.set_client_factory(lambda: db.client)
+    model = FakeChatModel(policy=corpus_policy(corpus))
+    models.set_chat_model_factory(lambda **kwargs: model)
+    from my_agent import agent
+
+    agent.rollup_store.refresh()
+    print(f"{THREADS} threads x {TURNS} turns, instant fake model")
+    with tempfile.TemporaryDirectory() as tmp:
+        runs = [
+            ("full snapshots", FullSnapshotSaver, {"keep_last": 0}),
+            ("deltas", DeltaSQLiteSaver, {"keep_last": 0}),
+            (f"deltas, keep last {KEEP_LAST}", DeltaSQLiteSaver, {"keep_last": KEEP_LAST}),
+        ]
+        results = {}
+        for name, saver_class, kwargs in runs:
+            result = results[name] = run(agent, corpus, saver_class, os.path.join(tmp, f"{len(results)}.db"), **kwargs)
+            stats = result["stats"]
+            print(
+                f"{name:24s} {result['bytes'] / 2**20:7.2f}MB on disk, {stats['checkpoints']:4d} checkpoints, "
+                f"put p50 {result['put_p50']:5.2f}ms p95 {result['put_p95']:5.2f}ms, "
+                f"read p50 {result['read_p50']:5.2f}ms, cold read {result['cold_read']:6.2f}ms "
+                f"({result['messages']} messages), {result['turns_per_s']:.1f} turns/s"
+            )
+        full, delta = results["full snapshots"], results["deltas"]
+        stats = delta["stats"]
+        print(
+            f"\ndeltas use {delta['bytes'] / full['bytes']:.1%} of the space; {stats['blobs']} blobs, "
+            f"{stats['blob_bytes'] / 2**20:.2f}MB raw, {stats['blob_stored_bytes'] / 2**20:.2f}MB compressed"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Throughput of concurrent graph runs: sync graph.invoke on worker threads versus graph.ainvoke.
+
+The LLM and the database are fakes with fixed latencies, so the numbers show how
+many runs the process can keep in flight rather than model or server speed.
+Usage:
+
+    python benchmarks/bench_concurrency.py
+"""
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+# Every run should reach the (fake) database.
+os.environ.setdefault("QUERY_CACHE_MAXSIZE", "0")
+
+import mongomock  # noqa: E402
+
+from benchmarks.fakes import FakeAsyncClient, FakeChatModel, FakeClient  # noqa: E402
+from my_agent.utils import models, mongo  # noqa: E402
+
+LLM_LATENCY = float(os.environ.get("BENCH_LLM_LATENCY", 0.2))
+DB_LATENCY = float(os.environ.get("BENCH_DB_LATENCY", 0.05))
+# Worker threads available to sync runs, like a server's thread pool.
+SYNC_WORKERS = int(os.environ.get("BENCH_SYNC_WORKERS", 10))
+QUESTION = {"messages": [("user", "How many rooms are there?")]}
+
+
+def _setup():
+    db = mongomock.MongoClient().abraham_baldwin
+    db.rooms.insert_many([{"name": f"R{i}"} for i in range(25)])
+    models.set_chat_model_factory(lambda **kwargs: FakeChatModel(latency=LLM_LATENCY))
+    mongo.set_client_factory(lambda: FakeClient(db, DB_LATENCY))
+    mongo.set_async_client_factory(lambda: FakeAsyncClient(db, DB_LATENCY))
+    from my_agent.agent import graph
+
+    return graph
+
+
+def _sync(graph, runs: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(runs, SYNC_WORKERS)) as pool:
+        list(pool.map(lambda _: graph.invoke(QUESTION), range(runs)))
+    return time.perf_counter() - start
+
+
+def _async(graph, runs: int) -> float:
+    async def run():
+        start = time.perf_counter()
+        await asyncio.gather(*(graph.ainvoke(QUESTION) for _ in range(runs)))
+        return time.perf_counter() - start
+
+    return asyncio.run(run())
+
+
+def main():
+    graph = _setup()
+    print(f"fake LLM {LLM_LATENCY * 1000:.0f}ms, fake DB {DB_LATENCY * 1000:.0f}ms, {SYNC_WORKERS} sync workers")
+    for runs in (1, 10, 100):
+        sync_elapsed = _sync(graph, runs)
+        async_elapsed = _async(graph, runs)
+        print(
+            f"{runs:4d} parallel runs  sync {runs / sync_elapsed:7.1f} runs/s ({sync_elapsed:6.2f}s)  "
+            f"async {runs / async_elapsed:7.1f} runs/s ({async_elapsed:6.2f}s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
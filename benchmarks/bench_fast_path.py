@@ -0,0 +1,88 @@
+"""Sequential LLM round trips and latency per question: the agent loop versus the fused fast path.
+
+Runs every question of the offline corpus through the graph twice, against the
+seeded dataset with every model call replayed from the offline cassette: once
+with the fast path off, so the question walks the agent loop with an assistant
+turn between each tool, and once with it on. Sequential round trips count the
+model calls that had to wait for every earlier call to finish; calls made while
+another is in flight (the speculative query draft next to LLM routing) do not add
+one. Usage:
+
+    python benchmarks/bench_fast_path.py                    # replay the cassette
+    BENCH_MODE=script python benchmarks/bench_fast_path.py  # record both variants from the scripted fake model
+
+BENCH_MODE and BENCH_REPLAY_LATENCY work as in bench_offline.py.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("QUERY_CACHE_MAXSIZE", "0")
+
+import mongomock  # noqa: E402
+
+from benchmarks.bench_offline import CASSETTE, CORPUS, MODE, SEED, _factory, _load, run_question  # noqa: E402
+from benchmarks.cassettes import Cassette  # noqa: E402
+from benchmarks.dataset import seed_database  # noqa: E402
+from my_agent.utils import models, mongo  # noqa: E402
+from my_agent.utils.instrumentation import Instrumentation  # noqa: E402
+from my_agent.utils.schemas import load_schema_registry  # noqa: E402
+
+
+def round_trips(recorder: Instrumentation) -> int:
+    """Model calls that started once every earlier model call had finished."""
+    spans = [
+        span for scope in recorder.export_spans()["resourceSpans"][0]["scopeSpans"] for span in scope["spans"]
+        if span["name"].startswith("llm ")
+    ]
+    trips, last_end = 0, 0
+    for span in sorted(spans, key=lambda span: int(span["startTimeUnixNano"])):
+        if int(span["startTimeUnixNano"]) >= last_end:
+            trips += 1
+        last_end = max(last_end, int(span["endTimeUnixNano"]))
+    return trips
+
+
+def main():
+    corpus = _load(CORPUS)
+    cassette = Cassette(CASSETTE)
+    db = mongomock.MongoClient().abraham_baldwin
+    seed_database(db, load_schema_registry(), seed=SEED)
+    mongo.set_client_factory(lambda: db.client)
+    models.set_chat_model_factory(_factory(corpus, cassette))
+    from my_agent import agent
+
+    recorder = Instrumentation(enabled=True)
+    agent.instrumentation = recorder
+    graph = recorder.instrument(agent.builder.compile())
+    agent.rollup_store.refresh()
+
+    print(f"mode {MODE}, {len(corpus)} questions")
+    print(f"{'':24s} {'agent loop':>30s}   {'fast path':>30s}")
+    totals = {"loop": [0, 0, 0.0], "fast": [0, 0, 0.0]}
+    for entry in corpus:
+        row = []
+        for variant, enabled in (("loop", False), ("fast", True)):
+            agent.FAST_PATH = enabled
+            result, _ = run_question(agent, graph, recorder, cassette, entry["question"])
+            trips = round_trips(recorder)
+            for i, value in enumerate((result["llm_calls"], trips, result["latency_ms"])):
+                totals[variant][i] += value
+            row.append(f"{result['llm_calls']:2d} calls {trips:2d} trips {result['latency_ms']:8.1f}ms")
+        print(f"{entry['id']:24s} {row[0]:>30s}   {row[1]:>30s}")
+    agent.FAST_PATH = True
+    if MODE != "replay":
+        cassette.save()
+        print(f"\nrecorded {sum(len(responses) for responses in cassette.entries.values())} responses to {CASSETTE}")
+        return
+
+    loop, fast = totals["loop"], totals["fast"]
+    print(
+        f"\ntotal: agent loop {loop[0]} calls, {loop[1]} sequential round trips, {loop[2]:.0f}ms; "
+        f"fast path {fast[0]} calls, {fast[1]} sequential round trips, {fast[2]:.0f}ms "
+        f"({loop[2] / fast[2]:.1f}x faster)"
+    )
+
+
+if __name__ == "__main__":
+    main()
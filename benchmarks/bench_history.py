@@ -0,0 +1,94 @@
+"""Prompt size and latency over a synthetic 50-turn session, full history versus HistoryCompactor.
+
+Every turn asks a question, runs one query that returns 30 course documents and
+answers. Model latency is modeled as a fixed overhead plus a prefill cost per
+prompt token (BENCH_LLM_LATENCY, BENCH_PREFILL_MS_PER_1K). Usage:
+
+    python benchmarks/bench_history.py
+"""
+import json
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage  # noqa: E402
+
+from my_agent.utils.compaction import HistoryCompactor  # noqa: E402
+from my_agent.utils.tokens import count_tokens  # noqa: E402
+
+TURNS = int(os.environ.get("BENCH_TURNS", 50))
+LLM_LATENCY = float(os.environ.get("BENCH_LLM_LATENCY", 0.2))
+PREFILL_MS_PER_1K = float(os.environ.get("BENCH_PREFILL_MS_PER_1K", 25))
+
+
+def _turn(i: int) -> list:
+    documents = [
+        {"course_id": f"C{i}-{j}", "name": f"Course {j}", "department": "Mathematics", "credits": 3, "enrolled": j * 7}
+        for j in range(30)
+    ]
+    payload = json.dumps({"results": documents, "returned": 30, "total": 120, "more_available": True})
+    call_id = f"call_{i}"
+    return [
+        HumanMessage(content=f"Which math courses are in block {i}?", id=str(uuid.uuid4())),
+        AIMessage(
+            content="",
+            tool_calls=[{"name": "execute_pymongo", "args": {"query": f"db.courses.find({{'block': {i}}})"}, "id": call_id}],
+            id=str(uuid.uuid4()),
+        ),
+        ToolMessage(content=payload, name="execute_pymongo", tool_call_id=call_id, id=str(uuid.uuid4())),
+        AIMessage(content=f"There are 120 math courses in block {i}; here are the first 30.", id=str(uuid.uuid4())),
+    ]
+
+
+def _full_count(messages) -> int:
+    total = 0
+    for message in messages:
+        text = str(message.content)
+        if getattr(message, "tool_calls", None):
+            text += json.dumps([call["args"] for call in message.tool_calls])
+        total += count_tokens(text)
+    return total
+
+
+def main():
+    compactor = HistoryCompactor()
+    history = []
+    rows = []
+    for i in range(TURNS):
+        history.extend(_turn(i))
+        # The assistant is prompted twice per turn: for the tool call and for the answer.
+        for prompt in (history[:-2], history[:-1]):
+            start = time.perf_counter()
+            full = _full_count(prompt)
+            full_count_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            compacted = compactor.compact(prompt)
+            tokens = compactor.tokens(compacted)
+            compact_time = time.perf_counter() - start
+            rows.append((i + 1, full, tokens, full_count_time, compact_time))
+
+    def latency(tokens):
+        return LLM_LATENCY + tokens / 1000 * PREFILL_MS_PER_1K / 1000
+
+    print(f"budget={compactor.budget} tokens, keep_turns={compactor.keep_turns}")
+    print(f"{'turn':>4s} {'full tokens':>12s} {'compacted':>10s} {'full latency':>13s} {'compacted':>10s}")
+    for turn, full, tokens, _, _ in rows[1::2]:
+        if turn in (1, 5, 10, 20, 30, 40, 50) or turn == TURNS:
+            print(f"{turn:4d} {full:12d} {tokens:10d} {latency(full) * 1000:11.0f}ms {latency(tokens) * 1000:8.0f}ms")
+
+    total_full = sum(row[1] for row in rows)
+    total_compacted = sum(row[2] for row in rows)
+    print(f"session prompt tokens: full {total_full}, compacted {total_compacted} "
+          f"({100 * (1 - total_compacted / total_full):.0f}% fewer)")
+    print(f"session model latency: full {sum(latency(r[1]) for r in rows):.1f}s, "
+          f"compacted {sum(latency(r[2]) for r in rows):.1f}s")
+    print(f"token counting per prompt at turn {TURNS}: recount {rows[-1][3] * 1000:.2f}ms, "
+          f"incremental compaction {rows[-1][4] * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Index advisor: scan guard, profiling overhead and index recommendations on mongomock.
+
+Runs a corpus of generated queries through the execute_pymongo tool against courses and
+rooms collections, prints what the scan guard did with each, the advisor's report
+and recommended indexes, then creates those indexes and runs the corpus again.
+mongomock cannot explain queries, so index usage is estimated from its indexes;
+a canned MongoDB explain output checks the parser. Usage:
+
+    python benchmarks/bench_index_advisor.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("QUERY_CACHE_MAXSIZE", "0")
+
+import mongomock  # noqa: E402
+
+from benchmarks.fakes import FakeChatModel  # noqa: E402
+from my_agent.utils import models, mongo  # noqa: E402
+from my_agent.utils.index_advisor import IndexAdvisor, parse_explain, render_report  # noqa: E402
+
+COURSES = int(os.environ.get("BENCH_COURSES", 20000))
+ROOMS = int(os.environ.get("BENCH_ROOMS", 2000))
+SCAN_LIMIT = int(os.environ.get("BENCH_SCAN_LIMIT", 10000))
+RUNS = 5
+OVERHEAD_RUNS = 2000
+QUERIES = [
+    "db.courses.find({'subjectCode': 'BIO', 'status': 'active'}).sort('courseNumber', 1)",
+    "db.courses.find({'subjectCode': 'CHEM', 'status': 'active'}).sort('courseNumber', 1)",
+    "db.courses.find({'sections.instructor': 'P7'})",
+    "db.courses.count_documents({'college': 'College 3'})",
+    "db.courses.aggregate([{'$match': {'status': 'active'}}, {'$group': {'_id': '$college', 'n': {'$sum': 1}}}])",
+    "db.courses.find_one({'code': 'BIO 101'})",
+    "db.rooms.find({'capacity': {'$gte': 100}, 'campus': 'Main'})",
+    "db.rooms.count_documents({'campus': 'North'})",
+]
+# A trimmed find explain from MongoDB 7 with executionStats verbosity.
+MONGODB_EXPLAIN = {
+    "queryPlanner": {"winningPlan": {"stage": "SORT", "inputStage": {"stage": "COLLSCAN", "direction": "forward"}}},
+    "executionStats": {"nReturned": 41, "executionTimeMillis": 212, "totalKeysExamined": 0, "totalDocsExamined": 250000},
+}
+
+
+def _dataset(db) -> None:
+    subjects = ["BIO", "CHEM", "MATH", "HIST", "ENG"]
+    db.courses.insert_many([
+        {
+            "code": f"{subjects[i % 5]} {100 + i}",
+            "subjectCode": subjects[i % 5],
+            "courseNumber": str(100 + i),
+            "status": "active" if i % 3 else "inactive",
+            "college": f"College {i % 8}",
+            "sections": [{"instructor": f"P{i % 400}"}],
+        }
+        for i in range(COURSES)
+    ])
+    db.rooms.insert_many([
+        {"name": f"R{i}", "capacity": 10 * (i % 30), "campus": ["Main", "North", "South"][i % 3]} for i in range(ROOMS)
+    ])
+
+
+def run_corpus(agent, db) -> tuple[float, list[str]]:
+    outcomes = []
+    start = time.perf_counter()
+    for query in QUERIES:
+        output = agent.execute_pymongo(query)
+        if '"warning": ' in output:
+            outcomes.append("limited")
+        elif output.startswith("Query blocked"):
+            outcomes.append("blocked")
+        else:
+            outcomes.append("ran")
+    return time.perf_counter() - start, outcomes
+
+
+def main():
+    explained = parse_explain(MONGODB_EXPLAIN)
+    assert explained.collscan and explained.docs_examined == 250000 and explained.returned == 41
+    print(f"parsed MongoDB explain: {explained}")
+
+    db = mongomock.MongoClient().abraham_baldwin
+    _dataset(db)
+    mongo.set_client_factory(lambda: db.client)
+    models.set_chat_model_factory(lambda **kwargs: FakeChatModel())
+    from my_agent import agent
+
+    agent.tenants.default.index_advisor = advisor = IndexAdvisor(scan_limit=SCAN_LIMIT)
+    elapsed, outcomes = run_corpus(agent, db)
+    print(f"\n{COURSES} courses, {ROOMS} rooms, scan limit {SCAN_LIMIT}: corpus took {elapsed * 1000:.0f}ms")
+    for query, outcome in zip(QUERIES, outcomes):
+        print(f"  {outcome:8s} {query}")
+
+    for _ in range(RUNS - 1):
+        run_corpus(agent, db)
+    report = advisor.report({name: db[name].index_information() for name in ("courses", "rooms")})
+    print()
+    print(render_report(report))
+
+    # Overhead of guarding and profiling once every shape has been explained.
+    plans = [agent.query_compiler.compile(query) for query in QUERIES]
+    advisor = IndexAdvisor(action="off")
+    for plan in plans:
+        advisor.record(advisor.guard(plan, db)[0], db, 0.0)
+    start = time.perf_counter()
+    for _ in range(OVERHEAD_RUNS):
+        for plan in plans:
+            advisor.record(advisor.guard(plan, db)[0], db, 0.0)
+    overhead = (time.perf_counter() - start) / (OVERHEAD_RUNS * len(plans))
+    print(f"\nguard + record per query once explained: {overhead * 1e6:.1f}us")
+
+    for recommendation in report["recommendations"]:
+        db[recommendation["collection"]].create_index([tuple(key) for key in recommendation["keys"]])
+    agent.tenants.default.index_advisor = advisor = IndexAdvisor(scan_limit=SCAN_LIMIT)
+    _, outcomes = run_corpus(agent, db)
+    report = advisor.report({name: db[name].index_information() for name in ("courses", "rooms")})
+    print(f"\nafter creating the recommended indexes: {outcomes.count('ran')}/{len(QUERIES)} ran unguarded")
+    print(render_report(report))
+    assert outcomes.count("ran") == len(QUERIES) and not report["recommendations"]
+
+
+if __name__ == "__main__":
+    main()
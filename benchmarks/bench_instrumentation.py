@@ -0,0 +1,88 @@
+"""Overhead of per-node, tool and model instrumentation on a full graph turn.
+
+Runs the same question through the graph with and without the instrumentation
+callback, alternating, with a fake model answering after BENCH_LLM_LATENCY
+seconds, and compares the median turn time. Also reports the cost per recorded
+span with an instant model, the metrics and a sample of the exported spans. Usage:
+
+    python benchmarks/bench_instrumentation.py
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("QUERY_CACHE_MAXSIZE", "0")
+
+import mongomock  # noqa: E402
+
+from benchmarks.fakes import FakeChatModel, pipeline_policy  # noqa: E402
+from my_agent.utils import models, mongo  # noqa: E402
+from my_agent.utils.instrumentation import Instrumentation  # noqa: E402
+
+LLM_LATENCY = float(os.environ.get("BENCH_LLM_LATENCY", 0.05))
+TURNS = int(os.environ.get("BENCH_TURNS", 40))
+QUESTION = {"messages": [("user", "How many rooms are there?")]}
+
+
+def _turns(agent, instrumented, plain, turns: int) -> tuple[list[float], list[float]]:
+    timings = {True: [], False: []}
+    for i in range(turns * 2):
+        on = i % 2 == 0
+        agent.get_response_cache().backend.clear()
+        start = time.perf_counter()
+        (instrumented if on else plain).invoke(QUESTION)
+        timings[on].append(time.perf_counter() - start)
+    return timings[True], timings[False]
+
+
+def main():
+    db = mongomock.MongoClient().abraham_baldwin
+    db.rooms.insert_many([{"name": f"R{i}"} for i in range(25)])
+    mongo.set_client_factory(lambda: db.client)
+    model = FakeChatModel(policy=pipeline_policy(), latency=LLM_LATENCY)
+    models.set_chat_model_factory(lambda **kwargs: model)
+    from my_agent import agent
+
+    recorder = Instrumentation(enabled=True)
+    agent.instrumentation = recorder
+    plain = agent.builder.compile()
+    instrumented = recorder.instrument(plain)
+
+    for latency in (LLM_LATENCY, 0.0):
+        model.latency = latency
+        _turns(agent, instrumented, plain, 3)
+        recorder.reset()
+        on, off = _turns(agent, instrumented, plain, TURNS)
+        spans = len(recorder.export_spans()["resourceSpans"][0]["scopeSpans"][0]["spans"]) / TURNS
+        on_median, off_median = statistics.median(on), statistics.median(off)
+        print(
+            f"model latency {latency * 1000:3.0f}ms: turn p50 {off_median * 1000:7.2f}ms plain, "
+            f"{on_median * 1000:7.2f}ms instrumented ({(on_median - off_median) / off_median * 100:+.2f}%), "
+            f"{spans:.0f} spans per turn, {(on_median - off_median) / spans * 1e6:+.1f}us per span"
+        )
+
+    print()
+    for (kind, name), stats in sorted(recorder.stats().items()):
+        seconds = stats["seconds"]
+        print(
+            f"{kind:6s} {name:40s} n={stats['count']:4d} p50={seconds['p50'] * 1000:7.2f}ms "
+            f"p95={seconds['p95'] * 1000:7.2f}ms p99={seconds['p99'] * 1000:7.2f}ms "
+            f"tokens={stats['tokens_in']}/{stats['tokens_out']} bytes_p50={stats['payload_bytes']['p50']:.0f}"
+        )
+    print()
+    print("\n".join(line for line in recorder.render_prometheus().splitlines() if 'name="execute_pymongo"' in line))
+
+    recorder.reset()
+    instrumented.invoke(QUESTION)
+    spans = recorder.export_spans()["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    names = {span["spanId"]: span["name"] for span in spans}
+    print(f"\none turn: {len(spans)} spans in {len({span['traceId'] for span in spans})} trace")
+    for span in spans:
+        if span["name"].startswith(("mongo", "tool execute")):
+            print(f"  {span['name']:36s} parent={names.get(span.get('parentSpanId'), '-')}")
+
+
+if __name__ == "__main__":
+    main()
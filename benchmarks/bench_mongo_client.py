@@ -0,0 +1,69 @@
+"""Per-call latency of a fresh MongoClient per call versus the shared pooled client.
+
+Runs against MONGODB_URI when it is set (e.g. a local mongod), otherwise against
+mongomock. Usage:
+
+    MONGODB_URI=mongodb://localhost:27017 python benchmarks/bench_mongo_client.py
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from my_agent.utils import mongo  # noqa: E402
+
+CALLS = int(os.environ.get("BENCH_CALLS", 200))
+
+
+def _factory():
+    if os.environ.get("MONGODB_URI"):
+        from pymongo import MongoClient
+
+        return lambda: MongoClient(os.environ["MONGODB_URI"], **mongo.client_settings())
+    import mongomock
+
+    shared = mongomock.MongoClient()
+    shared[mongo.DEFAULT_DATABASE].rooms.insert_many([{"id": str(i)} for i in range(100)])
+    # mongomock keeps no server state between clients, so hand out the seeded store.
+    return lambda: shared
+
+
+def _timed(fn) -> list[float]:
+    samples = []
+    for _ in range(CALLS):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main():
+    factory = _factory()
+
+    def per_call_client():
+        client = factory()
+        try:
+            client[mongo.DEFAULT_DATABASE].rooms.count_documents({})
+        finally:
+            if os.environ.get("MONGODB_URI"):
+                client.close()
+
+    mongo.set_client_factory(factory)
+
+    def pooled_client():
+        mongo.get_database().rooms.count_documents({})
+
+    for name, fn in (("per-call client", per_call_client), ("pooled client", pooled_client)):
+        samples = _timed(fn)
+        print(
+            f"{name:16s} mean={statistics.mean(samples):8.3f}ms "
+            f"p50={statistics.median(samples):8.3f}ms "
+            f"p95={statistics.quantiles(samples, n=20)[18]:8.3f}ms"
+        )
+    mongo.close_client()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Offline end-to-end benchmark: the compiled graph over a question corpus, replayed from a cassette.
+
+Seeds a mongomock database with the generated university dataset
+(benchmarks/dataset.py), serves every chat model from a record/replay cassette
+and runs each question of benchmarks/corpus.json through the graph. Reports
+per-question latency, LLM calls, tokens and peak memory, and exits with status 1
+when a question exceeds its limits in benchmarks/thresholds.json, or regresses
+more than BENCH_TOLERANCE against a previous BENCH_OUTPUT given as BENCH_BASELINE.
+No network access or API keys are needed to replay. Usage:
+
+    python benchmarks/bench_offline.py                       # replay the cassette
+    BENCH_MODE=record python benchmarks/bench_offline.py     # re-record with the real models (needs API keys)
+    BENCH_MODE=script python benchmarks/bench_offline.py     # re-record from the scripted fake model
+
+BENCH_REPLAY_LATENCY scales the recorded model latencies (0 measures the agent's own overhead).
+"""
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+# Every run should reach the (fake) database.
+os.environ.setdefault("QUERY_CACHE_MAXSIZE", "0")
+
+import mongomock  # noqa: E402
+
+from benchmarks.cassettes import Cassette, cassette_factory  # noqa: E402
+from benchmarks.dataset import seed_database  # noqa: E402
+from benchmarks.fakes import FakeChatModel, corpus_policy  # noqa: E402
+from my_agent.utils import models, mongo  # noqa: E402
+from my_agent.utils.instrumentation import Instrumentation  # noqa: E402
+from my_agent.utils.schemas import load_schema_registry  # noqa: E402
+
+HERE = os.path.dirname(__file__)
+MODE = os.environ.get("BENCH_MODE", "replay")
+CORPUS = os.environ.get("BENCH_CORPUS", os.path.join(HERE, "corpus.json"))
+CASSETTE = os.environ.get("BENCH_CASSETTE", os.path.join(HERE, "cassettes", "offline.json"))
+THRESHOLDS = os.environ.get("BENCH_THRESHOLDS", os.path.join(HERE, "thresholds.json"))
+BASELINE = os.environ.get("BENCH_BASELINE")
+OUTPUT = os.environ.get("BENCH_OUTPUT")
+TOLERANCE = float(os.environ.get("BENCH_TOLERANCE", 0.2))
+REPLAY_LATENCY = float(os.environ.get("BENCH_REPLAY_LATENCY", 1.0))
+SCRIPT_LATENCY = float(os.environ.get("BENCH_LLM_LATENCY", 0.25))
+SEED = int(os.environ.get("BENCH_SEED", 0))
+METRICS = ("latency_ms", "llm_calls", "tokens", "memory_mb")
+
+
+def _load(path: str):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _factory(corpus: list[dict], cassette: Cassette):
+    if MODE == "replay":
+        return cassette_factory(cassette, latency_scale=REPLAY_LATENCY)
+    if MODE == "record":
+        return cassette_factory(cassette, models.build_chat_model)
+    if MODE == "script":
+        model = FakeChatModel(policy=corpus_policy(corpus), latency=SCRIPT_LATENCY)
+        return cassette_factory(cassette, lambda **kwargs: model)
+    raise ValueError(f"BENCH_MODE must be replay, record or script, not {MODE!r}")
+
+
+def run_question(agent, graph, recorder: Instrumentation, cassette: Cassette, question: str) -> tuple[dict, str]:
+    cassette.rewind()
+    agent.get_response_cache().backend.clear()
+    recorder.reset()
+    start = time.perf_counter()
+    state = graph.invoke({"messages": [("user", question)]})
+    latency = time.perf_counter() - start
+    llm = [stats for (kind, _), stats in recorder.stats().items() if kind == "llm"]
+    result = {
+        "latency_ms": round(latency * 1000, 2),
+        "llm_calls": sum(stats["count"] for stats in llm),
+        "tokens": sum(stats["tokens_in"] + stats["tokens_out"] for stats in llm),
+    }
+    return result, state["messages"][-1].content
+
+
+def peak_memory(agent, graph, cassette: Cassette, question: str) -> float:
+    """Peak traced allocations in MB for one more (untimed) run of `question`."""
+    cassette.rewind()
+    agent.get_response_cache().backend.clear()
+    tracemalloc.start()
+    try:
+        graph.invoke({"messages": [("user", question)]})
+        return round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+    finally:
+        tracemalloc.stop()
+
+
+def regressions(results: dict, thresholds: dict, baseline: dict | None) -> list[str]:
+    failures = []
+    for name, result in results.items():
+        limits = {**thresholds["default"], **thresholds.get("questions", {}).get(name, {})}
+        for metric in METRICS:
+            if metric in limits and result[metric] > limits[metric]:
+                failures.append(f"{name}: {metric} {result[metric]} over the limit of {limits[metric]}")
+            previous = (baseline or {}).get(name, {}).get(metric)
+            if previous and result[metric] > previous * (1 + TOLERANCE):
+                failures.append(f"{name}: {metric} {result[metric]} regressed from {previous} (+{TOLERANCE:.0%} allowed)")
+    return failures
+
+
+def main():
+    corpus = _load(CORPUS)
+    cassette = Cassette(CASSETTE)
+    db = mongomock.MongoClient().abraham_baldwin
+    counts = seed_database(db, load_schema_registry(), seed=SEED)
+    mongo.set_client_factory(lambda: db.client)
+    models.set_chat_model_factory(_factory(corpus, cassette))
+    from my_agent import agent
+
+    recorder = Instrumentation(enabled=True)
+    agent.instrumentation = recorder
+    graph = recorder.instrument(agent.builder.compile())
+    agent.rollup_store.refresh()
+
+    print(f"mode {MODE}, {len(corpus)} questions, dataset {counts}")
+    results = {}
+    for entry in corpus:
+        result, answer = run_question(agent, graph, recorder, cassette, entry["question"])
+        if MODE != "replay":
+            result["memory_mb"] = 0.0
+        else:
+            result["memory_mb"] = peak_memory(agent, graph, cassette, entry["question"])
+        results[entry["id"]] = result
+        print(
+            f"{entry['id']:24s} {result['latency_ms']:8.1f}ms {result['llm_calls']:3d} LLM calls "
+            f"{result['tokens']:6d} tokens {result['memory_mb']:6.2f}MB  {answer[:60]!r}"
+        )
+    if MODE != "replay":
+        cassette.save()
+        print(f"\nrecorded {sum(len(responses) for responses in cassette.entries.values())} responses to {CASSETTE}")
+        return
+
+    total = {metric: round(sum(result[metric] for result in results.values()), 2) for metric in METRICS[:3]}
+    print(f"\ntotal: {total['latency_ms']:.0f}ms, {total['llm_calls']} LLM calls, {total['tokens']} tokens")
+    if OUTPUT:
+        with open(OUTPUT, "w") as f:
+            json.dump(results, f, indent=1)
+    failures = regressions(results, _load(THRESHOLDS), _load(BASELINE) if BASELINE else None)
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
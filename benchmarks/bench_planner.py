@@ -0,0 +1,100 @@
+"""LLM calls, prompt tokens and latency per question: update_plan tool loop versus the planner node.
+
+Both graphs answer the same question with a fake LLM that walks the full
+identify -> schemas -> query -> execute pipeline. The legacy graph rebuilds the
+original setup, where the system prompt makes the assistant call update_plan
+before and after every step. Usage:
+
+    python benchmarks/bench_planner.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+# Every run should reach the (fake) database.
+os.environ.setdefault("QUERY_CACHE_MAXSIZE", "0")
+
+import mongomock  # noqa: E402
+from langchain_core.messages import SystemMessage  # noqa: E402
+from langgraph.graph import START, MessagesState, StateGraph  # noqa: E402
+from langgraph.prebuilt import ToolNode, tools_condition  # noqa: E402
+
+from benchmarks.fakes import FakeChatModel, pipeline_policy  # noqa: E402
+from my_agent.utils import models, mongo  # noqa: E402
+from my_agent.utils.tokens import count_tokens  # noqa: E402
+
+LLM_LATENCY = float(os.environ.get("BENCH_LLM_LATENCY", 0.2))
+QUESTION = {"messages": [("user", "How many rooms are there?")]}
+
+LEGACY_SYSTEM_PROMPT = """
+You are a helpful assistant tasked with helping users query the university's database.
+Before each step that you take, call the 'update_plan' tool to create a plan for how to accomplish the user's query.
+Execute the next step of your plan. After you execute a step, call the 'update_plan' tool again to update your plan based on the results of the step.
+"""
+
+
+def update_plan(goal: str, current_plan: str, completed_steps: str, new_observations: str, available_tools: str) -> str:
+    """Updates an existing plan based on new observations and progress.
+
+    Args:
+        goal: The overall goal being worked towards
+        current_plan: The current plan steps
+        completed_steps: Steps that have been completed so far
+        new_observations: New information from the environment
+        available_tools: String containing available tools and their descriptions
+    """
+    from my_agent.utils.planner import plan_prompt
+
+    prompt = plan_prompt(goal, current_plan, completed_steps, new_observations, available_tools)
+    return models.get_chat_model("gpt-4o", temperature=0).invoke(prompt).content
+
+
+def _legacy_graph(agent):
+    legacy_tools = [update_plan] + agent.tools
+    llm_with_tools = agent._models()[0].bind_tools(legacy_tools)
+    sys_msg = SystemMessage(content=LEGACY_SYSTEM_PROMPT + agent.sys_msg.content.split("Below are some rules", 1)[1])
+
+    def assistant(state: MessagesState):
+        return {"messages": [llm_with_tools.invoke([sys_msg] + state["messages"])]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("assistant", assistant)
+    builder.add_node("tools", ToolNode(legacy_tools))
+    builder.add_edge(START, "assistant")
+    builder.add_conditional_edges("assistant", tools_condition)
+    builder.add_edge("tools", "assistant")
+    return builder.compile()
+
+
+def _run(name: str, graph, model: FakeChatModel, agent) -> None:
+    agent.get_response_cache().backend.clear()
+    model.calls.clear()
+    start = time.perf_counter()
+    result = graph.invoke(QUESTION)
+    elapsed = time.perf_counter() - start
+    tokens = sum(count_tokens(str(m.content)) for call in model.calls for m in call)
+    print(
+        f"{name:8s} llm_calls={len(model.calls):3d} prompt_tokens={tokens:6d} "
+        f"latency={elapsed * 1000:8.1f}ms answer={result['messages'][-1].content!r}"
+    )
+
+
+def main():
+    db = mongomock.MongoClient().abraham_baldwin
+    db.rooms.insert_many([{"name": f"R{i}"} for i in range(25)])
+    mongo.set_client_factory(lambda: db.client)
+
+    legacy_model = FakeChatModel(policy=pipeline_policy(legacy=True), latency=LLM_LATENCY)
+    models.set_chat_model_factory(lambda **kwargs: legacy_model)
+    from my_agent import agent
+
+    _run("legacy", _legacy_graph(agent), legacy_model, agent)
+
+    # The planner graph was built with the same shared fake; swap in the non-legacy policy.
+    legacy_model.policy = pipeline_policy(legacy=False)
+    _run("planner", agent.graph, legacy_model, agent)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Cached-token ratio and time to first token, original prompt layout versus static prefix + variable suffix.
+
+A fake model simulates provider prefix caching: a prompt prefix of whole content
+blocks seen before (at least 1024 tokens, as on OpenAI) is a cache hit, and every
+uncached prompt token adds BENCH_PREFILL_US microseconds before the first token.
+The original layouts put the user's question in the middle of one prompt string
+and the plan inside the system message. Usage:
+
+    python benchmarks/bench_prompt_cache.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("QUERY_CACHE_MAXSIZE", "0")
+
+import mongomock  # noqa: E402
+from langchain_core.messages import SystemMessage  # noqa: E402
+
+from benchmarks.fakes import FakeChatModel, pipeline_policy  # noqa: E402
+from my_agent.utils import models, mongo  # noqa: E402
+from my_agent.utils.prompts import PromptCacheMonitor  # noqa: E402
+
+PREFILL_US = float(os.environ.get("BENCH_PREFILL_US", 20))
+QUESTIONS = [
+    "How many rooms are there?",
+    "Which rooms hold more than 50 students?",
+    "List the courses in the biology department",
+    "How many professors are active?",
+    "Which buildings are on the main campus?",
+    "How many departments are there?",
+    "What are the largest rooms?",
+    "Which courses are taught in room 101?",
+]
+
+
+def legacy_routing_prompt(agent, user_query: str) -> str:
+    return f"""You will be given a query from a user. Your job is to figure out which collections in MongoDB are relevant to the query.
+                             Return only the collections that are relevant to the query as a comma separated list of collection names: `professors, courses, departments`.
+                             For example, if the user asks about professors and courses, you should return `professors, courses`.
+                             If there are no relevant collections, simple return 'There are no relevant collections'
+                             User Query: {user_query}. Here are the schemas: {agent.schema_registry.render(fmt=agent.SCHEMA_PROMPT_FORMAT)}"""
+
+
+def legacy_query_prompt(user_query: str, collection_schemas: str) -> str:
+    return f"""Use your knowledge of the following collection schemas to create a pymongo query for the following user query.
+                Under no circumstances should you return anything more than the pymongo query. Ex: db.rooms.count_documents({{}}).
+                Below are some rules about the schema to help you create the query:
+                <schema_rules> ... </schema_rules>
+                <user_query>
+                {user_query}.
+                </user_query>
+                <mongo_collection_schemas>
+                {collection_schemas}
+                </mongo_collection_schemas>"""
+
+
+def legacy_agent_prompt(agent, state):
+    plan = agent.render_plan(state["plan"]) if state.get("plan") else ""
+    return [SystemMessage(content=f"{agent.sys_msg.content}\n{plan}")] + agent.history.compact(state["messages"])
+
+
+def _report(name: str, monitor: PromptCacheMonitor) -> None:
+    stats = monitor.stats()
+    print(
+        f"{name:28s} calls={stats['calls']:3d} input_tokens={stats['input_tokens']:7d} "
+        f"cached={stats['cached_ratio'] * 100:5.1f}% ttft_p50={stats['ttft_p50'] * 1000:6.1f}ms "
+        f"ttft_p95={stats['ttft_p95'] * 1000:6.1f}ms"
+    )
+
+
+def _new_model(policy=None) -> FakeChatModel:
+    model = FakeChatModel(prefix_cache=True, prefill_latency=PREFILL_US / 1e6)
+    if policy is not None:
+        model.policy = policy
+    return model
+
+
+def main():
+    db = mongomock.MongoClient().abraham_baldwin
+    db.rooms.insert_many([{"name": f"R{i}"} for i in range(25)])
+    mongo.set_client_factory(lambda: db.client)
+    shared = {"model": _new_model()}
+    models.set_chat_model_factory(lambda **kwargs: shared["model"])
+    from my_agent import agent
+
+    schemas = agent.schema_registry.render(["rooms", "buildings"], fmt=agent.SCHEMA_PROMPT_FORMAT)
+    for layout in ("original", "prefix + suffix"):
+        monitor = PromptCacheMonitor()
+        model = shared["model"] = _new_model()
+        config = {"callbacks": [monitor]}
+        for question in QUESTIONS:
+            if layout == "original":
+                model.invoke(legacy_routing_prompt(agent, question), config=config)
+                model.invoke(legacy_query_prompt(question, schemas), config=config)
+            else:
+                model.invoke(agent._routing_prompt(question), config=config)
+                model.invoke(agent._query_prompt(question, schemas), config=config)
+        _report(f"tool sub-calls ({layout})", monitor)
+
+    original_prompt = agent._prompt
+    for layout in ("original", "prefix + suffix"):
+        monitor = PromptCacheMonitor()
+        model = shared["model"] = _new_model(pipeline_policy())
+        agent.llm_with_tools = model
+        agent._prompt = (lambda state: legacy_agent_prompt(agent, state)) if layout == "original" else original_prompt
+        agent.get_response_cache().backend.clear()
+        messages = []
+        for question in QUESTIONS:
+            result = agent.graph.invoke({"messages": messages + [("user", question)]}, config={"callbacks": [monitor]})
+            messages = result["messages"]
+        _report(f"agent loop ({layout})", monitor)
+    agent._prompt = original_prompt
+
+
+if __name__ == "__main__":
+    main()
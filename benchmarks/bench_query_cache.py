@@ -0,0 +1,85 @@
+"""Query result cache: hit latency, key canonicalization and watermark invalidation on mongomock.
+
+Runs repeated generated queries through agent.run_query against a fake database
+with fixed latency, then writes to the collections and checks that a polling pass
+invalidates exactly the affected entries. Usage:
+
+    python benchmarks/bench_query_cache.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import mongomock  # noqa: E402
+
+from benchmarks.fakes import FakeChatModel, FakeClient  # noqa: E402
+from my_agent.utils import models, mongo  # noqa: E402
+from my_agent.utils.query_cache import CollectionVersions, QueryResultCache  # noqa: E402
+
+DB_LATENCY = float(os.environ.get("BENCH_DB_LATENCY", 0.05))
+RUNS = 20
+QUERIES = [
+    "db.rooms.count_documents({})",
+    "db.rooms.find({'capacity': {'$gte': 30}, 'campus': 'Main'})",
+    # Same filter as above with the keys swapped: must share the cache entry.
+    "db.rooms.find({campus: 'Main', capacity: {$gte: 30.0}})",
+    "db.courses.aggregate([{'$lookup': {'from': 'rooms', 'localField': 'code', 'foreignField': 'name', 'as': 'r'}}, {'$count': 'n'}])",
+]
+
+
+def main():
+    db = mongomock.MongoClient().abraham_baldwin
+    now = 1704067200
+    db.rooms.insert_many([{"name": f"R{i}", "capacity": 10 * (i % 6), "campus": "Main"} for i in range(60)])
+    db.courses.insert_many([{"name": f"C{i}", "code": f"R{i}", "lastEdited": now} for i in range(40)])
+    slow_db = FakeClient(db, DB_LATENCY)["abraham_baldwin"]
+    models.set_chat_model_factory(lambda **kwargs: FakeChatModel())
+    mongo.set_client_factory(lambda: db.client)
+
+    from my_agent import agent
+
+    # A cache whose invalidation is driven by explicit poll() calls instead of the background thread.
+    versions = CollectionVersions(lambda: db, poll_interval=3600)
+    versions.start = lambda: None
+    agent.tenants.default.query_cache = cache = QueryResultCache(versions)
+
+    start = time.perf_counter()
+    for query in QUERIES:
+        agent.run_query(query, slow_db)
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        for query in QUERIES:
+            agent.run_query(query, slow_db)
+    warm = (time.perf_counter() - start) / RUNS
+    print(f"{len(QUERIES)} queries, fake DB {DB_LATENCY * 1000:.0f}ms: cold {cold * 1000:.1f}ms, cached {warm * 1000:.3f}ms")
+    print(f"entries={cache.stats()['size']} (3 distinct canonical queries) stats={cache.stats()}")
+    assert cache.stats()["size"] == 3
+
+    # The first poll records each collection's watermark and conservatively drops everything.
+    versions.poll()
+    for query in QUERIES:
+        agent.run_query(query, slow_db)
+    versions.poll()
+    assert all(cache.get(agent.query_compiler.compile(q)) is not None for q in QUERIES)
+
+    db.courses.update_one({"name": "C1"}, {"$set": {"code": "R2", "lastEdited": now + 60}})
+    versions.poll()
+    fresh = [cache.get(agent.query_compiler.compile(q)) is not None for q in QUERIES]
+    print(f"after editing a course: cached={fresh}")
+    assert fresh == [True, True, True, False]
+
+    db.rooms.insert_one({"name": "R99", "capacity": 40, "campus": "Main"})
+    versions.poll()
+    assert agent.run_query(QUERIES[0], slow_db) == "61"
+    print(f"after inserting a room: count_documents -> {agent.run_query(QUERIES[0], slow_db)}")
+
+    cache.invalidate("rooms")
+    assert cache.get(agent.query_compiler.compile(QUERIES[0])) is None
+    print("explicit invalidate('rooms'): ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Cost of eval() versus the cached query compiler, and an offline check against mongomock.
+
+Usage:
+
+    python benchmarks/bench_query_compiler.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import mongomock  # noqa: E402
+
+from my_agent.utils.query import QueryCompiler, QueryError, execute_plan  # noqa: E402
+from my_agent.utils.schemas import load_schema_registry  # noqa: E402
+
+QUERIES = [
+    'db.rooms.count_documents({})',
+    'db.rooms.find({"capacity": {"$gt": 30}}, {"_id": 0, "name": 1}).sort("capacity", -1).limit(5)',
+    'db.courses.aggregate([{"$unwind": "$departments"}, {"$group": {"_id": "$departments", "n": {"$sum": 1}}}])',
+    'db.rooms.distinct("buildingDisplayName")',
+]
+REJECTED = [
+    'db.rooms.drop()',
+    'db.rooms.find({"$where": "sleep(1000)"})',
+    'db.rooms.find({"colour": "red"})',
+    'db.courses.aggregate([{"$out": "courses_copy"}])',
+    '__import__("os").system("true")',
+]
+ROUNDS = 2000
+
+
+def main():
+    db = mongomock.MongoClient().abraham_baldwin
+    db.rooms.insert_many(
+        [{"name": f"R{i}", "capacity": i % 80, "buildingDisplayName": f"B{i % 7}"} for i in range(500)]
+    )
+    db.courses.insert_many([{"name": f"C{i}", "departments": [f"D{i % 5}"]} for i in range(200)])
+    compiler = QueryCompiler(load_schema_registry())
+
+    for query in QUERIES:
+        expected = eval(query)
+        result = execute_plan(compiler.compile(query), db)
+        assert list(expected) == list(result) if hasattr(expected, "next") else expected == result, query
+    for query in REJECTED:
+        try:
+            compiler.compile(query)
+        except QueryError as e:
+            print(f"rejected {query!r}: {e}")
+        else:
+            raise AssertionError(f"{query!r} was not rejected")
+
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for query in QUERIES:
+            compile(query, "<query>", "eval")
+    eval_us = (time.perf_counter() - start) / (ROUNDS * len(QUERIES)) * 1e6
+
+    cold = QueryCompiler(load_schema_registry(), cache_size=0)
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for query in QUERIES:
+            cold.compile(query)
+    cold_us = (time.perf_counter() - start) / (ROUNDS * len(QUERIES)) * 1e6
+
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for query in QUERIES:
+            compiler.compile(query)
+    warm_us = (time.perf_counter() - start) / (ROUNDS * len(QUERIES)) * 1e6
+
+    print(f"eval() parse        {eval_us:8.2f}us/query")
+    print(f"compile (uncached)  {cold_us:8.2f}us/query")
+    print(f"compile (cached)    {warm_us:8.2f}us/query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Peak memory, latency and payload size of a full-collection find, unbounded versus streamed.
+
+Seeds a 100k-document mongomock `courses` collection with nested `sections`.
+Usage:
+
+    python benchmarks/bench_results.py
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import mongomock  # noqa: E402
+from bson.json_util import dumps  # noqa: E402
+
+from my_agent.utils.query import QueryCompiler, count_plan, execute_plan  # noqa: E402
+from my_agent.utils.results import serialize_results  # noqa: E402
+from my_agent.utils.schemas import load_schema_registry  # noqa: E402
+
+DOCUMENTS = int(os.environ.get("BENCH_DOCUMENTS", 100_000))
+QUERY = "db.courses.find({})"
+
+
+def _seed(db) -> None:
+    db.courses.insert_many(
+        {
+            "id": str(i),
+            "code": f"BIO{i}",
+            "name": f"Course {i}",
+            "description": "An introduction to the topic. " * 5,
+            "departments": ["Biology"],
+            "sections": {str(s): {"id": str(s), "capacity": 30, "meetings": [{"day": "M", "start": 900}] * 3} for s in range(5)},
+            "internalNotes": "x" * 200,
+        }
+        for i in range(DOCUMENTS)
+    )
+
+
+def _measure(name: str, fn) -> None:
+    tracemalloc.start()
+    start = time.perf_counter()
+    payload = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:10s} latency={elapsed * 1000:10.1f}ms peak={peak / 1e6:8.1f}MB payload={len(payload) / 1e3:10.1f}kB")
+
+
+def main():
+    db = mongomock.MongoClient().abraham_baldwin
+    _seed(db)
+    compiler = QueryCompiler(load_schema_registry())
+
+    def unbounded():
+        # What execute_pymongo used to do: materialize the cursor, then dump it all
+        return dumps(list(db.courses.find({})))
+
+    def streamed():
+        plan = compiler.compile(QUERY)
+        return serialize_results(execute_plan(plan, db), count=lambda: count_plan(plan, db))
+
+    print(f"{DOCUMENTS} documents, query {QUERY}")
+    _measure("unbounded", unbounded)
+    _measure("streamed", streamed)
+    print(streamed()[-80:])
+
+
+if __name__ == "__main__":
+    main()
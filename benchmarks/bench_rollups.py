@@ -0,0 +1,139 @@
+"""Materialized rollups versus live aggregation on mongomock.
+
+Builds rooms, courses and professors collections, then compares the latency of a
+live $group aggregation with reading the same rollup, and the cost of a full
+build, an incremental refresh after a few edits, and a refresh with no changes.
+Every rollup is checked against its live aggregation after the edits. Usage:
+
+    python benchmarks/bench_rollups.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import mongomock  # noqa: E402
+
+from my_agent.utils.rollups import DEFAULT_ROLLUPS_PATH, RollupStore  # noqa: E402
+from my_agent.utils.schemas import load_schema_registry  # noqa: E402
+
+ROOMS = int(os.environ.get("BENCH_ROOMS", 20000))
+COURSES = int(os.environ.get("BENCH_COURSES", 20000))
+PROFESSORS = int(os.environ.get("BENCH_PROFESSORS", 2000))
+EDITS = 25
+RUNS = 3
+NOW = 1704067200
+DEPARTMENTS = [f"Dept {i}" for i in range(40)]
+
+
+def _dataset(db, rng: random.Random) -> None:
+    db.rooms.insert_many([
+        {
+            "name": f"R{i}",
+            "buildingDisplayName": f"Building {i % 120}",
+            "campus": rng.choice(["Main", "North", "South"]),
+            "departments": rng.sample(DEPARTMENTS, rng.randint(0, 3)),
+            "status": rng.choice(["active", "inactive"]),
+            "capacity": rng.randint(10, 300),
+        }
+        for i in range(ROOMS)
+    ])
+    db.courses.insert_many([
+        {
+            "name": f"C{i}",
+            "departments": rng.sample(DEPARTMENTS, rng.randint(1, 2)),
+            "college": f"College {i % 8}",
+            "status": rng.choice(["active", "inactive"]),
+            # Edited over the past year; the latest edits share the last refresh's second
+            "lastEdited": NOW - rng.randint(0, 365 * 86400) if i % 100 else NOW,
+        }
+        for i in range(COURSES)
+    ])
+    db.professors.insert_many([
+        {
+            "name": f"P{i}",
+            "departments": rng.sample(DEPARTMENTS, 1),
+            "type": rng.choice(["faculty", "adjunct", "staff"]),
+            "status": rng.choice(["active", "inactive"]),
+        }
+        for i in range(PROFESSORS)
+    ])
+
+
+def live(db, rollup) -> dict:
+    """The rollup computed by MongoDB, as {group: (count, sums...)}."""
+    pipeline = []
+    if rollup.group_by == "departments":
+        pipeline.append({"$unwind": "$departments"})
+    group = {"_id": f"${rollup.group_by}", "count": {"$sum": 1}}
+    group.update({f"{field}_sum": {"$sum": f"${field}"} for field in rollup.sum})
+    pipeline.append({"$group": group})
+    return {
+        d["_id"]: (d["count"], *(d[f"{field}_sum"] for field in rollup.sum))
+        for d in db[rollup.collection].aggregate(pipeline)
+    }
+
+
+def materialized(store, rollup) -> dict:
+    return {
+        r["group"]: (r["count"], *(r[f"{field}_sum"] for field in rollup.sum))
+        for r in store.query(rollup.name)
+    }
+
+
+def _edit(db, rng: random.Random) -> None:
+    """A few course edits, inserts and deletes, bumping lastEdited like the application does."""
+    for i in rng.sample(range(COURSES), EDITS):
+        db.courses.update_one(
+            {"name": f"C{i}"}, {"$set": {"departments": rng.sample(DEPARTMENTS, 2), "lastEdited": NOW + 60}}
+        )
+    db.courses.insert_many([
+        {"name": f"New{i}", "departments": ["Dept 0"], "college": "College 0", "status": "active", "lastEdited": NOW + 60}
+        for i in range(EDITS)
+    ])
+    db.courses.delete_many({"name": {"$in": [f"C{i}" for i in range(EDITS)]}})
+    db.professors.update_one({"name": "P0"}, {"$set": {"type": "emeritus"}})
+
+
+def _timed(func) -> float:
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        func()
+    return (time.perf_counter() - start) / RUNS
+
+
+def main():
+    rng = random.Random(0)
+    db = mongomock.MongoClient().abraham_baldwin
+    _dataset(db, rng)
+    # Refreshes are triggered explicitly below.
+    store = RollupStore.from_file(DEFAULT_ROLLUPS_PATH, load_schema_registry(), lambda: db, refresh_interval=float("inf"))
+    print(f"{ROOMS} rooms, {COURSES} courses, {PROFESSORS} professors; watermarked: {sorted(store.watermarked)}")
+
+    for label, report in (("full build", store.refresh()), ("no changes", store.refresh())):
+        for collection, stats in report.items():
+            print(f"refresh {label:12s} {collection:10s} {stats['mode']:11s} docs={stats['documents']:6d} {stats['seconds'] * 1000:8.1f}ms")
+    _edit(db, rng)
+    for collection, stats in store.refresh().items():
+        print(f"refresh {'after edits':12s} {collection:10s} {stats['mode']:11s} docs={stats['documents']:6d} {stats['seconds'] * 1000:8.1f}ms")
+
+    print()
+    for rollup in store.rollups.values():
+        expected, actual = live(db, rollup), materialized(store, rollup)
+        assert actual == expected, f"{rollup.name} differs from live aggregation"
+        live_time = _timed(lambda: live(db, rollup))
+        rollup_time = _timed(lambda: store.query(rollup.name))
+        print(
+            f"{rollup.name:26s} groups={len(actual):4d} live={live_time * 1000:8.1f}ms "
+            f"rollup={rollup_time * 1000:6.2f}ms ({live_time / rollup_time:6.0f}x)"
+        )
+
+    for question in ("How many rooms are in each building?", "Number of courses per department", "Which rooms hold more than 50 students?"):
+        rollup = store.match(question)
+        print(f"fast path: {question!r} -> {rollup.name if rollup else 'agent loop'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Accuracy and latency of the deterministic collection router on labeled questions.
+
+With OPENAI_API_KEY set, the LLM routing prompt that the router replaces is
+measured on the same questions for comparison. Usage:
+
+    python benchmarks/bench_router.py
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from my_agent.agent import (  # noqa: E402
+    ROUTER_CONFIDENCE_THRESHOLD,
+    all_schemas,
+    collection_router,
+    identify_relevant_mongodb_collections,
+    route_with_llm,
+)
+
+LABELED_QUERIES = [
+    ("How many rooms are there?", {"rooms"}),
+    ("How many classrooms are in the science building?", {"rooms", "buildings"}),
+    ("List the buildings on campus", {"buildings"}),
+    ("What is the address of the library building?", {"buildings"}),
+    ("Which rooms have a projector feature?", {"rooms"}),
+    ("What is the capacity of room 101?", {"rooms"}),
+    ("How many professors are in the biology department?", {"professors", "departments"}),
+    ("Show me the faculty emails", {"professors"}),
+    ("What is Dr. Smith's bio?", {"professors"}),
+    ("How many courses are offered?", {"courses"}),
+    ("List the classes with subject code BIO", {"courses"}),
+    ("What is the description of BIO100?", {"courses"}),
+    ("Which courses have more than three sections?", {"courses"}),
+    ("How many departments are there?", {"departments"}),
+    ("Who chairs the history dept?", {"departments"}),
+    ("Which depts have an active schedule status?", {"departments"}),
+    ("List the professors and the courses they teach", {"professors", "courses"}),
+    ("Which rooms are in the Smith building?", {"rooms", "buildings"}),
+    ("What floor is the chemistry lab on?", {"rooms"}),
+    ("What's the weather like today?", set()),
+]
+
+
+def _evaluate(name: str, route) -> None:
+    correct, samples = 0, []
+    for query, expected in LABELED_QUERIES:
+        start = time.perf_counter()
+        collections = route(query)
+        samples.append((time.perf_counter() - start) * 1000)
+        if set(collections) == expected:
+            correct += 1
+        else:
+            print(f"  {name} miss: {query!r} -> {collections} (expected {sorted(expected)})")
+    print(
+        f"{name:6s} accuracy={correct}/{len(LABELED_QUERIES)} "
+        f"mean={statistics.mean(samples):9.4f}ms p95={statistics.quantiles(samples, n=20)[18]:9.4f}ms"
+    )
+
+
+def main():
+    print(f"{len(all_schemas)} collections, {len(collection_router.index)} indexed tokens")
+    _evaluate("router", lambda query: collection_router.route(query).collections)
+    fallbacks = sum(
+        collection_router.route(query).confidence < ROUTER_CONFIDENCE_THRESHOLD for query, _ in LABELED_QUERIES
+    )
+    print(f"low-confidence questions that fall back to the LLM: {fallbacks}/{len(LABELED_QUERIES)}")
+    if os.environ.get("OPENAI_API_KEY"):
+        _evaluate("llm", route_with_llm)
+        _evaluate("tool", identify_relevant_mongodb_collections)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Success rate and tail latency of model calls under 429s and slow responses, with and without the call scheduler.
+
+Starts two local fake model servers (benchmarks/fake_llm_server.py): an OpenAI one
+that answers a BENCH_SLOW_RATE share of requests slowly and returns 429s past
+BENCH_CAPACITY concurrent requests (and for BENCH_THROTTLE_RATE of the others),
+and a healthy Anthropic one. The real ChatOpenAI and ChatAnthropic clients send
+BENCH_REQUESTS requests, BENCH_CONCURRENCY at a time: first relying on the
+provider client's own retries, then through CallScheduler with retries, with
+failover to Anthropic, and with hedged requests as well (async, then from
+threads). Exits with status 1 when a scheduled run loses requests. Usage:
+
+    python benchmarks/bench_scheduler.py
+"""
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.fake_llm_server import FakeLLMServer  # noqa: E402
+
+REQUESTS = int(os.environ.get("BENCH_REQUESTS", 240))
+CONCURRENCY = int(os.environ.get("BENCH_CONCURRENCY", 32))
+CAPACITY = int(os.environ.get("BENCH_CAPACITY", 12))
+THROTTLE_RATE = float(os.environ.get("BENCH_THROTTLE_RATE", 0.02))
+SLOW_RATE = float(os.environ.get("BENCH_SLOW_RATE", 0.05))
+RETRY_AFTER = float(os.environ.get("BENCH_RETRY_AFTER", 0.2))
+OPENAI, ANTHROPIC = "gpt-4o", "claude-3-sonnet-20240229"
+
+
+def _ms(values: list[float], q: float) -> float:
+    return sorted(values)[min(len(values) - 1, int(q * len(values)))] * 1000 if values else 0.0
+
+
+async def run_async(model) -> tuple[list[float], int, float]:
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    latencies, failed = [], 0
+
+    async def one(i: int) -> None:
+        nonlocal failed
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await model.ainvoke(f"How many rooms are there? ({i})")
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                failed += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(REQUESTS)))
+    return latencies, failed, time.perf_counter() - start
+
+
+def run_sync(model) -> tuple[list[float], int, float]:
+    def one(i: int):
+        start = time.perf_counter()
+        try:
+            model.invoke(f"How many rooms are there? ({i})")
+            return time.perf_counter() - start
+        except Exception:
+            return None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        results = list(pool.map(one, range(REQUESTS)))
+    latencies = [seconds for seconds in results if seconds is not None]
+    return latencies, len(results) - len(latencies), time.perf_counter() - start
+
+
+def report(name: str, result: tuple, servers: dict, scheduler=None) -> int:
+    latencies, failed, seconds = result
+    served = ", ".join(f"{label} {s.counts['requests']} requests/{s.counts['throttled']} 429s" for label, s in servers.items())
+    print(
+        f"{name:34s} ok {len(latencies):4d} failed {failed:3d}  p50 {_ms(latencies, 0.5):6.0f}ms "
+        f"p95 {_ms(latencies, 0.95):6.0f}ms p99 {_ms(latencies, 0.99):6.0f}ms  {seconds:5.1f}s  ({served})"
+    )
+    if scheduler is not None:
+        for model, stats in scheduler.stats().items():
+            counters = ", ".join(f"{key} {stats.get(key, 0)}" for key in ("retries", "failovers", "hedges", "hedge_wins"))
+            print(f"{'':34s} {model}: limit {stats['limit']}, {counters}")
+    for server in servers.values():
+        server.reset()
+    return failed
+
+
+def main():
+    openai = FakeLLMServer(
+        latency=0.05, slow_rate=SLOW_RATE, slow_latency=1.0, throttle_rate=THROTTLE_RATE, capacity=CAPACITY,
+        retry_after=RETRY_AFTER,
+    ).start()
+    anthropic = FakeLLMServer(latency=0.08).start()
+    os.environ.update({
+        "OPENAI_BASE_URL": f"{openai.url}/v1", "OPENAI_API_KEY": "unused",
+        "ANTHROPIC_BASE_URL": anthropic.url, "ANTHROPIC_API_KEY": "unused",
+    })
+    from my_agent.utils.models import build_chat_model
+    from my_agent.utils.scheduler import CallScheduler, ScheduledChatModel
+
+    servers = {"openai": openai, "anthropic": anthropic}
+    print(
+        f"{REQUESTS} requests, {CONCURRENCY} at a time; openai server: 50ms, {SLOW_RATE:.0%} take 1s, "
+        f"429 past {CAPACITY} in flight and for {THROTTLE_RATE:.0%} of requests"
+    )
+
+    def scheduled(models: list[str], **kwargs):
+        scheduler = CallScheduler(backoff_base=0.05, backoff_max=1.0, **kwargs)
+        model = ScheduledChatModel(
+            model=models[0], models=models, factory=lambda name: build_chat_model(name, max_retries=0), scheduler=scheduler,
+        )
+        return model, scheduler
+
+    async def scenarios() -> int:
+        failed = 0
+        report("provider client retries", await run_async(build_chat_model(OPENAI)), servers)
+        model, scheduler = scheduled([OPENAI])
+        failed += report("scheduler", await run_async(model), servers, scheduler)
+        model, scheduler = scheduled([OPENAI, ANTHROPIC])
+        failed += report("scheduler + failover", await run_async(model), servers, scheduler)
+        model, scheduler = scheduled([OPENAI, ANTHROPIC], hedge=True)
+        failed += report("scheduler + failover + hedging", await run_async(model), servers, scheduler)
+        return failed
+
+    failed = asyncio.run(scenarios())
+    model, scheduler = scheduled([OPENAI, ANTHROPIC], hedge=True)
+    failed += report("same, from threads", run_sync(model), servers, scheduler)
+    openai.stop()
+    anthropic.stop()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
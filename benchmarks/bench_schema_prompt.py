@@ -0,0 +1,38 @@
+"""Token counts and render time of each schema prompt rendering.
+
+Counts are exact with tiktoken installed and estimated otherwise. Usage:
+
+    python benchmarks/bench_schema_prompt.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from my_agent.utils.schemas import RENDER_FORMATS, SchemaRegistry, load_schema_registry  # noqa: E402
+
+
+def main():
+    registry = load_schema_registry()
+    print(f"{'collections':28s}" + "".join(f"{fmt:>8s}" for fmt in RENDER_FORMATS) + "  saved(table vs repr)")
+    for collections in [None] + [[name] for name in registry.collections]:
+        counts = registry.token_counts(collections)
+        label = "all" if collections is None else collections[0]
+        saved = 1 - counts["table"] / counts["repr"]
+        print(f"{label:28s}" + "".join(f"{counts[fmt]:8d}" for fmt in RENDER_FORMATS) + f"  {saved:6.1%}")
+
+    for fmt in RENDER_FORMATS:
+        uncached = SchemaRegistry(registry.schemas)
+        start = time.perf_counter()
+        uncached.render(fmt=fmt)
+        first = (time.perf_counter() - start) * 1e6
+        start = time.perf_counter()
+        for _ in range(1000):
+            uncached.render(fmt=fmt)
+        cached = (time.perf_counter() - start) * 1e3
+        print(f"render {fmt:5s} first={first:8.1f}us cached={cached:6.3f}us")
+
+
+if __name__ == "__main__":
+    main()
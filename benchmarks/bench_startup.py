@@ -0,0 +1,129 @@
+"""Cold start: import time of the graph module and time to the first answered question.
+
+Each measurement runs in a fresh interpreter. The first reports the slowest
+imports from `python -X importtime` and checks that no provider SDK or database
+driver is imported with the graph. The second times the import, graph
+construction and the first invoke end to end, with an instant fake model and
+mongomock. Binding the tools from the prebuilt schemas is compared to deriving
+them. Exits with status 1 when a run is over its budget: BENCH_IMPORT_BUDGET_MS
+for the import and BENCH_FIRST_INVOKE_BUDGET_MS for the first answer. Usage:
+
+    python benchmarks/bench_startup.py
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+RUNS = int(os.environ.get("BENCH_RUNS", 5))
+IMPORT_BUDGET_MS = float(os.environ.get("BENCH_IMPORT_BUDGET_MS", 1000))
+FIRST_INVOKE_BUDGET_MS = float(os.environ.get("BENCH_FIRST_INVOKE_BUDGET_MS", 2500))
+# Imported on first use only: provider SDKs, the MongoDB driver and the search tool
+DEFERRED = ["langchain_openai", "langchain_anthropic", "openai", "pymongo", "bson", "langchain_community"]
+
+FIRST_INVOKE = """
+import json, os, sys, time
+start = time.perf_counter()
+from my_agent import agent
+imported = time.perf_counter()
+loaded = sorted(name for name in {deferred!r} if name in sys.modules)
+
+import mongomock
+from benchmarks.dataset import seed_database
+from benchmarks.fakes import FakeChatModel, count_rooms_policy
+from my_agent.utils import models, mongo
+db = mongomock.MongoClient().abraham_baldwin
+seed_database(db, agent.schema_registry)
+mongo.set_client_factory(lambda: db.client)
+model = FakeChatModel(policy=count_rooms_policy)
+models.set_chat_model_factory(lambda **kwargs: model)
+setup = time.perf_counter()
+
+state = agent.graph.invoke({{"messages": [("user", "How many rooms are there?")]}})
+assert state["messages"][-1].content
+answered = time.perf_counter()
+
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from my_agent.utils.tool_schemas import tool_schemas
+timings = {{}}
+for name, schemas in [("prebuilt", lambda: tool_schemas(agent.tools)),
+                      ("derived", lambda: [convert_to_openai_tool(tool) for tool in agent.tools])]:
+    tool_start = time.perf_counter()
+    model.bind_tools(schemas())
+    timings[name] = (time.perf_counter() - tool_start) * 1000
+print(json.dumps({{
+    "import_ms": (imported - start) * 1000,
+    "first_invoke_ms": (answered - setup) * 1000,
+    "total_ms": (answered - start) * 1000 - (setup - imported) * 1000,
+    "bind_prebuilt_ms": timings["prebuilt"],
+    "bind_derived_ms": timings["derived"],
+    "loaded": loaded,
+}}))
+"""
+
+
+def _environment() -> dict:
+    env = dict(os.environ, PYTHONPATH=ROOT, QUERY_CACHE_MAXSIZE="0")
+    env.pop("CHECKPOINT_PATH", None)
+    env.setdefault("OPENAI_API_KEY", "unused")
+    env.setdefault("TAVILY_API_KEY", "unused")
+    return env
+
+
+def import_profile(top: int = 10) -> list[tuple[float, str]]:
+    """Cumulative import times in milliseconds from `python -X importtime`, slowest first."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import my_agent.agent"],
+        cwd=ROOT, env=_environment(), capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative) / 1000, name.strip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def first_invoke() -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", FIRST_INVOKE.format(deferred=DEFERRED)],
+        cwd=ROOT, env=_environment(), capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    print("slowest imports of my_agent.agent (cumulative):")
+    for ms, name in import_profile():
+        print(f"  {ms:8.1f}ms  {name}")
+
+    runs = [first_invoke() for _ in range(RUNS)]
+    loaded = sorted({name for run in runs for name in run["loaded"]})
+    medians = {key: statistics.median(run[key] for run in runs) for key in runs[0] if key != "loaded"}
+    print(
+        f"\nmedian of {RUNS} fresh interpreters: import {medians['import_ms']:.0f}ms, "
+        f"first invoke {medians['first_invoke_ms']:.0f}ms, import + first invoke {medians['total_ms']:.0f}ms"
+    )
+    print(
+        f"bind_tools: prebuilt schemas {medians['bind_prebuilt_ms']:.2f}ms, "
+        f"derived {medians['bind_derived_ms']:.2f}ms"
+    )
+
+    failures = []
+    if loaded:
+        failures.append(f"imported with the graph: {', '.join(loaded)}")
+    if medians["import_ms"] > IMPORT_BUDGET_MS:
+        failures.append(f"import {medians['import_ms']:.0f}ms over the {IMPORT_BUDGET_MS:.0f}ms budget")
+    if medians["total_ms"] > FIRST_INVOKE_BUDGET_MS:
+        failures.append(f"first answer {medians['total_ms']:.0f}ms over the {FIRST_INVOKE_BUDGET_MS:.0f}ms budget")
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
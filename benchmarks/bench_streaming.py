@@ -0,0 +1,107 @@
+"""Time to first token and first progress event when streaming the graph, versus invoke.
+
+A fake streaming model walks identify -> schemas -> query -> execute for a
+question whose query returns 40 rooms, then writes a 60-word answer one word every
+BENCH_TOKEN_LATENCY seconds. Usage:
+
+    python benchmarks/bench_streaming.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("QUERY_CACHE_MAXSIZE", "0")
+
+import mongomock  # noqa: E402
+from langchain_core.messages import AIMessage, AIMessageChunk  # noqa: E402
+
+from benchmarks.fakes import FakeAsyncClient, FakeChatModel, pipeline_policy  # noqa: E402
+from my_agent.utils import models, mongo  # noqa: E402
+
+LLM_LATENCY = float(os.environ.get("BENCH_LLM_LATENCY", 0.2))
+TOKEN_LATENCY = float(os.environ.get("BENCH_TOKEN_LATENCY", 0.02))
+QUESTION = {"messages": [("user", "Which rooms are there?")]}
+ANSWER = " ".join(["The", "university", "has", "forty", "rooms,", "including"] + [f"R{i}," for i in range(54)])
+
+
+def _policy():
+    steps = pipeline_policy()
+
+    def policy(messages) -> AIMessage:
+        message = steps(messages)
+        for call in message.tool_calls:
+            if call["name"] == "execute_pymongo":
+                call["args"] = {"query": "db.rooms.find({})"}
+        if not message.tool_calls and message.content.startswith("There are"):
+            return AIMessage(content=ANSWER)
+        return message
+
+    return policy
+
+
+def _is_answer_token(chunk, metadata) -> bool:
+    return isinstance(chunk, AIMessageChunk) and bool(chunk.content) and metadata.get("langgraph_node") == "assistant"
+
+
+def run_stream(graph) -> dict:
+    start = time.perf_counter()
+    marks, nodes = {}, set()
+    for mode, payload in graph.stream(QUESTION, stream_mode=["messages", "custom", "updates"]):
+        now = time.perf_counter() - start
+        marks.setdefault("first event", now)
+        if mode == "custom":
+            marks.setdefault(f"progress: {payload['event']}", now)
+            if "partial_results" in payload:
+                marks.setdefault("partial results", now)
+        elif mode == "messages":
+            chunk, metadata = payload
+            if isinstance(chunk, AIMessageChunk) and chunk.content:
+                nodes.add(metadata.get("langgraph_node"))
+            if _is_answer_token(chunk, metadata):
+                marks.setdefault("first answer token", now)
+    marks["done"] = time.perf_counter() - start
+    marks["token streams from nodes"] = sorted(nodes)
+    return marks
+
+
+async def run_events(graph) -> dict:
+    start = time.perf_counter()
+    marks = {}
+    async for event in graph.astream_events(QUESTION, version="v2"):
+        now = time.perf_counter() - start
+        if event["event"] == "on_custom_event":
+            marks.setdefault(f"progress: {event['data']['event']}", now)
+            if "partial_results" in event["data"]:
+                marks.setdefault("partial results", now)
+        elif event["event"] == "on_chat_model_stream" and _is_answer_token(event["data"]["chunk"], event["metadata"]):
+            marks.setdefault("first answer token", now)
+    marks["done"] = time.perf_counter() - start
+    return marks
+
+
+def main():
+    db = mongomock.MongoClient().abraham_baldwin
+    db.rooms.insert_many([{"name": f"R{i}"} for i in range(40)])
+    mongo.set_client_factory(lambda: db.client)
+    mongo.set_async_client_factory(lambda: FakeAsyncClient(db, 0))
+    model = FakeChatModel(policy=_policy(), latency=LLM_LATENCY, token_latency=TOKEN_LATENCY)
+    models.set_chat_model_factory(lambda **kwargs: model)
+    from my_agent import agent
+
+    agent.get_response_cache().backend.clear()
+    start = time.perf_counter()
+    result = agent.graph.invoke(QUESTION)
+    print(f"invoke: answer visible after {(time.perf_counter() - start) * 1000:.0f}ms ({len(result['messages'][-1].content.split())} words)")
+
+    for name, run in (("stream", run_stream), ("astream_events", lambda graph: asyncio.run(run_events(graph)))):
+        agent.get_response_cache().backend.clear()
+        marks = run(agent.graph)
+        print(f"{name}:")
+        for mark, value in marks.items():
+            print(f"  {mark:28s} {value if isinstance(value, list) else f'{value * 1000:7.0f}ms'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""Many tenant databases: memory, connections and hot-tenant latency with the bounded tenant pool.
+
+Seeds BENCH_TENANTS small tenant databases and one full-size hot tenant in
+mongomock. The execute_pymongo tool then runs with each run's database in
+config["configurable"]["database"]: first the hot tenant alone, then the hot
+tenant interleaved with passes over every cold tenant. This runs twice:
+with a pool keeping TENANT_CACHE_SIZE tenants, and with an unbounded one. Every
+tenant gets its own (counted) client. It reports open tenants, open clients,
+background threads, traced memory and hot-tenant latency per phase. Exits with
+status 1 when the bounded pool's memory keeps growing with the churn, when it
+keeps more tenants or clients open than its size, or when the hot tenant's p95
+latency degrades by more than BENCH_TOLERANCE (50%). Usage:
+
+    python benchmarks/bench_tenants.py
+"""
+import gc
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+# Finished spans fill a bounded buffer that would show up as growth here
+os.environ.setdefault("METRICS_ENABLED", "0")
+
+import mongomock  # noqa: E402
+
+from benchmarks.dataset import seed_database  # noqa: E402
+from benchmarks.fakes import FakeChatModel  # noqa: E402
+from my_agent.utils import models, mongo  # noqa: E402
+from my_agent.utils.schemas import load_schema_registry  # noqa: E402
+
+TENANTS = int(os.environ.get("BENCH_TENANTS", 200))
+POOL_SIZE = int(os.environ.get("TENANT_CACHE_SIZE", 16))
+ROUNDS = int(os.environ.get("BENCH_ROUNDS", 3))
+TOLERANCE = float(os.environ.get("BENCH_TOLERANCE", 0.5))
+HOT = "inst_hot"
+COLD_SIZES = {"departments": 12, "buildings": 20, "rooms": 60, "professors": 30, "courses": 80}
+HOT_QUERIES = [
+    "db.rooms.count_documents({'capacity': {'$gte': 30}})",
+    "db.rooms.find({'campus': 'Tifton'}).limit(20)",
+    "db.courses.count_documents({})",
+    "db.professors.find({}).limit(10)",
+]
+COLD_QUERIES = [
+    "db.rooms.find({'capacity': {'$gte': 20}}).limit(30)",
+    "db.courses.find({}).limit(30)",
+]
+
+
+class TenantClient:
+    """A tenant's own client: the shared mongomock client, counting opens and closes."""
+
+    opened = closed = 0
+
+    def __init__(self, client):
+        self._client = client
+        TenantClient.opened += 1
+
+    def __getitem__(self, name):
+        return self._client[name]
+
+    def close(self):
+        TenantClient.closed += 1
+
+
+def _ms(values: list[float], q: float) -> float:
+    return sorted(values)[min(len(values) - 1, int(q * len(values)))] * 1000
+
+
+def run(tool, database: str, query: str) -> float:
+    start = time.perf_counter()
+    result = tool.invoke({"query": query}, config={"configurable": {"database": database}})
+    assert not result.startswith(("Error", "Invalid", "Unknown")), result
+    return time.perf_counter() - start
+
+
+def scenario(agent, tool, client, maxsize: int) -> dict:
+    from my_agent.utils.tenants import TenantPool
+
+    agent.tenants.close()
+    agent.tenants = pool = TenantPool(
+        agent.schema_registry, agent.query_compiler, agent.collection_router,
+        maxsize=maxsize, allowed=[HOT, *(f"inst_{tenant:03d}" for tenant in range(TENANTS))],
+        connect=lambda database: TenantClient(client),
+    )
+    TenantClient.opened = TenantClient.closed = 0
+    for query in HOT_QUERIES:
+        run(tool, HOT, query)
+    hot_alone = [run(tool, HOT, query) for _ in range(50) for query in HOT_QUERIES]
+
+    def churn() -> list[float]:
+        """One pass over every cold tenant, each visit after a hot-tenant query."""
+        hot = []
+        for tenant in range(TENANTS):
+            hot.append(run(tool, HOT, HOT_QUERIES[tenant % len(HOT_QUERIES)]))
+            run(tool, f"inst_{tenant:03d}", COLD_QUERIES[tenant % len(COLD_QUERIES)])
+        return hot
+
+    # Memory is traced from the first pass on; latency is measured in a further, untraced pass
+    gc.collect()
+    tracemalloc.start()
+    memory = []
+    for _ in range(ROUNDS):
+        churn()
+        gc.collect()
+        memory.append(tracemalloc.get_traced_memory()[0])
+    tracemalloc.stop()
+    hot_churn = churn()
+    stats = pool.stats()
+    return {
+        "hot_alone_p95": _ms(hot_alone, 0.95),
+        "hot_alone_p50": _ms(hot_alone, 0.5),
+        "hot_churn_p95": _ms(hot_churn, 0.95),
+        "hot_churn_p50": _ms(hot_churn, 0.5),
+        "memory": memory,
+        "open": stats["open"],
+        "evicted": stats["evicted"],
+        "clients": TenantClient.opened - TenantClient.closed,
+        "threads": threading.active_count(),
+        "hot_cache": stats["tenants"].get(HOT, {}).get("query_cache", {}),
+    }
+
+
+def main():
+    client = mongomock.MongoClient()
+    registry = load_schema_registry()
+    start = time.perf_counter()
+    seed_database(client[HOT], registry)
+    for tenant in range(TENANTS):
+        seed_database(client[f"inst_{tenant:03d}"], registry, seed=tenant, sizes=COLD_SIZES)
+    print(f"seeded {TENANTS} tenant databases and {HOT} in {time.perf_counter() - start:.1f}s")
+    mongo.set_client_factory(lambda: client)
+    models.set_chat_model_factory(lambda **kwargs: FakeChatModel())
+    from my_agent import agent
+
+    tool = next(t for t in agent.tools if getattr(t, "name", None) == "execute_pymongo")
+    failures = []
+    for label, maxsize in ((f"pool of {POOL_SIZE}", POOL_SIZE), ("unbounded", TENANTS + 1)):
+        result = scenario(agent, tool, client, maxsize)
+        growth = [f"{m / 1e6:.1f}" for m in result["memory"]]
+        print(
+            f"\n{label}: {result['open']} tenants open, {result['evicted']} evicted, {result['clients']} clients open, "
+            f"{result['threads']} threads\n"
+            f"  traced memory after each round over all tenants: {' -> '.join(growth)} MB\n"
+            f"  hot tenant alone      p50 {result['hot_alone_p50']:6.2f}ms p95 {result['hot_alone_p95']:6.2f}ms\n"
+            f"  hot tenant with churn p50 {result['hot_churn_p50']:6.2f}ms p95 {result['hot_churn_p95']:6.2f}ms"
+            f"  (hot cache {result['hot_cache'].get('hits')} hits, {result['hot_cache'].get('misses')} misses)"
+        )
+        if maxsize != POOL_SIZE:
+            continue
+        first, last = result["memory"][0], result["memory"][-1]
+        if last > first * 1.2:
+            failures.append(f"memory grew from {first / 1e6:.1f}MB to {last / 1e6:.1f}MB")
+        if result["open"] > POOL_SIZE or result["clients"] > POOL_SIZE:
+            failures.append(f"{result['open']} tenants and {result['clients']} clients open with a pool of {POOL_SIZE}")
+        if result["hot_churn_p95"] > result["hot_alone_p95"] * (1 + TOLERANCE) + 0.5:
+            failures.append(f"hot p95 {result['hot_alone_p95']:.2f}ms -> {result['hot_churn_p95']:.2f}ms")
+    agent.tenants.close()
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
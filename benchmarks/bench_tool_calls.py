@@ -0,0 +1,78 @@
+"""Wall-clock latency of a multi-call turn, sequential versus ParallelToolNode.
+
+The turn mixes schema lookups, LLM sub-calls and Mongo queries against fakes with
+fixed latencies, plus one invalid call to show per-call error isolation. Usage:
+
+    python benchmarks/bench_tool_calls.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+# Every run should reach the (fake) database.
+os.environ.setdefault("QUERY_CACHE_MAXSIZE", "0")
+
+import mongomock  # noqa: E402
+from langchain_core.messages import AIMessage  # noqa: E402
+
+from benchmarks.fakes import FakeAsyncClient, FakeChatModel, FakeClient  # noqa: E402
+from my_agent.utils import models, mongo  # noqa: E402
+
+LLM_LATENCY = float(os.environ.get("BENCH_LLM_LATENCY", 0.2))
+DB_LATENCY = float(os.environ.get("BENCH_DB_LATENCY", 0.05))
+
+TOOL_CALLS = [
+    {"name": "mongodb_schemas_for_collections", "args": {"collections": ["rooms"]}},
+    {"name": "mongodb_schemas_for_collections", "args": {"collections": ["buildings"]}},
+    {"name": "mongodb_schemas_for_collections", "args": {"collections": ["courses"]}},
+    {"name": "create_mongodb_query", "args": {"user_query": "how many rooms", "collection_schemas": "rooms"}},
+    {"name": "create_mongodb_query", "args": {"user_query": "how many buildings", "collection_schemas": "buildings"}},
+    {"name": "execute_pymongo", "args": {"query": "db.rooms.count_documents({})"}},
+    {"name": "execute_pymongo", "args": {"query": "db.buildings.count_documents({})"}},
+    {"name": "execute_pymongo", "args": {"query": "db.rooms.drop()"}},
+]
+
+
+def main():
+    db = mongomock.MongoClient().abraham_baldwin
+    db.rooms.insert_many([{"name": f"R{i}"} for i in range(25)])
+    models.set_chat_model_factory(lambda **kwargs: FakeChatModel(latency=LLM_LATENCY))
+    mongo.set_client_factory(lambda: FakeClient(db, DB_LATENCY))
+    mongo.set_async_client_factory(lambda: FakeAsyncClient(db, DB_LATENCY))
+    from my_agent.agent import tool_node
+
+    calls = [{**call, "id": f"call_{i}"} for i, call in enumerate(TOOL_CALLS)]
+    state = {"messages": [AIMessage(content="", tool_calls=calls)]}
+
+    # Disable the response cache so every create_mongodb_query pays the fake LLM latency.
+    from my_agent.utils.cache import get_response_cache
+
+    start = time.perf_counter()
+    for call in calls:
+        get_response_cache().backend.clear()
+        tool_node.tools[call["name"]].invoke(call["args"])
+    sequential = time.perf_counter() - start
+
+    get_response_cache().backend.clear()
+    start = time.perf_counter()
+    result = tool_node.invoke(state)
+    parallel = time.perf_counter() - start
+
+    get_response_cache().backend.clear()
+    start = time.perf_counter()
+    aresult = asyncio.run(tool_node.ainvoke(state))
+    parallel_async = time.perf_counter() - start
+
+    assert [m.tool_call_id for m in result["messages"]] == [c["id"] for c in calls]
+    assert [m.tool_call_id for m in aresult["messages"]] == [c["id"] for c in calls]
+    print(f"{len(calls)} tool calls (fake LLM {LLM_LATENCY * 1000:.0f}ms, fake DB {DB_LATENCY * 1000:.0f}ms)")
+    print(f"sequential        {sequential * 1000:8.1f}ms")
+    print(f"parallel (sync)   {parallel * 1000:8.1f}ms")
+    print(f"parallel (async)  {parallel_async * 1000:8.1f}ms")
+    print(f"last result: {aresult['messages'][-1].content!r}")
+
+
+if __name__ == "__main__":
+    main()
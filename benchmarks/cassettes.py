@@ -0,0 +1,156 @@
+"""Record/replay cassettes for chat models, so benchmarks replay real responses offline.
+
+A cassette maps a prompt (model, bound tools and messages, without tool call ids
+or cache markers) to the responses recorded for it, in order, with their token
+usage and latency. In record mode CassetteChatModel forwards calls to the real
+model (ChatOpenAI or ChatAnthropic, or any chat model) and appends to the
+cassette; in replay mode it answers from the cassette and fails on prompts that
+were never recorded.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, messages_from_dict, message_to_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from benchmarks.fakes import message_chunks, text
+
+
+class CassetteMiss(KeyError):
+    """Raised in replay mode for a prompt the cassette has no response for."""
+
+
+def prompt_key(model: str, tools: list[str], messages) -> str:
+    """Hashes what a response depends on: the model, its bound tools and the messages."""
+    normalized = [
+        [m.type, text(m), [(c["name"], c["args"]) for c in getattr(m, "tool_calls", None) or []]]
+        for m in messages
+    ]
+    payload = json.dumps([model, sorted(tools), normalized], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class Cassette:
+    """Responses recorded per prompt key, loaded from and saved to a JSON file.
+
+    Repeated prompts replay their recorded responses in order; rewind() starts
+    over, e.g. before each benchmark question.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._played = defaultdict(int)
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)["interactions"]
+
+    def rewind(self) -> None:
+        with self._lock:
+            self._played.clear()
+
+    def play(self, key: str) -> tuple[AIMessage, float]:
+        with self._lock:
+            responses = self.entries.get(key)
+            if not responses:
+                raise CassetteMiss(f"No recorded response for prompt {key[:12]} in {self.path}; record it with BENCH_MODE=record")
+            index = min(self._played[key], len(responses) - 1)
+            self._played[key] += 1
+        response = responses[index]
+        return messages_from_dict([response["message"]])[0], response["seconds"]
+
+    def record(self, key: str, message: AIMessage, seconds: float, preview: str) -> None:
+        with self._lock:
+            self.entries.setdefault(key, []).append(
+                {"message": message_to_dict(message), "seconds": round(seconds, 4), "prompt": preview[-200:]}
+            )
+
+    def save(self) -> None:
+        with self._lock:
+            with open(self.path, "w") as f:
+                json.dump({"interactions": self.entries}, f, indent=1, sort_keys=True)
+                f.write("\n")
+
+
+class CassetteChatModel(BaseChatModel):
+    """Chat model that records `inner`'s responses to `cassette`, or replays them when `inner` is None.
+
+    Replayed responses take their recorded latency times `latency_scale`, and stream
+    as one chunk per word (or one chunk of tool calls).
+    """
+
+    cassette: Any
+    model: str
+    inner: Any = None
+    tools: list = []
+    latency_scale: float = 1.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "cassette"
+
+    def bind_tools(self, tools, **kwargs):
+        names = [convert_to_openai_tool(t)["function"]["name"] for t in tools]
+        inner = self.inner.bind_tools(tools, **kwargs) if self.inner is not None else None
+        return self.model_copy(update={"tools": names, "inner": inner})
+
+    def _key(self, messages) -> str:
+        return prompt_key(self.model, self.tools, messages)
+
+    def _respond(self, messages) -> tuple[ChatResult, float]:
+        key = self._key(messages)
+        if self.inner is None:
+            message, seconds = self.cassette.play(key)
+            return ChatResult(generations=[ChatGeneration(message=message)]), seconds * self.latency_scale
+        start = time.perf_counter()
+        # Without callbacks, so the recorded call is not traced twice.
+        message = self.inner.invoke(messages, config={"callbacks": []})
+        self.cassette.record(key, message, time.perf_counter() - start, text(messages[-1]))
+        return ChatResult(generations=[ChatGeneration(message=message)]), 0.0
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        result, delay = self._respond(messages)
+        time.sleep(delay)
+        return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        result, delay = await asyncio.to_thread(self._respond, messages)
+        await asyncio.sleep(delay)
+        return result
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        result, delay = self._respond(messages)
+        time.sleep(delay)
+        yield from message_chunks(result.generations[0].message)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        result, delay = await asyncio.to_thread(self._respond, messages)
+        await asyncio.sleep(delay)
+        for chunk in message_chunks(result.generations[0].message):
+            yield chunk
+
+
+def cassette_factory(cassette: Cassette, inner_factory=None, latency_scale: float = 1.0):
+    """A factory for models.set_chat_model_factory serving every model from `cassette`.
+
+    Args:
+        cassette: cassette to replay from, or to record to
+        inner_factory: callable taking `model`, `temperature` and `timeout` and
+            returning the model to record (e.g. models.build_chat_model); None replays
+        latency_scale: multiplier applied to recorded latencies when replaying
+    """
+
+    def factory(model: str, temperature=None, timeout=None):
+        inner = inner_factory(model=model, temperature=temperature, timeout=timeout) if inner_factory else None
+        return CassetteChatModel(cassette=cassette, model=model, inner=inner, latency_scale=latency_scale)
+
+    return factory
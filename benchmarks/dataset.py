@@ -0,0 +1,129 @@
+"""Seeded university dataset matching `my_agent/schemas.json`, for offline benchmarks.
+
+Every field of every collection in the schema registry gets a value of its
+declared type. Fields the benchmark corpus asks about (departments, buildings,
+capacities, statuses, ...) draw from a small realistic vocabulary and reference
+each other (rooms point at buildings, courses and professors share departments),
+so generated queries return meaningful results. Documents get deterministic
+ObjectIds, so results and the prompts built from them are identical across runs.
+"""
+import random
+
+from bson import ObjectId
+
+DEFAULT_SIZES = {"departments": 12, "buildings": 20, "rooms": 400, "professors": 150, "courses": 600}
+NOW = 1704067200
+
+DEPARTMENTS = [
+    ("Biology", "BIO"), ("Chemistry", "CHEM"), ("Mathematics", "MATH"), ("History", "HIST"),
+    ("English", "ENGL"), ("Computer Science", "CSCI"), ("Physics", "PHYS"), ("Economics", "ECON"),
+    ("Psychology", "PSYC"), ("Music", "MUSC"), ("Nursing", "NURS"), ("Agriculture", "AGRI"),
+]
+COLLEGES = {
+    "Nursing": "School of Nursing", "Agriculture": "College of Agriculture", "Economics": "College of Business",
+}
+BUILDINGS = [
+    "Herring Hall", "Yow Hall", "Lewis Hall", "Carlton Center", "Howard Auditorium", "Gressette Gym",
+    "Bussey Hall", "King Hall", "Tift Hall", "Baldwin Library", "Conger Hall", "Evans Hall", "Branch Hall",
+    "Chambliss Building", "Powell Hall", "Stallings Hall", "Peterson Hall", "Forbes Hall", "Mitchell Hall", "Daniel Hall",
+]
+CAMPUSES = ["Tifton", "Bainbridge"]
+FEATURES = ["Projector", "Whiteboard", "Lab Benches", "Piano", "Video Conferencing", "Computers"]
+PROFESSOR_TYPES = ["Full Time", "Part Time", "Adjunct"]
+FIRST_NAMES = ["Ana", "Ben", "Carla", "Dev", "Elena", "Femi", "Grace", "Hiro", "Iris", "Jon", "Kara", "Luis"]
+LAST_NAMES = ["Adams", "Baker", "Chen", "Diaz", "Evans", "Foster", "Garcia", "Hughes", "Ito", "Jones", "Khan", "Lopez"]
+COURSE_TITLES = ["Introduction to", "Principles of", "Topics in", "Advanced", "Seminar in", "Foundations of"]
+
+
+def _department(rng: random.Random) -> tuple[str, str]:
+    return DEPARTMENTS[rng.randrange(len(DEPARTMENTS))]
+
+
+def _overrides(collection: str, i: int, rng: random.Random, context: dict) -> dict:
+    if collection == "departments":
+        name, code = DEPARTMENTS[i % len(DEPARTMENTS)]
+        return {"name": name, "displayName": f"Department of {name}", "subjectCodes": code, "status": "active"}
+    if collection == "buildings":
+        name = BUILDINGS[i % len(BUILDINGS)]
+        return {
+            "id": f"bldg-{i}", "name": name, "displayName": name,
+            "city": CAMPUSES[0] if i % 5 else CAMPUSES[1], "state": "GA",
+            "departments": sorted({_department(rng)[0] for _ in range(rng.randint(1, 3))}),
+        }
+    if collection == "rooms":
+        building = i % len(BUILDINGS)
+        capacity = rng.choice([12, 20, 24, 30, 35, 40, 48, 60, 80, 120, 150, 250])
+        return {
+            "id": f"room-{i}", "name": f"{BUILDINGS[building].split()[0]} {100 + i}", "roomNumber": str(100 + i),
+            "buildingId": f"bldg-{building}", "buildingDisplayName": BUILDINGS[building],
+            "campus": CAMPUSES[0] if building % 5 else CAMPUSES[1], "floor": str(1 + i % 3),
+            "capacity": capacity, "minCapacity": capacity // 4,
+            "departments": sorted({_department(rng)[0] for _ in range(rng.randint(0, 2))}),
+            "features": rng.sample(FEATURES, rng.randint(0, 3)), "status": "active" if i % 10 else "inactive",
+            "online": i % 25 == 0,
+        }
+    if collection == "professors":
+        department = _department(rng)[0]
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        return {
+            "id": f"prof-{i}", "firstName": first, "lastName": last, "email": f"{first}.{last}{i}@abac.edu".lower(),
+            "type": PROFESSOR_TYPES[i % len(PROFESSOR_TYPES)], "departments": [department],
+            "status": "active" if i % 12 else "inactive",
+        }
+    if collection == "courses":
+        department, code = _department(rng)
+        number = str(100 + (i * 7) % 400)
+        sections = {
+            f"sec-{i}-{s}": {"professorId": f"prof-{rng.randrange(context['professors'])}", "roomId": f"room-{rng.randrange(context['rooms'])}"}
+            for s in range(rng.randint(1, 3))
+        }
+        return {
+            "id": f"course-{i}", "code": f"{code}{number}", "subjectCode": code, "courseNumber": number,
+            "name": f"{rng.choice(COURSE_TITLES)} {department}", "departments": [department],
+            "college": COLLEGES.get(department, "College of Arts & Sciences"),
+            "status": "active" if i % 8 else "inactive", "lastEdited": NOW - rng.randrange(86400 * 365),
+            "sections": sections,
+        }
+    return {}
+
+
+def _value(field: str, spec: dict, i: int, rng: random.Random):
+    kind = spec.get("type")
+    if kind == "integer":
+        return rng.randrange(100)
+    if kind == "number":
+        return round(rng.random() * 10, 2)
+    if kind == "boolean":
+        return rng.random() < 0.5
+    if kind == "array":
+        return []
+    if kind == "object":
+        return {}
+    return f"{field} {i}"
+
+
+def generate(registry, seed: int = 0, sizes: dict | None = None) -> dict[str, list[dict]]:
+    """Returns the documents of every collection in `registry`, seeded by `seed`."""
+    rng = random.Random(seed)
+    sizes = {**DEFAULT_SIZES, **(sizes or {})}
+    documents = {}
+    for schema in registry.schemas:
+        collection = schema["collection"]
+        docs = []
+        for i in range(sizes.get(collection, 50)):
+            document = {"_id": ObjectId(rng.randbytes(12))}
+            document.update({field: _value(field, spec, i, rng) for field, spec in schema["fields"].items()})
+            document.update(_overrides(collection, i, rng, sizes))
+            docs.append(document)
+        documents[collection] = docs
+    return documents
+
+
+def seed_database(db, registry, seed: int = 0, sizes: dict | None = None) -> dict[str, int]:
+    """Replaces the collections of `db` (mongomock or a local mongod) with the seeded dataset."""
+    counts = {}
+    for collection, docs in generate(registry, seed, sizes).items():
+        db[collection].delete_many({})
+        db[collection].insert_many(docs)
+        counts[collection] = len(docs)
+    return counts
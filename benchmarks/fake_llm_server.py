@@ -0,0 +1,228 @@
+"""Local HTTP server speaking the OpenAI and Anthropic chat APIs, with injected latency and 429s.
+
+ChatOpenAI and ChatAnthropic talk to it unchanged through their base URL
+(OPENAI_BASE_URL, ANTHROPIC_BASE_URL), so the real clients' errors, headers and
+streaming are exercised. Every request takes `latency` seconds, or `slow_latency`
+with probability `slow_rate`. A request gets a 429 (with a Retry-After header when
+`retry_after` is set) with probability `throttle_rate`, or when `capacity`
+requests are already in flight, and a 500 with probability `error_rate`. Usage:
+
+    python benchmarks/fake_llm_server.py --port 8900 --throttle-rate 0.1
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = "There are 400 rooms."
+
+
+class FakeLLMServer:
+    def __init__(
+        self,
+        port: int = 0,
+        latency: float = 0.05,
+        slow_latency: float = 1.0,
+        slow_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        error_rate: float = 0.0,
+        capacity: int | None = None,
+        retry_after: float | None = None,
+        reply: str = REPLY,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.slow_latency = slow_latency
+        self.slow_rate = slow_rate
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.capacity = capacity
+        self.retry_after = retry_after
+        self.reply = reply
+        self.counts = Counter()
+        self.in_flight = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeLLMServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counts.clear()
+
+    def _admit(self) -> tuple[int, float]:
+        """The status to answer the request with, and how long it takes."""
+        with self._lock:
+            self.counts["requests"] += 1
+            full = self.capacity is not None and self.in_flight >= self.capacity
+            if full or self._random.random() < self.throttle_rate:
+                self.counts["throttled"] += 1
+                return 429, 0.0
+            if self._random.random() < self.error_rate:
+                self.counts["errors"] += 1
+                return 500, 0.0
+            self.in_flight += 1
+            slow = self._random.random() < self.slow_rate
+            self.counts["slow" if slow else "served"] += 1
+            return 200, self.slow_latency if slow else self.latency
+
+    def _done(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                anthropic = self.path.rstrip("/").endswith("/messages")
+                status, seconds = server._admit()
+                if status == 429:
+                    self._throttled(anthropic)
+                    return
+                if status != 200:
+                    self._failed(anthropic, status)
+                    return
+                try:
+                    time.sleep(seconds)
+                    prompt_tokens = len(json.dumps(body.get("messages", []))) // 4
+                    if anthropic:
+                        self._anthropic(body, prompt_tokens)
+                    else:
+                        self._openai(body, prompt_tokens)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up on the request, e.g. the losing half of a hedge
+                    self.close_connection = True
+                finally:
+                    server._done()
+
+            def _send(self, status: int, payload: dict, headers: dict | None = None) -> None:
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _throttled(self, anthropic: bool) -> None:
+                headers = {"retry-after": str(server.retry_after)} if server.retry_after is not None else {}
+                error = {"type": "rate_limit_error", "message": "Rate limit reached"}
+                self._send(429, {"type": "error", "error": error} if anthropic else {"error": error}, headers)
+
+            def _failed(self, anthropic: bool, status: int) -> None:
+                error = {"type": "api_error", "message": "Internal server error"}
+                self._send(status, {"type": "error", "error": error} if anthropic else {"error": error})
+
+            def _events(self, events) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for event, payload in events:
+                    prefix = f"event: {event}\n" if event else ""
+                    data = payload if isinstance(payload, str) else json.dumps(payload)
+                    self.wfile.write(f"{prefix}data: {data}\n\n".encode())
+                    self.wfile.flush()
+                self.close_connection = True
+
+            def _openai(self, body: dict, prompt_tokens: int) -> None:
+                words = server.reply.split(" ")
+                usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words), "total_tokens": prompt_tokens + len(words)}
+                base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(time.time()), "model": body.get("model", "")}
+                if not body.get("stream"):
+                    message = {"role": "assistant", "content": server.reply}
+                    choice = {"index": 0, "message": message, "finish_reason": "stop"}
+                    self._send(200, {**base, "object": "chat.completion", "choices": [choice], "usage": usage})
+                    return
+                chunk = {**base, "object": "chat.completion.chunk"}
+                events = [
+                    (None, {**chunk, "choices": [{"index": 0, "delta": {"role": "assistant", "content": word if i == 0 else f" {word}"}, "finish_reason": None}]})
+                    for i, word in enumerate(words)
+                ]
+                events.append((None, {**chunk, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}))
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    events.append((None, {**chunk, "choices": [], "usage": usage}))
+                events.append((None, "[DONE]"))
+                self._events(events)
+
+            def _anthropic(self, body: dict, prompt_tokens: int) -> None:
+                words = server.reply.split(" ")
+                message = {
+                    "id": f"msg_{uuid.uuid4().hex[:12]}", "type": "message", "role": "assistant", "model": body.get("model", ""),
+                    "stop_reason": "end_turn", "stop_sequence": None,
+                }
+                if not body.get("stream"):
+                    content = [{"type": "text", "text": server.reply}]
+                    usage = {"input_tokens": prompt_tokens, "output_tokens": len(words)}
+                    self._send(200, {**message, "content": content, "usage": usage})
+                    return
+                start = {**message, "content": [], "stop_reason": None, "usage": {"input_tokens": prompt_tokens, "output_tokens": 1}}
+                events = [
+                    ("message_start", {"type": "message_start", "message": start}),
+                    ("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}}),
+                ]
+                events += [
+                    ("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": word if i == 0 else f" {word}"}})
+                    for i, word in enumerate(words)
+                ]
+                events += [
+                    ("content_block_stop", {"type": "content_block_stop", "index": 0}),
+                    ("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None}, "usage": {"output_tokens": len(words)}}),
+                    ("message_stop", {"type": "message_stop"}),
+                ]
+                self._events(events)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve fake OpenAI and Anthropic chat APIs.")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--slow-latency", type=float, default=1.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--capacity", type=int, default=None)
+    parser.add_argument("--retry-after", type=float, default=None)
+    args = parser.parse_args()
+    server = FakeLLMServer(
+        args.port, args.latency, args.slow_latency, args.slow_rate, args.throttle_rate, args.error_rate, args.capacity,
+        args.retry_after,
+    )
+    print(f"serving on {server.url} (OPENAI_BASE_URL={server.url}/v1, ANTHROPIC_BASE_URL={server.url})")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
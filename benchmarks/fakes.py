@@ -0,0 +1,361 @@
+"""Fake chat models and Mongo databases with injectable latency for offline benchmarks."""
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+COUNT_ROOMS = "db.rooms.count_documents({})"
+
+
+def text(message) -> str:
+    """The text of a message whose content is a string or a list of content blocks."""
+    if isinstance(message.content, str):
+        return message.content
+    return "".join(block.get("text", "") if isinstance(block, dict) else str(block) for block in message.content)
+
+
+def is_agent_prompt(messages) -> bool:
+    """Whether this is the assistant's prompt rather than a sub-call made by a tool or the planner."""
+    return isinstance(messages[0], SystemMessage) and "helpful assistant" in text(messages[0])
+
+
+def is_draft_prompt(messages) -> bool:
+    """Whether this is the fast path's query draft, answered with a JSON object."""
+    return isinstance(messages[0], SystemMessage) and "Reply with a JSON object" in text(messages[0])
+
+
+def _conversation(messages) -> list:
+    """The agent prompt without the plan that follows the history."""
+    return [m for m in messages if not isinstance(m, SystemMessage) or m is messages[0]]
+
+
+def count_rooms_policy(messages) -> AIMessage:
+    """Answers like the agent on 'how many rooms': one execute_pymongo call, then a summary."""
+    if is_draft_prompt(messages):
+        return AIMessage(content=json.dumps({"query": COUNT_ROOMS}))
+    if not is_agent_prompt(messages):
+        # Sub-calls made by tools (query drafting, routing, planning).
+        return AIMessage(content=COUNT_ROOMS)
+    last = _conversation(messages)[-1]
+    if isinstance(last, HumanMessage):
+        return AIMessage(
+            content="",
+            tool_calls=[{"name": "execute_pymongo", "args": {"query": COUNT_ROOMS}, "id": f"call_{len(messages)}"}],
+        )
+    return AIMessage(content=f"There are {last.content} rooms.")
+
+
+PIPELINE = [
+    ("identify_relevant_mongodb_collections", lambda question: {"user_query": question}),
+    ("mongodb_schemas_for_collections", lambda question: {"collections": ["rooms"]}),
+    ("create_mongodb_query", lambda question: {"user_query": question, "collection_schemas": "rooms"}),
+    ("execute_pymongo", lambda question: {"query": COUNT_ROOMS}),
+]
+
+
+def pipeline_policy(legacy: bool = False):
+    """Walks the full identify -> schemas -> query -> execute pipeline like gpt-4o does.
+
+    With `legacy`, the assistant calls update_plan before and after every step, as
+    the original system prompt instructed.
+    """
+
+    def policy(messages) -> AIMessage:
+        if is_draft_prompt(messages):
+            return AIMessage(content=json.dumps({"query": COUNT_ROOMS}))
+        if not is_agent_prompt(messages):
+            # Sub-calls made by tools: planning or query drafting.
+            prompt = text(messages[0])
+            return AIMessage(content="1. Execute the query\n2. Answer the user" if "planner" in prompt else COUNT_ROOMS)
+
+        messages = _conversation(messages)
+        start = max(i for i, m in enumerate(messages) if isinstance(m, HumanMessage))
+        question = messages[start].content
+        turn = messages[start + 1:]
+        steps = [m for m in turn if isinstance(m, ToolMessage) and m.name != "update_plan"]
+        last = messages[-1]
+        if legacy and (isinstance(last, HumanMessage) or (isinstance(last, ToolMessage) and last.name != "update_plan")):
+            name, args = "update_plan", {
+                "goal": question, "current_plan": "", "completed_steps": "", "new_observations": str(last.content),
+                "available_tools": "",
+            }
+        elif len(steps) < len(PIPELINE):
+            name, make_args = PIPELINE[len(steps)]
+            args = make_args(question)
+        else:
+            return AIMessage(content=f"There are {steps[-1].content} rooms.")
+        return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": f"call_{len(messages)}"}])
+
+    return policy
+
+
+def corpus_policy(corpus: list[dict]):
+    """Answers a benchmark corpus like gpt-4o would, from each entry's gold collections, query or rollup.
+
+    Entries with a `rollup` are answered with materialized_statistics, the others
+    by walking identify -> schemas -> query -> execute with the entry's query.
+    """
+    entries = {entry["question"]: entry for entry in corpus}
+
+    def policy(messages) -> AIMessage:
+        if not is_agent_prompt(messages):
+            # Sub-calls made by tools or the planner; the question is in their last message.
+            prompt, question = text(messages[0]), text(messages[-1])
+            entry = next((e for q, e in entries.items() if q in question), None)
+            if "planner" in prompt or entry is None:
+                return AIMessage(content="1. Run the query\n2. Answer the user")
+            if "collections in MongoDB are relevant" in prompt:
+                return AIMessage(content=", ".join(entry["collections"]))
+            if is_draft_prompt(messages):
+                return AIMessage(content=json.dumps({"query": entry["query"]}))
+            return AIMessage(content=entry["query"])
+
+        messages = _conversation(messages)
+        start = max(i for i, m in enumerate(messages) if isinstance(m, HumanMessage))
+        question = text(messages[start])
+        entry = entries[question]
+        results = [m for m in messages[start + 1:] if isinstance(m, ToolMessage)]
+        if "rollup" in entry:
+            steps = [("materialized_statistics", lambda: entry["rollup"])]
+        else:
+            steps = [
+                ("identify_relevant_mongodb_collections", lambda: {"user_query": question}),
+                ("mongodb_schemas_for_collections", lambda: {"collections": entry["collections"]}),
+                ("create_mongodb_query", lambda: {"user_query": question, "collection_schemas": ", ".join(entry["collections"])}),
+                # The drafted query is run as is, as the system prompt asks.
+                ("execute_pymongo", lambda: {"query": results[-1].content}),
+            ]
+        if len(results) >= len(steps):
+            return AIMessage(content=f"Here is what I found: {results[-1].content[:400]}")
+        name, make_args = steps[len(results)]
+        return AIMessage(content="", tool_calls=[{"name": name, "args": make_args(), "id": f"call_{len(messages)}"}])
+
+    return policy
+
+
+def message_chunks(message: AIMessage) -> list[ChatGenerationChunk]:
+    """Splits a response into streamed chunks: one for tool calls, otherwise one per word."""
+    if message.tool_calls:
+        tool_call_chunks = [
+            {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": i}
+            for i, call in enumerate(message.tool_calls)
+        ]
+        chunks = [AIMessageChunk(content="", tool_call_chunks=tool_call_chunks)]
+    else:
+        words = text(message).split(" ")
+        chunks = [AIMessageChunk(content=word if i == 0 else f" {word}") for i, word in enumerate(words)]
+    chunks[-1].usage_metadata = message.usage_metadata
+    return [ChatGenerationChunk(message=chunk) for chunk in chunks]
+
+
+def _segments(messages) -> list[str]:
+    segments = []
+    for message in messages:
+        blocks = message.content if isinstance(message.content, list) else [message.content]
+        segments.extend(f"{message.type}:{block.get('text', '') if isinstance(block, dict) else block}" for block in blocks)
+        if getattr(message, "tool_calls", None):
+            segments.append(json.dumps(message.tool_calls, sort_keys=True))
+    return segments
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that answers from `policy` after sleeping `latency` seconds.
+
+    With `prefix_cache`, it simulates provider prompt caching: the longest prefix of
+    whole content blocks already seen in an earlier prompt (and at least
+    `min_cached_tokens` long) is reported as cache_read tokens, and only the other
+    prompt tokens add `prefill_latency` seconds each before the first token.
+
+    Streaming yields the answer word by word, `token_latency` seconds apart.
+    """
+
+    policy: Any = count_rooms_policy
+    latency: float = 0.0
+    calls: list = []
+    prefix_cache: bool = False
+    min_cached_tokens: int = 1024
+    prefill_latency: float = 0.0
+    token_latency: float = 0.0
+    seen_prefixes: set = set()
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _cached_tokens(self, messages, record: bool = True) -> tuple[int, int]:
+        """Returns the prompt tokens and how many of them were a cache hit."""
+        prefix, tokens, cached = hashlib.sha256(), 0, 0
+        for segment in _segments(messages):
+            prefix.update(segment.encode())
+            tokens += len(segment) // 4
+            key = prefix.hexdigest()
+            if self.prefix_cache and key in self.seen_prefixes and tokens >= self.min_cached_tokens:
+                cached = tokens
+            if record:
+                self.seen_prefixes.add(key)
+        return tokens, cached
+
+    def _respond(self, messages) -> ChatResult:
+        self.calls.append(messages)
+        message = self.policy(messages)
+        prompt_tokens, cached = self._cached_tokens(messages)
+        message.usage_metadata = {
+            "input_tokens": prompt_tokens,
+            "output_tokens": len(str(message.content)) // 4 + 1,
+            "total_tokens": prompt_tokens + len(str(message.content)) // 4 + 1,
+            "input_token_details": {"cache_read": cached},
+        }
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _delay(self, messages) -> float:
+        if not self.prefill_latency:
+            return self.latency
+        prompt_tokens, cached = self._cached_tokens(messages, record=False)
+        return self.latency + (prompt_tokens - cached) * self.prefill_latency
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self._delay(messages))
+        return self._respond(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self._delay(messages))
+        return self._respond(messages)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self._delay(messages))
+        for i, chunk in enumerate(message_chunks(self._respond(messages).generations[0].message)):
+            if i:
+                time.sleep(self.token_latency)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self._delay(messages))
+        for i, chunk in enumerate(message_chunks(self._respond(messages).generations[0].message)):
+            if i:
+                await asyncio.sleep(self.token_latency)
+            yield chunk
+
+
+class SlowDatabase:
+    """Wraps a (mongomock) database so every collection call takes `latency` seconds."""
+
+    def __init__(self, db, latency: float):
+        self._db = db
+        self.latency = latency
+
+    def __getitem__(self, name):
+        return _SlowCollection(self._db[name], self.latency)
+
+
+class _SlowCollection:
+    def __init__(self, collection, latency: float):
+        self._collection = collection
+        self.latency = latency
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+
+        def call(*args, **kwargs):
+            time.sleep(self.latency)
+            return method(*args, **kwargs)
+
+        return call
+
+
+class AsyncSlowDatabase:
+    """Async counterpart of SlowDatabase, exposing the AsyncMongoClient collection API."""
+
+    def __init__(self, db, latency: float):
+        self._db = db
+        self.latency = latency
+
+    def __getitem__(self, name):
+        return _AsyncSlowCollection(self._db[name], self.latency)
+
+
+class _AsyncSlowCollection:
+    def __init__(self, collection, latency: float):
+        self._collection = collection
+        self.latency = latency
+
+    async def _call(self, name, *args, **kwargs):
+        await asyncio.sleep(self.latency)
+        return getattr(self._collection, name)(*args, **kwargs)
+
+    async def count_documents(self, *args, **kwargs):
+        return await self._call("count_documents", *args, **kwargs)
+
+    async def distinct(self, *args, **kwargs):
+        return await self._call("distinct", *args, **kwargs)
+
+    async def find_one(self, *args, **kwargs):
+        return await self._call("find_one", *args, **kwargs)
+
+    async def aggregate(self, *args, **kwargs):
+        return _AsyncCursor(await self._call("aggregate", *args, **kwargs))
+
+    def find(self, *args, **kwargs):
+        return _AsyncCursor(self._collection.find(*args, **kwargs), self.latency)
+
+
+class _AsyncCursor:
+    def __init__(self, cursor, latency: float = 0.0):
+        self._cursor = cursor
+        self._latency = latency
+
+    def sort(self, *args, **kwargs):
+        self._cursor = self._cursor.sort(*args, **kwargs)
+        return self
+
+    def skip(self, *args):
+        self._cursor = self._cursor.skip(*args)
+        return self
+
+    def limit(self, *args):
+        self._cursor = self._cursor.limit(*args)
+        return self
+
+    def batch_size(self, *args):
+        return self
+
+    async def close(self):
+        pass
+
+    async def __aiter__(self):
+        await asyncio.sleep(self._latency)
+        for document in self._cursor:
+            yield document
+
+
+class FakeAsyncClient:
+    """AsyncMongoClient stand-in handing out an AsyncSlowDatabase for any name."""
+
+    def __init__(self, db, latency: float):
+        self._database = AsyncSlowDatabase(db, latency)
+
+    def __getitem__(self, name):
+        return self._database
+
+    def close(self):
+        pass
+
+
+class FakeClient:
+    """MongoClient stand-in handing out a SlowDatabase for any name."""
+
+    def __init__(self, db, latency: float):
+        self._database = SlowDatabase(db, latency)
+
+    def __getitem__(self, name):
+        return self._database
+
+    def close(self):
+        pass
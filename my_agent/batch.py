@@ -0,0 +1,137 @@
+"""Answers a JSONL file of questions in one run, sharing work between them. Usage:
+
+    python -m my_agent.batch questions.jsonl answers.jsonl [--concurrency 8] [--database name]
+
+Each input line is {"id": ..., "question": ...} (or a bare JSON string). Questions
+run through the graph with bounded concurrency; answers are appended to the
+output as they finish, one {"id", "question", "answer", "seconds"} (or "error")
+line per question, in completion order.
+
+Work shared between questions is done once: repeated questions are answered once,
+LLM collection routing for every question is sent up front in one batched call,
+and identical routing calls, query drafts and queries are merged for the whole
+run (see SharedWork).
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from langgraph.constants import TAG_NOSTREAM
+
+from my_agent import agent
+from my_agent.utils.cache import normalize_query
+from my_agent.utils.models import get_chat_model
+from my_agent.utils.prompts import for_model
+from my_agent.utils.tenants import CONFIG_KEY
+
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", 8))
+
+
+def read_questions(path: str) -> list[dict]:
+    questions = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if isinstance(entry, str):
+                entry = {"question": entry}
+            questions.append({"id": entry.get("id", number), "question": entry["question"]})
+    return questions
+
+
+async def prefetch_routes(questions: list[str], concurrency: int = BATCH_CONCURRENCY, tenant=None) -> int:
+    """Routes every question the keyword router is unsure about with one batched LLM call.
+
+    Questions are routed over the schemas of `tenant`, the current run's when omitted.
+    The answers are kept by agent.shared_work for the current batch, so the
+    identify_relevant_mongodb_collections tool calls made later reuse them.
+    """
+    tenant = tenant or agent.tenants.current()
+    pending = {}
+    for question in questions:
+        route = tenant.collection_router.route(question)
+        if route.confidence < agent.ROUTER_CONFIDENCE_THRESHOLD:
+            pending.setdefault(agent._route_key(question, tenant), question)
+    if not pending:
+        return 0
+    gpt4o_chat = get_chat_model("gpt-4o", temperature=0).with_config(tags=[TAG_NOSTREAM])
+    prompts = [for_model(agent._routing_prompt(question, tenant), gpt4o_chat) for question in pending.values()]
+    responses = await gpt4o_chat.abatch(prompts, config={"max_concurrency": concurrency}, return_exceptions=True)
+    # Failed routes are left to the tool call, which retries them
+    for key, response in zip(pending, responses):
+        if not isinstance(response, Exception):
+            agent.shared_work.seed("route", key, agent._parse_collections(response.content, tenant))
+    return len(pending)
+
+
+async def run_batch(questions: list[dict], output, concurrency: int = BATCH_CONCURRENCY, graph=None, config=None) -> dict:
+    """Answers `questions`, writing a JSON line per question to the `output` file object.
+
+    `config` is passed to every run, e.g. to pick the tenant database with
+    {"configurable": {"database": ...}}. Returns a report with the run time,
+    throughput and how much work was shared.
+    """
+    graph = graph or agent.graph
+    tenant = agent.tenants.current(config)
+    # Questions that only differ in case, spacing or trailing punctuation are answered once
+    groups = {}
+    for entry in questions:
+        groups.setdefault(normalize_query(entry["question"]), []).append(entry)
+    semaphore = asyncio.Semaphore(concurrency)
+    errors = 0
+
+    async def answer(entries: list[dict]) -> None:
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                state = await graph.ainvoke({"messages": [("user", entries[0]["question"])]}, config)
+                result = {"answer": state["messages"][-1].content}
+            except Exception as e:
+                errors += len(entries)
+                result = {"error": f"{type(e).__name__}: {e}"}
+            result["seconds"] = round(time.perf_counter() - start, 3)
+        for entry in entries:
+            output.write(json.dumps({"id": entry["id"], "question": entry["question"], **result}) + "\n")
+        output.flush()
+
+    start = time.perf_counter()
+    with agent.shared_work.batch():
+        agent.shared_work.clear()
+        routed = await prefetch_routes([entries[0]["question"] for entries in groups.values()], concurrency, tenant)
+        await asyncio.gather(*(answer(entries) for entries in groups.values()))
+        shared = agent.shared_work.stats()
+    seconds = time.perf_counter() - start
+    return {
+        "questions": len(questions),
+        "unique_questions": len(groups),
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "questions_per_minute": round(len(questions) / seconds * 60, 1) if seconds else None,
+        "batched_routes": routed,
+        **shared,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions with the agent graph.")
+    parser.add_argument("questions", help="input JSONL, one question per line")
+    parser.add_argument("answers", help="output JSONL, appended to as answers finish")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="questions answered at once")
+    parser.add_argument("--database", help="tenant database to answer from, MONGODB_DATABASE by default")
+    args = parser.parse_args(argv)
+
+    questions = read_questions(args.questions)
+    config = {"configurable": {CONFIG_KEY: args.database}} if args.database else None
+    with open(args.answers, "w") as output:
+        report = asyncio.run(run_batch(questions, output, args.concurrency, config=config))
+    print(json.dumps(report, indent=1), file=sys.stderr)
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+import hashlib
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+
+class InMemoryBackend:
+    """Thread-safe LRU mapping whose entries expire `ttl` seconds after being set."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value) -> None:
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def items(self) -> list:
+        now = time.monotonic()
+        with self._lock:
+            return [(key, value) for key, (value, expires) in self._data.items() if expires is None or expires >= now]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteBackend:
+    """On-disk LRU mapping of strings with the same TTL semantics as InMemoryBackend."""
+
+    def __init__(self, path: str, maxsize: int = 100_000, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, expires REAL, accessed REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, expires = row
+            if expires is not None and expires < now:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        expires = now + self.ttl if self.ttl else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, expires, now),
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+            if count > self.maxsize:
+                self._conn.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed LIMIT ?)",
+                    (count - self.maxsize,),
+                )
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+def normalize_query(user_query: str) -> str:
+    """Lowercases the query, collapses whitespace and drops trailing punctuation."""
+    return re.sub(r"\s+", " ", user_query).strip().rstrip("?.!").strip().lower()
+
+
+def _cosine(a: list[float], b: list[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class ResponseCache:
+    """Caches model responses by user query and the schemas the prompt was built from.
+
+    Lookups try an exact match on the normalized query first. When an `embeddings`
+    model is given, a miss then falls back to the most similar cached query for the
+    same schemas, accepted if its cosine similarity reaches `similarity_threshold`.
+    """
+
+    def __init__(self, backend=None, embeddings=None, similarity_threshold: float = 0.95, max_semantic_entries: int = 1024):
+        self.backend = backend if backend is not None else InMemoryBackend()
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self._vectors = InMemoryBackend(maxsize=max_semantic_entries)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _schema_hash(collection_schemas) -> str:
+        if not isinstance(collection_schemas, str):
+            collection_schemas = json.dumps(collection_schemas, sort_keys=True, default=str)
+        return hashlib.sha256(collection_schemas.strip().encode()).hexdigest()[:16]
+
+    def key(self, user_query: str, collection_schemas) -> str:
+        return f"{self._schema_hash(collection_schemas)}:{normalize_query(user_query)}"
+
+    def get(self, user_query: str, collection_schemas):
+        key = self.key(user_query, collection_schemas)
+        value = self.backend.get(key)
+        if value is not None:
+            self._count("hits")
+            return value
+
+        if self.embeddings is not None:
+            schema_hash = self._schema_hash(collection_schemas)
+            vector = self.embeddings.embed_query(normalize_query(user_query))
+            best_key, best_score = None, self.similarity_threshold
+            for candidate_key, candidate in self._vectors.items():
+                if not candidate_key.startswith(schema_hash):
+                    continue
+                score = _cosine(vector, candidate)
+                if score >= best_score:
+                    best_key, best_score = candidate_key, score
+            if best_key is not None:
+                value = self.backend.get(best_key)
+                if value is not None:
+                    self._count("semantic_hits")
+                    return value
+
+        self._count("misses")
+        return None
+
+    def set(self, user_query: str, collection_schemas, value: str) -> None:
+        key = self.key(user_query, collection_schemas)
+        self.backend.set(key, value)
+        if self.embeddings is not None:
+            self._vectors.set(key, self.embeddings.embed_query(normalize_query(user_query)))
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters and the current number of entries."""
+        return {
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "size": len(self.backend),
+        }
+
+
+@lru_cache(maxsize=1)
+def get_response_cache() -> ResponseCache:
+    """Returns the response cache configured by the environment.
+
+    RESPONSE_CACHE_PATH selects the SQLite backend (in-memory otherwise),
+    RESPONSE_CACHE_MAXSIZE and RESPONSE_CACHE_TTL bound it, and
+    RESPONSE_CACHE_EMBEDDING_MODEL enables the similarity tier with
+    RESPONSE_CACHE_SIMILARITY_THRESHOLD.
+    """
+    maxsize = int(os.environ.get("RESPONSE_CACHE_MAXSIZE", 1024))
+    ttl = float(os.environ.get("RESPONSE_CACHE_TTL", 24 * 3600)) or None
+    path = os.environ.get("RESPONSE_CACHE_PATH")
+    backend = SQLiteBackend(path, maxsize=maxsize, ttl=ttl) if path else InMemoryBackend(maxsize=maxsize, ttl=ttl)
+
+    embeddings = None
+    embedding_model = os.environ.get("RESPONSE_CACHE_EMBEDDING_MODEL")
+    if embedding_model:
+        from langchain_openai import OpenAIEmbeddings
+
+        embeddings = OpenAIEmbeddings(model=embedding_model)
+
+    return ResponseCache(
+        backend=backend,
+        embeddings=embeddings,
+        similarity_threshold=float(os.environ.get("RESPONSE_CACHE_SIMILARITY_THRESHOLD", 0.95)),
+    )
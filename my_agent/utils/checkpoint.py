@@ -0,0 +1,578 @@
+"""Durable checkpoints in SQLite that store message deltas and deduplicated, compressed payloads.
+
+A checkpoint of this graph holds the whole message history, including large
+Mongo result strings, and LangGraph saves one after every step. Storing each one
+in full grows a thread's storage with the square of its length. DeltaSQLiteSaver
+instead stores:
+
+- each message once, in a content-addressed `blobs` table. Message text of
+  CHECKPOINT_BLOB_MIN_BYTES or more is stored as its own blob, so identical tool
+  payloads are shared across messages, turns and threads;
+- each version of the messages channel as a delta against the channel's
+  previous version: how many references it keeps and which ones it appends.
+  A full list (keyframe) is written every CHECKPOINT_KEYFRAME_EVERY versions,
+  so reads follow short chains;
+- other channel values and pending writes compressed inline, or as blobs when large.
+
+Retention keeps the last CHECKPOINT_KEEP_LAST checkpoints per thread (0 keeps
+all), deletes threads idle for CHECKPOINT_MAX_AGE seconds (0 never does) and
+collects unreferenced blobs every CHECKPOINT_GC_EVERY checkpoints.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from langchain_core.messages import BaseMessage
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+CHECKPOINT_PATH = os.environ.get("CHECKPOINT_PATH")
+KEEP_LAST = int(os.environ.get("CHECKPOINT_KEEP_LAST", 100))
+MAX_AGE = float(os.environ.get("CHECKPOINT_MAX_AGE", 0))
+BLOB_MIN_BYTES = int(os.environ.get("CHECKPOINT_BLOB_MIN_BYTES", 512))
+KEYFRAME_EVERY = int(os.environ.get("CHECKPOINT_KEYFRAME_EVERY", 32))
+GC_EVERY = int(os.environ.get("CHECKPOINT_GC_EVERY", 1000))
+# Values shorter than this are not worth compressing
+COMPRESS_MIN_BYTES = 128
+BLOB_CACHE_BYTES = 32_000_000
+REF_CACHE_SIZE = 4096
+QUERY_CHUNK = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL, parent_id TEXT,
+    type TEXT, checkpoint BLOB, metadata_type TEXT, metadata BLOB, versions TEXT, created REAL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS channel_values (
+    thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, channel TEXT NOT NULL, version TEXT NOT NULL,
+    type TEXT, value BLOB, base TEXT, depth INTEGER,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL, task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL, channel TEXT, type TEXT, value BLOB, task_path TEXT,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, type TEXT, value BLOB, size INTEGER);
+"""
+
+
+def _pack(data: bytes) -> bytes:
+    if len(data) >= COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(data, 6)
+        if len(compressed) < len(data):
+            return b"z" + compressed
+    return b"r" + data
+
+
+def _unpack(value: bytes) -> bytes:
+    return zlib.decompress(value[1:]) if value[:1] == b"z" else value[1:]
+
+
+def _is_messages(value) -> bool:
+    return isinstance(value, (list, tuple)) and bool(value) and all(isinstance(m, BaseMessage) for m in value)
+
+
+def _chunks(items: list, size: int = QUERY_CHUNK):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class DeltaSQLiteSaver(BaseCheckpointSaver):
+    """Checkpoint saver on a local SQLite file (or ":memory:") storing message deltas.
+
+    Args:
+        path: SQLite database file
+        keep_last: checkpoints kept per thread and namespace, 0 keeps all
+        max_age: seconds after its last checkpoint a thread is deleted, 0 keeps it
+        blob_min_bytes: values and message texts from this size are content-addressed
+        keyframe_every: the messages channel is stored in full every this many versions
+        gc_every: unreferenced blobs are collected every this many checkpoints, 0 never
+        serde: serializer, LangGraph's JsonPlusSerializer by default
+    """
+
+    def __init__(
+        self,
+        path: str,
+        keep_last: int = KEEP_LAST,
+        max_age: float = MAX_AGE,
+        blob_min_bytes: int = BLOB_MIN_BYTES,
+        keyframe_every: int = KEYFRAME_EVERY,
+        gc_every: int = GC_EVERY,
+        serde=None,
+    ):
+        super().__init__(serde=serde)
+        self.path = path
+        self.keep_last = keep_last
+        self.max_age = max_age
+        self.blob_min_bytes = blob_min_bytes
+        self.keyframe_every = keyframe_every
+        self.gc_every = gc_every
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._puts = 0
+        # Caches: message object -> reference, blobs known to be stored, decoded blobs,
+        # reference lists per channel version and the latest version written per channel
+        self._message_refs = OrderedDict()
+        self._stored_blobs = OrderedDict()
+        self._blob_cache = OrderedDict()
+        self._blob_cache_bytes = 0
+        self._ref_lists = OrderedDict()
+        self._latest = {}
+
+    # Storage helpers
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                # Caches may describe rows that were rolled back
+                self._stored_blobs.clear()
+                self._latest.clear()
+                raise
+            self._conn.execute("COMMIT")
+
+    @staticmethod
+    def _remember(cache: OrderedDict, key, value, size: int = REF_CACHE_SIZE) -> None:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > size:
+            cache.popitem(last=False)
+
+    def _put_blob(self, type_: str, data: bytes) -> str:
+        digest = hashlib.sha256(type_.encode() + b"\0" + data).hexdigest()
+        if digest not in self._stored_blobs:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO blobs (digest, type, value, size) VALUES (?, ?, ?, ?)",
+                (digest, type_, _pack(data), len(data)),
+            )
+        self._remember(self._stored_blobs, digest, True, REF_CACHE_SIZE * 4)
+        return digest
+
+    def _get_blobs(self, digests) -> dict[str, tuple[str, bytes]]:
+        found, missing = {}, []
+        for digest in set(digests):
+            if digest in self._blob_cache:
+                self._blob_cache.move_to_end(digest)
+                found[digest] = self._blob_cache[digest]
+            else:
+                missing.append(digest)
+        for chunk in _chunks(missing):
+            rows = self._conn.execute(
+                f"SELECT digest, type, value FROM blobs WHERE digest IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            for digest, type_, value in rows:
+                found[digest] = (type_, _unpack(value))
+                self._blob_cache[digest] = found[digest]
+                self._blob_cache_bytes += len(found[digest][1])
+        while self._blob_cache_bytes > BLOB_CACHE_BYTES and self._blob_cache:
+            _, (_, data) = self._blob_cache.popitem(last=False)
+            self._blob_cache_bytes -= len(data)
+        return found
+
+    def _message_ref(self, message: BaseMessage) -> str:
+        cached = self._message_refs.get(id(message))
+        # add_messages assigns ids in place to messages already stored as writes
+        if cached is not None and cached[0] is message and cached[1] == message.id:
+            return cached[2]
+        ref = ""
+        if isinstance(message.content, str) and len(message.content) >= self.blob_min_bytes:
+            ref = ":" + self._put_blob("text", message.content.encode())
+            message_ = message.model_copy(update={"content": ""})
+        else:
+            message_ = message
+        ref = self._put_blob(*self.serde.dumps_typed(message_)) + ref
+        # The message is kept alive with its reference, so its id cannot be reused meanwhile
+        self._remember(self._message_refs, id(message), (message, message.id, ref))
+        return ref
+
+    def _load_messages(self, refs: list[str]) -> list[BaseMessage]:
+        parts = [ref.split(":") for ref in refs]
+        blobs = self._get_blobs([digest for part in parts for digest in part])
+        messages = []
+        for part in parts:
+            message = self.serde.loads_typed(blobs[part[0]])
+            if len(part) > 1:
+                message.content = blobs[part[1]][1].decode()
+            messages.append(message)
+        return messages
+
+    def _encode(self, value) -> tuple[str, bytes]:
+        """Encodes a channel value or write: messages as blob references, large values as a blob."""
+        if _is_messages(value):
+            return "refs", _pack(json.dumps([self._message_ref(m) for m in value]).encode())
+        type_, data = self.serde.dumps_typed(value)
+        if len(data) >= self.blob_min_bytes:
+            return "blob", self._put_blob(type_, data).encode()
+        return type_, _pack(data)
+
+    def _decode(self, type_: str, value: bytes):
+        if type_ == "refs":
+            return self._load_messages(json.loads(_unpack(value)))
+        if type_ == "blob":
+            digest = value.decode()
+            return self.serde.loads_typed(self._get_blobs([digest])[digest])
+        return self.serde.loads_typed((type_, _unpack(value)))
+
+    # Channel values
+
+    def _put_channel(self, thread_id: str, checkpoint_ns: str, channel: str, version, value, empty: bool) -> None:
+        version = str(version)
+        base, depth = None, 0
+        if empty:
+            type_, data = "empty", b""
+        elif _is_messages(value):
+            refs = [self._message_ref(m) for m in value]
+            latest = self._latest.get((thread_id, checkpoint_ns, channel))
+            keep = 0
+            if latest is not None and latest[2] + 1 < self.keyframe_every:
+                previous = latest[1]
+                while keep < min(len(previous), len(refs)) and previous[keep] == refs[keep]:
+                    keep += 1
+            if keep:
+                base, depth = latest[0], latest[2] + 1
+            type_, data = "delta", _pack(json.dumps({"keep": keep, "add": refs[keep:]}).encode())
+            self._remember(self._ref_lists, (thread_id, checkpoint_ns, channel, version), refs)
+            self._latest[(thread_id, checkpoint_ns, channel)] = (version, refs, depth)
+        else:
+            type_, data = self._encode(value)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO channel_values (thread_id, checkpoint_ns, channel, version, type, value, base, depth) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (thread_id, checkpoint_ns, channel, version, type_, data, base, depth),
+        )
+
+    def _refs(self, thread_id: str, checkpoint_ns: str, channel: str, version: str, row) -> list[str]:
+        key = (thread_id, checkpoint_ns, channel, version)
+        if key in self._ref_lists:
+            return self._ref_lists[key]
+        delta = json.loads(_unpack(row[1]))
+        refs = delta["add"]
+        if row[2] is not None:
+            base = self._conn.execute(
+                "SELECT type, value, base FROM channel_values WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, row[2]),
+            ).fetchone()
+            refs = self._refs(thread_id, checkpoint_ns, channel, row[2], base)[:delta["keep"]] + refs
+        self._remember(self._ref_lists, key, refs)
+        return refs
+
+    def _load_channels(self, thread_id: str, checkpoint_ns: str, versions: dict) -> dict:
+        values = {}
+        for channel, version in versions.items():
+            version = str(version)
+            row = self._conn.execute(
+                "SELECT type, value, base FROM channel_values WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, version),
+            ).fetchone()
+            if row is None or row[0] == "empty":
+                continue
+            if row[0] == "delta":
+                values[channel] = self._load_messages(self._refs(thread_id, checkpoint_ns, channel, version, row))
+            else:
+                values[channel] = self._decode(row[0], row[1])
+        return values
+
+    # BaseCheckpointSaver
+
+    def _tuple(self, thread_id: str, checkpoint_ns: str, row) -> CheckpointTuple:
+        checkpoint_id, parent_id, type_, checkpoint, metadata_type, metadata, versions = row
+        checkpoint = self.serde.loads_typed((type_, _unpack(checkpoint)))
+        writes = self._conn.execute(
+            "SELECT task_id, channel, type, value FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? "
+            "ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}},
+            checkpoint={**checkpoint, "channel_values": self._load_channels(thread_id, checkpoint_ns, json.loads(versions))},
+            metadata=self.serde.loads_typed((metadata_type, _unpack(metadata))),
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_id}}
+                if parent_id
+                else None
+            ),
+            pending_writes=[(task_id, channel, self._decode(t, v)) for task_id, channel, t, v in writes],
+        )
+
+    def get_tuple(self, config) -> CheckpointTuple | None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        columns = "checkpoint_id, parent_id, type, checkpoint, metadata_type, metadata, versions"
+        with self._lock:
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self._conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            return self._tuple(thread_id, checkpoint_ns, row) if row is not None else None
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        clauses, params = [], []
+        if config is not None:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before is not None and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            keys = self._conn.execute(
+                f"SELECT thread_id, checkpoint_ns, checkpoint_id, metadata_type, metadata FROM checkpoints {where} "
+                "ORDER BY checkpoint_id DESC",
+                params,
+            ).fetchall()
+        for thread_id, checkpoint_ns, checkpoint_id, metadata_type, metadata in keys:
+            if limit is not None and limit <= 0:
+                return
+            if filter:
+                metadata = self.serde.loads_typed((metadata_type, _unpack(metadata)))
+                if not all(metadata.get(key) == value for key, value in filter.items()):
+                    continue
+            found = self.get_tuple(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}}
+            )
+            if found is None:
+                # Removed by retention since the listing
+                continue
+            if limit is not None:
+                limit -= 1
+            yield found
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_ = checkpoint.copy()
+        values = checkpoint_.pop("channel_values")
+        type_, data = self.serde.dumps_typed(checkpoint_)
+        metadata_type, metadata_data = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        with self._transaction():
+            for channel, version in new_versions.items():
+                self._put_channel(thread_id, checkpoint_ns, channel, version, values.get(channel), channel not in values)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints "
+                "(thread_id, checkpoint_ns, checkpoint_id, parent_id, type, checkpoint, metadata_type, metadata, versions, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                    type_, _pack(data), metadata_type, _pack(metadata_data),
+                    json.dumps({channel: str(version) for channel, version in checkpoint["channel_versions"].items()}),
+                    time.time(),
+                ),
+            )
+            self._retain(thread_id, checkpoint_ns)
+        self._puts += 1
+        if self.gc_every and self._puts % self.gc_every == 0:
+            self.collect_garbage()
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        with self._transaction():
+            for idx, (channel, value) in enumerate(writes):
+                idx = WRITES_IDX_MAP.get(channel, idx)
+                # Regular writes are never overwritten; special ones (errors, interrupts) are
+                verb = "INSERT OR REPLACE" if idx < 0 else "INSERT OR IGNORE"
+                self._conn.execute(
+                    f"{verb} INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, task_path) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, *self._encode(value), task_path),
+                )
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._transaction():
+            for table in ("checkpoints", "channel_values", "writes"):
+                self._conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+            for key in [key for key in self._latest if key[0] == thread_id]:
+                del self._latest[key]
+
+    def prune(self, thread_ids, *, strategy: str = "keep_latest") -> None:
+        for thread_id in thread_ids:
+            if strategy == "delete":
+                self.delete_thread(thread_id)
+                continue
+            with self._transaction():
+                namespaces = self._conn.execute(
+                    "SELECT DISTINCT checkpoint_ns FROM checkpoints WHERE thread_id = ?", (thread_id,)
+                ).fetchall()
+                for (checkpoint_ns,) in namespaces:
+                    self._trim(thread_id, checkpoint_ns, 1)
+
+    async def aget_tuple(self, config) -> CheckpointTuple | None:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        for item in await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit))):
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+    async def aprune(self, thread_ids, *, strategy: str = "keep_latest") -> None:
+        return await asyncio.to_thread(self.prune, thread_ids, strategy=strategy)
+
+    def get_next_version(self, current, channel) -> str:
+        # Sortable strings, as InMemorySaver uses, so the newest version is the largest
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # Retention
+
+    def _retain(self, thread_id: str, checkpoint_ns: str) -> None:
+        if not self.keep_last:
+            return
+        (count,) = self._conn.execute(
+            "SELECT COUNT(*) FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?", (thread_id, checkpoint_ns)
+        ).fetchone()
+        # Trimmed in batches of a tenth of the limit, not on every checkpoint
+        if count > self.keep_last + max(1, self.keep_last // 10):
+            self._trim(thread_id, checkpoint_ns, self.keep_last)
+
+    def _trim(self, thread_id: str, checkpoint_ns: str, keep: int) -> None:
+        """Deletes all but the newest `keep` checkpoints and the channel versions only they used."""
+        cutoff = self._conn.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+            "ORDER BY checkpoint_id DESC LIMIT 1 OFFSET ?",
+            (thread_id, checkpoint_ns, keep),
+        ).fetchone()
+        if cutoff is None:
+            return
+        for table in ("checkpoints", "writes"):
+            self._conn.execute(
+                f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id <= ?",
+                (thread_id, checkpoint_ns, cutoff[0]),
+            )
+        needed = set()
+        for (versions,) in self._conn.execute(
+            "SELECT versions FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?", (thread_id, checkpoint_ns)
+        ):
+            needed.update(json.loads(versions).items())
+        bases = {
+            (channel, version): base
+            for channel, version, base in self._conn.execute(
+                "SELECT channel, version, base FROM channel_values WHERE thread_id = ? AND checkpoint_ns = ?",
+                (thread_id, checkpoint_ns),
+            )
+        }
+        # Deltas need the versions they were written against
+        pending = list(needed)
+        while pending:
+            channel, version = pending.pop()
+            base = bases.get((channel, version))
+            if base is not None and (channel, base) not in needed:
+                needed.add((channel, base))
+                pending.append((channel, base))
+        unused = [key for key in bases if key not in needed]
+        self._conn.executemany(
+            "DELETE FROM channel_values WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+            [(thread_id, checkpoint_ns, channel, version) for channel, version in unused],
+        )
+        for channel, version in unused:
+            latest = self._latest.get((thread_id, checkpoint_ns, channel))
+            if latest is not None and latest[0] == version:
+                del self._latest[(thread_id, checkpoint_ns, channel)]
+
+    def _referenced_blobs(self) -> set[str]:
+        referenced = set()
+        for table in ("channel_values", "writes"):
+            for type_, value in self._conn.execute(f"SELECT type, value FROM {table} WHERE type IN ('delta', 'refs', 'blob')"):
+                if type_ == "blob":
+                    referenced.add(value.decode())
+                    continue
+                decoded = json.loads(_unpack(value))
+                for ref in decoded["add"] if type_ == "delta" else decoded:
+                    referenced.update(ref.split(":"))
+        return referenced
+
+    def collect_garbage(self) -> dict:
+        """Deletes threads idle for more than `max_age` seconds, then blobs no longer referenced."""
+        expired = []
+        if self.max_age:
+            with self._lock:
+                expired = [
+                    thread_id
+                    for (thread_id,) in self._conn.execute(
+                        "SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(created) < ?",
+                        (time.time() - self.max_age,),
+                    ).fetchall()
+                ]
+        for thread_id in expired:
+            self.delete_thread(thread_id)
+        with self._transaction():
+            referenced = self._referenced_blobs()
+            unused = [digest for (digest,) in self._conn.execute("SELECT digest FROM blobs") if digest not in referenced]
+            self._conn.executemany("DELETE FROM blobs WHERE digest = ?", [(digest,) for digest in unused])
+            self._stored_blobs.clear()
+            self._message_refs.clear()
+            for digest in unused:
+                if digest in self._blob_cache:
+                    self._blob_cache_bytes -= len(self._blob_cache.pop(digest)[1])
+        return {"expired_threads": len(expired), "deleted_blobs": len(unused)}
+
+    def stats(self) -> dict:
+        """Row counts, blob sizes before and after compression, and the database size in bytes."""
+        with self._lock:
+            counts = {
+                table: self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("checkpoints", "channel_values", "writes", "blobs")
+            }
+            raw, stored = self._conn.execute("SELECT COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(value)), 0) FROM blobs").fetchone()
+            (page_count,) = self._conn.execute("PRAGMA page_count").fetchone()
+            (page_size,) = self._conn.execute("PRAGMA page_size").fetchone()
+        return {**counts, "blob_bytes": raw, "blob_stored_bytes": stored, "database_bytes": page_count * page_size}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def load_checkpointer() -> DeltaSQLiteSaver | None:
+    """The saver for CHECKPOINT_PATH, or None so the LangGraph server's own checkpointer is used."""
+    if not CHECKPOINT_PATH:
+        return None
+    return DeltaSQLiteSaver(CHECKPOINT_PATH)
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+
+from langchain_core.messages import BaseMessage, HumanMessage, ToolMessage
+
+from my_agent.utils.cache import InMemoryBackend
+from my_agent.utils.tokens import count_tokens
+
+# Token budget for the conversation history sent to the model, excluding the system prompt.
+HISTORY_TOKEN_BUDGET = int(os.environ.get("HISTORY_TOKEN_BUDGET", 12000))
+# Number of most recent user turns that are always sent verbatim.
+HISTORY_KEEP_TURNS = int(os.environ.get("HISTORY_KEEP_TURNS", 2))
+# Older tool outputs above this many tokens are replaced with a summary.
+HISTORY_SUMMARY_MIN_TOKENS = int(os.environ.get("HISTORY_SUMMARY_MIN_TOKENS", 150))
+PREVIEW_CHARS = 200
+
+
+def _key(message: BaseMessage) -> str:
+    if message.id:
+        return message.id
+    return hashlib.sha1(f"{message.type}:{message.content}".encode()).hexdigest()
+
+
+def _summary(message: ToolMessage) -> str:
+    content = str(message.content)
+    try:
+        payload = json.loads(content)
+    except ValueError:
+        payload = None
+    if isinstance(payload, dict) and "results" in payload:
+        shape = f"{payload.get('returned', len(payload['results']))} of {payload.get('total', '?')} documents"
+        preview = json.dumps(payload["results"][:1], default=str)
+    else:
+        shape = f"{len(content)} characters"
+        preview = content
+    if len(preview) > PREVIEW_CHARS:
+        preview = preview[:PREVIEW_CHARS] + "..."
+    return (
+        f"[Earlier {message.name} output ({shape}) omitted from the history; "
+        f"call the tool again if it is needed. Preview: {preview}]"
+    )
+
+
+class HistoryCompactor:
+    """Fits the message history into a token budget before it is sent to the model.
+
+    The last `keep_turns` user turns are kept verbatim. In older turns, large tool
+    outputs are replaced with a short summary that keeps the tool call id, and if
+    that is not enough the oldest turns are dropped whole. Token counts and
+    summaries are cached per message id, so each turn only counts the messages
+    added since the previous one.
+    """
+
+    def __init__(
+        self,
+        budget: int = HISTORY_TOKEN_BUDGET,
+        keep_turns: int = HISTORY_KEEP_TURNS,
+        summary_min_tokens: int = HISTORY_SUMMARY_MIN_TOKENS,
+        model: str = "gpt-4o",
+        cache_size: int = 8192,
+    ):
+        self.budget = budget
+        self.keep_turns = keep_turns
+        self.summary_min_tokens = summary_min_tokens
+        self.model = model
+        self._counts = InMemoryBackend(maxsize=cache_size)
+        self._summaries = InMemoryBackend(maxsize=cache_size)
+
+    def count(self, message: BaseMessage) -> int:
+        key = _key(message)
+        tokens = self._counts.get(key)
+        if tokens is None:
+            text = str(message.content)
+            if getattr(message, "tool_calls", None):
+                text += json.dumps([call["args"] for call in message.tool_calls], default=str)
+            tokens = count_tokens(text, self.model)
+            self._counts.set(key, tokens)
+        return tokens
+
+    def summarize(self, message: ToolMessage) -> ToolMessage:
+        key = _key(message)
+        summary = self._summaries.get(key)
+        if summary is None:
+            summary = message.model_copy(update={"content": _summary(message), "id": f"{key}:summary"})
+            self._summaries.set(key, summary)
+        return summary
+
+    def tokens(self, messages) -> int:
+        return sum(self.count(message) for message in messages)
+
+    def compact(self, messages) -> list[BaseMessage]:
+        messages = list(messages)
+        starts = [i for i, m in enumerate(messages) if isinstance(m, HumanMessage)] or [0]
+        if starts[0] != 0:
+            starts.insert(0, 0)
+        turns = [messages[start:end] for start, end in zip(starts, starts[1:] + [len(messages)])]
+        # The turn in progress is always kept, whatever keep_turns says.
+        split = max(len(turns) - max(self.keep_turns, 1), 0)
+        old, recent = turns[:split], turns[split:]
+
+        total = sum(self.tokens(turn) for turn in turns)
+        if total <= self.budget:
+            return messages
+
+        # Summarize large tool outputs in older turns, oldest first, until the history fits.
+        for turn in old:
+            for i, message in enumerate(turn):
+                if total <= self.budget:
+                    break
+                if isinstance(message, ToolMessage) and self.count(message) > self.summary_min_tokens:
+                    summary = self.summarize(message)
+                    total += self.count(summary) - self.count(message)
+                    turn[i] = summary
+
+        # Still over budget: drop whole turns so every tool call keeps its result.
+        while old and total > self.budget:
+            total -= self.tokens(old.pop(0))
+        return [message for turn in old + recent for message in turn]
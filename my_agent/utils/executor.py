@@ -0,0 +1,170 @@
+import asyncio
+import threading
+import time
+import weakref
+
+from langchain_core.messages import ToolMessage
+from langchain_core.runnables import RunnableLambda
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+from langchain_core.tools import BaseTool
+from langchain_core.tools import tool as create_tool
+from langgraph.prebuilt.tool_node import msg_content_output
+
+DEFAULT_GROUP = "default"
+
+
+class _Slot:
+    """A call's hold on its group's semaphore, released once by the call or by its timeout."""
+
+    def __init__(self, semaphore: threading.BoundedSemaphore, condition: threading.Condition):
+        self.semaphore = semaphore
+        self.condition = condition
+        self.started = None
+        self._released = False
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        self.semaphore.acquire()
+        with self.condition:
+            self.started = time.monotonic()
+            self.condition.notify()
+
+    def release(self) -> None:
+        with self._lock:
+            if self.started is None or self._released:
+                return
+            self._released = True
+        self.semaphore.release()
+
+
+def message_content(output):
+    """Converts a tool's output to ToolMessage content as ToolNode does.
+
+    Strings and lists of content blocks are kept; anything else, including lists of
+    strings (which not every chat API accepts) and empty lists, is sent as JSON.
+    """
+    content = msg_content_output(output)
+    return content if content != [] else "[]"
+
+
+class ParallelToolNode:
+    """Executes all tool calls of the last AI message concurrently.
+
+    Each tool belongs to a group (e.g. 'mongo' or 'llm') with its own concurrency
+    limit and timeout. The limits of a node are kept separately for sync and async
+    runs: invoke() calls share a threading semaphore per group across every thread,
+    while ainvoke() calls share an asyncio semaphore per group within their event
+    loop. A call's timeout starts once it holds its group's slot, so waiting for a
+    slot does not count against it. A timed-out call gives up its slot, although a
+    sync call's thread may keep running. Results come back as ToolMessages in the
+    order of the tool calls, and a failing or timed-out call only produces an error
+    ToolMessage for that call.
+
+    Args:
+        tools: tools to execute, as accepted by ToolNode
+        groups: tool name -> group name; unlisted tools use the 'default' group
+        concurrency: group name -> maximum number of concurrent calls
+        timeouts: group name -> timeout in seconds
+    """
+
+    def __init__(self, tools, groups: dict[str, str] | None = None, concurrency: dict[str, int] | None = None, timeouts: dict[str, float] | None = None):
+        tools = [t if isinstance(t, BaseTool) else create_tool(t) for t in tools]
+        self.tools = {t.name: t for t in tools}
+        self.groups = groups or {}
+        self.concurrency = {DEFAULT_GROUP: 16, **(concurrency or {})}
+        self.timeouts = timeouts or {}
+        self._semaphores = {group: threading.BoundedSemaphore(limit) for group, limit in self.concurrency.items()}
+        # asyncio semaphores are bound to the event loop that first waits on them.
+        self._async_semaphores = weakref.WeakKeyDictionary()
+
+    def _group(self, name: str) -> str:
+        group = self.groups.get(name, DEFAULT_GROUP)
+        return group if group in self.concurrency else DEFAULT_GROUP
+
+    @staticmethod
+    def _error(call: dict, error: str) -> ToolMessage:
+        return ToolMessage(content=f"Error: {error}", name=call["name"], tool_call_id=call["id"], status="error")
+
+    @staticmethod
+    def _result(message: ToolMessage) -> ToolMessage:
+        message.content = message_content(message.content)
+        return message
+
+    def _invoke_call(self, call: dict, config, slot: "_Slot") -> ToolMessage:
+        tool = self.tools.get(call["name"])
+        if tool is None:
+            return self._error(call, f"{call['name']} is not a valid tool, try one of [{', '.join(self.tools)}].")
+        slot.acquire()
+        try:
+            return self._result(tool.invoke({**call, "type": "tool_call"}, config))
+        except Exception as e:
+            return self._error(call, repr(e))
+        finally:
+            slot.release()
+
+    async def _ainvoke_call(self, call: dict, config) -> ToolMessage:
+        tool = self.tools.get(call["name"])
+        if tool is None:
+            return self._error(call, f"{call['name']} is not a valid tool, try one of [{', '.join(self.tools)}].")
+        group = self._group(call["name"])
+        loop = asyncio.get_running_loop()
+        semaphores = self._async_semaphores.get(loop)
+        if semaphores is None:
+            semaphores = self._async_semaphores[loop] = {g: asyncio.Semaphore(n) for g, n in self.concurrency.items()}
+        async with semaphores[group]:
+            try:
+                message = await asyncio.wait_for(tool.ainvoke({**call, "type": "tool_call"}, config), self.timeouts.get(group))
+                return self._result(message)
+            except asyncio.TimeoutError:
+                return self._error(call, f"{call['name']} timed out after {self.timeouts[group]}s")
+            except Exception as e:
+                return self._error(call, repr(e))
+
+    def invoke(self, state, config=None) -> dict:
+        calls = state["messages"][-1].tool_calls
+        condition = threading.Condition()
+        slots = [_Slot(self._semaphores[self._group(call["name"])], condition) for call in calls]
+        messages = [None] * len(calls)
+        pool = ContextThreadPoolExecutor(max_workers=max(len(calls), 1))
+        try:
+            for i, (call, slot) in enumerate(zip(calls, slots)):
+                future = pool.submit(self._invoke_call, call, config, slot)
+                future.add_done_callback(lambda future, i=i: self._finished(condition, messages, i, future, calls[i]))
+            with condition:
+                while True:
+                    now = time.monotonic()
+                    deadlines = []
+                    for i, (call, slot) in enumerate(zip(calls, slots)):
+                        timeout = self.timeouts.get(self._group(call["name"]))
+                        if messages[i] is not None or slot.started is None or timeout is None:
+                            continue
+                        if now >= slot.started + timeout:
+                            # The thread keeps running, but the run no longer waits for it.
+                            messages[i] = self._error(call, f"{call['name']} timed out after {timeout}s")
+                            slot.release()
+                        else:
+                            deadlines.append(slot.started + timeout)
+                    if all(message is not None for message in messages):
+                        break
+                    condition.wait(min(deadlines) - now if deadlines else None)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+        return {"messages": messages}
+
+    def _finished(self, condition: threading.Condition, messages: list, i: int, future, call: dict) -> None:
+        with condition:
+            if messages[i] is None:
+                try:
+                    messages[i] = future.result()
+                except BaseException as e:
+                    messages[i] = self._error(call, repr(e))
+            condition.notify()
+
+    async def ainvoke(self, state, config=None) -> dict:
+        calls = state["messages"][-1].tool_calls
+        messages = await asyncio.gather(*(self._ainvoke_call(call, config) for call in calls))
+        return {"messages": list(messages)}
+
+    def as_node(self, name: str = "tools") -> RunnableLambda:
+        """Returns the node to add to a StateGraph, serving both invoke and ainvoke."""
+        return RunnableLambda(self.invoke, afunc=self.ainvoke, name=name)
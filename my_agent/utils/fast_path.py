@@ -0,0 +1,99 @@
+import json
+import re
+import uuid
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+from my_agent.utils.executor import message_content
+from my_agent.utils.planner import DEFAULT_STEPS, initial_plan, observe
+from my_agent.utils.prompts import SCHEMA_RULES, layout
+from my_agent.utils.state import merge_plan
+
+DRAFT_INSTRUCTIONS = f"""Use your knowledge of the collection schemas to create a pymongo query for the user query.
+Reply with a JSON object and nothing else: {{"query": "<pymongo query>"}}, e.g. {{"query": "db.rooms.count_documents({{}})"}}.
+If the schemas cannot answer the user query, reply {{"query": null}}.
+Below are some rules about the schema to help you create the query:
+
+{SCHEMA_RULES}"""
+
+
+class DraftError(ValueError):
+    """Raised when a drafted reply holds no query the fast path can run."""
+
+
+def draft_prompt(user_query: str, collection_schemas: str) -> list[BaseMessage]:
+    # Same layout as the create_mongodb_query prompt: rules, schemas, then the question
+    return layout(
+        DRAFT_INSTRUCTIONS,
+        f"<mongo_collection_schemas>\n{collection_schemas}\n</mongo_collection_schemas>",
+        variable=f"<user_query>\n{user_query}\n</user_query>",
+    )
+
+
+def parse_draft(response: str) -> str:
+    """Returns the query of a drafted `{"query": ...}` reply, tolerating code fences around it."""
+    match = re.search(r"\{.*\}", response, re.DOTALL)
+    try:
+        draft = json.loads(match.group(0)) if match else None
+    except ValueError:
+        draft = None
+    if not isinstance(draft, dict):
+        raise DraftError(f"Draft is not a JSON object: {response[:200]}")
+    query = draft.get("query")
+    if not isinstance(query, str) or not query.strip().startswith("db."):
+        raise DraftError("The schemas cannot answer the question")
+    return query.strip()
+
+
+def question(messages) -> str | None:
+    """The question the fast path may answer: the first of the thread, while it is still unanswered.
+
+    Follow-up questions can refer to earlier answers the draft prompt does not see,
+    so they go through the agent loop.
+    """
+    if not messages or not isinstance(messages[-1], HumanMessage):
+        return None
+    if any(isinstance(m, HumanMessage) for m in messages[:-1]):
+        return None
+    return str(messages[-1].content)
+
+
+def transcript(steps: list[tuple]) -> list[BaseMessage]:
+    """The (tool name, arguments, result) steps taken, as one AI turn of tool calls and their results.
+
+    Results are given as the tools return them and converted to message content as
+    ToolNode converts them, so the assistant and the planner see the same messages as
+    after the agent loop.
+    """
+    calls = [{"name": name, "args": args, "id": f"call_{uuid.uuid4().hex[:24]}"} for name, args, _ in steps]
+    results = [
+        ToolMessage(content=message_content(result), name=call["name"], tool_call_id=call["id"])
+        for call, (_, _, result) in zip(calls, steps)
+    ]
+    return [AIMessage(content="", tool_calls=calls), *results]
+
+
+def pipeline_steps(user_query: str, collections: list[str], collection_schemas: str, query: str, results: str) -> list[tuple]:
+    return [
+        ("identify_relevant_mongodb_collections", {"user_query": user_query}, collections),
+        ("mongodb_schemas_for_collections", {"collections": collections}, collection_schemas),
+        ("create_mongodb_query", {"user_query": user_query, "collection_schemas": collection_schemas}, query),
+        ("execute_pymongo", {"query": query}, results),
+    ]
+
+
+def no_collections_steps(user_query: str) -> list[tuple]:
+    return [("identify_relevant_mongodb_collections", {"user_query": user_query}, [])]
+
+
+def update(steps: list[tuple]) -> dict | None:
+    """The graph state update for steps the fast path took, or None when one of them failed.
+
+    The plan is DEFAULT_STEPS with the tool results applied as the planner would apply them.
+    """
+    messages = transcript(steps)
+    plan = initial_plan(DEFAULT_STEPS)
+    patches, failures = observe(plan, messages[1:])
+    if failures:
+        return None
+    return {"messages": messages, "plan": {"replace": merge_plan(plan, patches)}, "replans": 0}
@@ -0,0 +1,33 @@
+import asyncio
+import weakref
+
+import httpx
+
+
+class LoopTransport(httpx.AsyncBaseTransport):
+    """An async transport with a connection pool per event loop.
+
+    Pooled connections are bound to the event loop that opened them, so a single
+    long-lived httpx.AsyncClient (and the chat models holding it) can serve every
+    loop, e.g. successive asyncio.run() calls, through this transport.
+    """
+
+    def __init__(self, limits: httpx.Limits):
+        self.limits = limits
+        self._transports = weakref.WeakKeyDictionary()
+
+    def _transport(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        transport = self._transports.get(loop)
+        if transport is None:
+            transport = self._transports[loop] = httpx.AsyncHTTPTransport(limits=self.limits)
+        return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport().handle_async_request(request)
+
+    async def aclose(self) -> None:
+        """Closes the running event loop's connections."""
+        transport = self._transports.pop(asyncio.get_running_loop(), None)
+        if transport is not None:
+            await transport.aclose()
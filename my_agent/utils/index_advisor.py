@@ -0,0 +1,409 @@
+import json
+import os
+import statistics
+import threading
+from collections import Counter, OrderedDict, defaultdict, deque
+from typing import NamedTuple
+
+from my_agent.utils.query import RESHAPING_STAGES, QueryError, QueryPlan
+
+# Queries whose plan would examine more documents than this are limited or blocked.
+SCAN_LIMIT = int(os.environ.get("QUERY_SCAN_LIMIT", 100_000))
+# "limit" rewrites oversized finds and counts with a limit, "block" rejects every
+# oversized query, "off" only records them.
+SCAN_ACTION = os.environ.get("QUERY_SCAN_ACTION", "limit")
+PROFILE_SIZE = int(os.environ.get("QUERY_PROFILE_SIZE", 1000))
+# Indexed queries examining more documents per returned one than this still get a recommendation.
+EXAMINED_RATIO = 10
+EQUALITY_OPERATORS = frozenset({"$eq", "$in"})
+
+
+def _unsupported() -> tuple:
+    # Raised by databases that cannot explain (mongomock) or lack the calls an estimate needs.
+    # pymongo is imported when one is raised rather than with the graph.
+    from pymongo.errors import OperationFailure
+
+    return (AttributeError, NotImplementedError, OperationFailure)
+
+
+class QueryShape(NamedTuple):
+    """The fields a query filters and sorts on, without their values."""
+
+    collection: str
+    operation: str
+    equality: tuple[str, ...] = ()
+    range: tuple[str, ...] = ()
+    sort: tuple[tuple[str, int], ...] = ()
+
+    @property
+    def fields(self) -> list[str]:
+        return [*self.equality, *self.range, *(field for field, _ in self.sort)]
+
+
+class Explain(NamedTuple):
+    """What the server did (or would do) to answer a query shape.
+
+    `estimated` is set when the server could not explain the query and the figures
+    come from the collection's indexes and size instead.
+    """
+
+    index: str | None
+    collscan: bool
+    docs_examined: int | None = None
+    keys_examined: int | None = None
+    returned: int | None = None
+    estimated: bool = False
+
+
+# What is known about a query the database can neither explain nor estimate.
+UNKNOWN = Explain(index=None, collscan=False, estimated=True)
+
+
+class Profile(NamedTuple):
+    shape: QueryShape
+    seconds: float
+    explain: Explain
+    # "ran", "limited" or "blocked"
+    outcome: str = "ran"
+
+
+def _classify(query: dict, equality: set, ranges: set) -> None:
+    for key, value in query.items():
+        if key == "$and" and isinstance(value, list):
+            for clause in value:
+                if isinstance(clause, dict):
+                    _classify(clause, equality, ranges)
+        elif key.startswith("$"):
+            # $or, $nor and $expr cannot be served by a single compound index prefix
+            continue
+        elif isinstance(value, dict) and any(str(op).startswith("$") for op in value):
+            (equality if set(value) <= EQUALITY_OPERATORS else ranges).add(key)
+        else:
+            equality.add(key)
+
+
+def query_shape(plan: QueryPlan) -> QueryShape:
+    """Returns the fields a plan filters on by equality and by range, and its sort."""
+    equality, ranges, sort = set(), set(), list(plan.sort or ())
+    _classify(plan.filter or {}, equality, ranges)
+    for stage in plan.pipeline or ():
+        (name, spec), = stage.items()
+        if name == "$match" and isinstance(spec, dict):
+            _classify(spec, equality, ranges)
+        elif name == "$sort" and isinstance(spec, dict):
+            sort.extend(spec.items())
+        elif name in RESHAPING_STAGES:
+            break
+    if plan.key is not None:
+        sort.append((plan.key, 1))
+    ranges -= equality
+    return QueryShape(plan.collection, plan.operation, tuple(sorted(equality)), tuple(sorted(ranges)), tuple(sort))
+
+
+def explain_command(plan: QueryPlan) -> dict:
+    """The database command whose explain() describes how `plan` runs."""
+    if plan.operation == "aggregate":
+        return {"aggregate": plan.collection, "pipeline": plan.pipeline, "cursor": {}}
+    if plan.operation == "distinct":
+        return {"distinct": plan.collection, "key": plan.key, "query": plan.filter}
+    if plan.operation == "count_documents":
+        command = {"count": plan.collection, "query": plan.filter}
+    else:
+        command = {"find": plan.collection, "filter": plan.filter}
+        if plan.sort:
+            command["sort"] = dict(plan.sort)
+    command.update({key: value for key, value in (("skip", plan.skip), ("limit", plan.limit)) if value})
+    return command
+
+
+def _walk(node):
+    if isinstance(node, dict):
+        yield node
+        for value in node.values():
+            yield from _walk(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _walk(value)
+
+
+def parse_explain(output: dict) -> Explain:
+    """Extracts index usage and execution statistics from find, count, distinct or aggregate explain output."""
+    nodes = list(_walk(output))
+    stages = {node["stage"] for node in nodes if isinstance(node.get("stage"), str)}
+    indexes = [node["indexName"] for node in nodes if isinstance(node.get("indexName"), str)]
+    stats = next((node["executionStats"] for node in nodes if isinstance(node.get("executionStats"), dict)), {})
+    return Explain(
+        index=indexes[0] if indexes else None,
+        collscan="COLLSCAN" in stages,
+        docs_examined=stats.get("totalDocsExamined"),
+        keys_examined=stats.get("totalKeysExamined"),
+        returned=stats.get("nReturned"),
+    )
+
+
+def _usable_index(shape: QueryShape, indexes: dict) -> str | None:
+    fields = set(shape.fields)
+    for name, info in indexes.items():
+        key = info.get("key") or []
+        if key and key[0][0] in fields:
+            return name
+    return None
+
+
+def _recommended_keys(shape: QueryShape) -> list[tuple[str, int]]:
+    # Equality fields first, then the sort, then one range field (the ESR rule).
+    keys = [(field, 1) for field in shape.equality]
+    keys += [(field, direction) for field, direction in shape.sort if field not in shape.equality]
+    keys += [(field, 1) for field in shape.range[:1] if field not in dict(keys)]
+    return keys
+
+
+class IndexAdvisor:
+    """Explains generated queries, guards against large scans and recommends indexes.
+
+    Each query shape (collection, operation and the fields it filters and sorts on)
+    is explained once with "queryPlanner" verbosity before it first runs: a shape
+    that would scan more than `scan_limit` documents without an index is limited
+    or blocked according to `action`. After it first runs it is explained again
+    with "executionStats" for documents examined and returned. Every execution is
+    profiled with its time, and report() aggregates the profiles into index
+    recommendations. Databases without explain (mongomock) get estimates from
+    their indexes and document counts.
+
+    Args:
+        scan_limit: largest number of documents a query may scan without an index
+        action: "limit", "block" or "off"
+        size: number of executions kept for the report
+        limit_to: limit given to finds that would scan more than `scan_limit`
+    """
+
+    def __init__(self, scan_limit: int = SCAN_LIMIT, action: str = SCAN_ACTION, size: int = PROFILE_SIZE, limit_to: int = 100, cache_size: int = 1024):
+        if action not in ("limit", "block", "off"):
+            raise ValueError(f"Unknown scan action '{action}'")
+        self.scan_limit = scan_limit
+        self.action = action
+        self.limit_to = limit_to
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._profiles = deque(maxlen=size)
+        self._planned = OrderedDict()
+        self._executed = OrderedDict()
+
+    # Explaining
+
+    def _remember(self, cache: OrderedDict, shape: QueryShape, explain: Explain) -> Explain:
+        with self._lock:
+            cache[shape] = explain
+            cache.move_to_end(shape)
+            while len(cache) > self.cache_size:
+                cache.popitem(last=False)
+        return explain
+
+    def _cached(self, cache: OrderedDict, shape: QueryShape) -> Explain | None:
+        with self._lock:
+            return cache.get(shape)
+
+    def explain(self, plan: QueryPlan, db, verbosity: str = "queryPlanner") -> Explain:
+        """Explains `plan` on `db`, falling back to an estimate when the server cannot."""
+        collection = db[plan.collection]
+        try:
+            explain = parse_explain(db.command({"explain": explain_command(plan), "verbosity": verbosity}))
+        except _unsupported():
+            pass
+        else:
+            if explain.collscan and explain.docs_examined is None:
+                # A queryPlanner explain has no executionStats: a collection scan examines every document
+                try:
+                    explain = explain._replace(docs_examined=collection.estimated_document_count())
+                except _unsupported():
+                    pass
+            return explain
+        try:
+            index = _usable_index(query_shape(plan), collection.index_information())
+            examined = None if index else collection.estimated_document_count()
+        except _unsupported():
+            return UNKNOWN
+        return Explain(index=index, collscan=index is None, docs_examined=examined, estimated=True)
+
+    async def aexplain(self, plan: QueryPlan, db, verbosity: str = "queryPlanner") -> Explain:
+        """Async version of explain for an async (pymongo or motor) database."""
+        collection = db[plan.collection]
+        try:
+            explain = parse_explain(await db.command({"explain": explain_command(plan), "verbosity": verbosity}))
+        except _unsupported():
+            pass
+        else:
+            if explain.collscan and explain.docs_examined is None:
+                try:
+                    explain = explain._replace(docs_examined=await collection.estimated_document_count())
+                except _unsupported():
+                    pass
+            return explain
+        try:
+            index = _usable_index(query_shape(plan), await collection.index_information())
+            examined = None if index else await collection.estimated_document_count()
+        except _unsupported():
+            return UNKNOWN
+        return Explain(index=index, collscan=index is None, docs_examined=examined, estimated=True)
+
+    # Guarding
+
+    def _apply(self, plan: QueryPlan, explain: Explain) -> tuple[QueryPlan, str | None]:
+        if self.action == "off" or not explain.collscan or (explain.docs_examined or 0) <= self.scan_limit:
+            return plan, None
+        reason = (
+            f"this query scans all {explain.docs_examined} documents of {plan.collection} "
+            f"without an index (the limit is {self.scan_limit})"
+        )
+        if self.action == "block" or plan.operation not in ("find", "find_one", "count_documents"):
+            self._profile(plan, 0.0, explain, "blocked")
+            raise QueryError(
+                f"Query blocked: {reason}. Filter on an indexed field or use materialized_statistics for counts per group."
+            )
+        if plan.operation == "count_documents":
+            limit, what = self.scan_limit, "the count is a lower bound"
+        else:
+            limit, what = min(plan.limit or self.limit_to, self.limit_to), "results may be incomplete"
+        return plan._replace(limit=limit), f"Warning: {reason}, so it was limited to {limit} documents and {what}."
+
+    def guard(self, plan: QueryPlan, db) -> tuple[QueryPlan, str | None]:
+        """Returns the plan to run and a warning when it was limited; raises QueryError when it is blocked."""
+        shape = query_shape(plan)
+        explain = self._cached(self._planned, shape)
+        if explain is None:
+            explain = self._remember(self._planned, shape, self.explain(plan, db))
+        return self._apply(plan, explain)
+
+    async def aguard(self, plan: QueryPlan, db) -> tuple[QueryPlan, str | None]:
+        """Async version of guard."""
+        shape = query_shape(plan)
+        explain = self._cached(self._planned, shape)
+        if explain is None:
+            explain = self._remember(self._planned, shape, await self.aexplain(plan, db))
+        return self._apply(plan, explain)
+
+    # Profiling
+
+    def _profile(self, plan: QueryPlan, seconds: float, explain: Explain, outcome: str) -> None:
+        with self._lock:
+            self._profiles.append(Profile(query_shape(plan), seconds, explain, outcome))
+
+    def record(self, plan: QueryPlan, db, seconds: float, limited: bool = False) -> None:
+        """Profiles one execution of `plan`, explaining its shape's execution on first sight."""
+        shape = query_shape(plan)
+        explain = self._cached(self._executed, shape)
+        if explain is None:
+            planned = self._cached(self._planned, shape)
+            if planned is not None and planned.estimated:
+                explain = planned
+            else:
+                explain = self.explain(plan, db, verbosity="executionStats")
+            self._remember(self._executed, shape, explain)
+        self._profile(plan, seconds, explain, "limited" if limited else "ran")
+
+    async def arecord(self, plan: QueryPlan, db, seconds: float, limited: bool = False) -> None:
+        """Async version of record."""
+        shape = query_shape(plan)
+        explain = self._cached(self._executed, shape)
+        if explain is None:
+            planned = self._cached(self._planned, shape)
+            if planned is not None and planned.estimated:
+                explain = planned
+            else:
+                explain = await self.aexplain(plan, db, verbosity="executionStats")
+            self._remember(self._executed, shape, explain)
+        self._profile(plan, seconds, explain, "limited" if limited else "ran")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._profiles.clear()
+            self._planned.clear()
+            self._executed.clear()
+
+    # Reporting
+
+    def report(self, indexes: dict | None = None) -> dict:
+        """Aggregates the recorded executions per collection and recommends indexes.
+
+        Args:
+            indexes: collection -> index_information(), so recommendations already
+                covered by an existing index are left out
+        """
+        with self._lock:
+            profiles = list(self._profiles)
+        collections = defaultdict(lambda: {"queries": 0, "collscans": 0, "outcomes": Counter(), "seconds": [], "fields": Counter()})
+        shapes = defaultdict(list)
+        for profile in profiles:
+            summary = collections[profile.shape.collection]
+            summary["queries"] += 1
+            summary["collscans"] += profile.explain.collscan
+            summary["outcomes"][profile.outcome] += 1
+            if profile.outcome != "blocked":
+                summary["seconds"].append(profile.seconds)
+            summary["fields"].update(profile.shape.fields)
+            shapes[profile.shape].append(profile)
+
+        recommendations = {}
+        for shape, runs in shapes.items():
+            explain = runs[-1].explain
+            ratio = (explain.docs_examined or 0) / max(explain.returned or 1, 1) if explain.docs_examined is not None else None
+            if not shape.fields or not (explain.collscan or (ratio or 0) > EXAMINED_RATIO):
+                continue
+            keys = tuple(_recommended_keys(shape))
+            existing = (indexes or {}).get(shape.collection, {})
+            if any(tuple(tuple(k) for k in info.get("key", ()))[:len(keys)] == keys for info in existing.values()):
+                continue
+            entry = recommendations.setdefault((shape.collection, keys), {
+                "collection": shape.collection, "keys": [list(k) for k in keys], "queries": 0, "seconds": 0.0, "collscans": 0,
+            })
+            entry["queries"] += len(runs)
+            entry["seconds"] += sum(run.seconds for run in runs)
+            entry["collscans"] += sum(run.explain.collscan for run in runs)
+
+        # An index whose keys start with another recommendation's keys serves both.
+        for (collection, keys), entry in list(recommendations.items()):
+            for (other_collection, other_keys), other in recommendations.items():
+                if other_collection == collection and len(other_keys) > len(keys) and other_keys[:len(keys)] == keys:
+                    other["queries"] += entry["queries"]
+                    other["seconds"] += entry["seconds"]
+                    other["collscans"] += entry["collscans"]
+                    del recommendations[(collection, keys)]
+                    break
+
+        return {
+            "queries": len(profiles),
+            "collections": {
+                name: {
+                    "queries": summary["queries"],
+                    "collscans": summary["collscans"],
+                    "limited": summary["outcomes"]["limited"],
+                    "blocked": summary["outcomes"]["blocked"],
+                    "p50_ms": statistics.median(summary["seconds"]) * 1000 if summary["seconds"] else None,
+                    "max_ms": max(summary["seconds"]) * 1000 if summary["seconds"] else None,
+                    "fields": dict(summary["fields"].most_common()),
+                }
+                for name, summary in collections.items()
+            },
+            "recommendations": sorted(recommendations.values(), key=lambda r: r["seconds"], reverse=True),
+        }
+
+
+def render_report(report: dict) -> str:
+    """Formats report() output as text, with a createIndex command per recommendation."""
+    lines = [f"{report['queries']} queries profiled"]
+    for name, summary in report["collections"].items():
+        fields = ", ".join(f"{field} ({count})" for field, count in summary["fields"].items()) or "-"
+        timing = f"p50 {summary['p50_ms']:.1f}ms, max {summary['max_ms']:.1f}ms" if summary["p50_ms"] is not None else "none ran"
+        lines.append(
+            f"  {name}: {summary['queries']} queries, {summary['collscans']} collection scans, "
+            f"{summary['limited']} limited, {summary['blocked']} blocked, {timing}; fields: {fields}"
+        )
+    if report["recommendations"]:
+        lines.append("Recommended indexes:")
+    for entry in report["recommendations"]:
+        keys = ", ".join(f"{json.dumps(field)}: {direction}" for field, direction in entry["keys"])
+        lines.append(
+            f"  db.{entry['collection']}.createIndex({{{keys}}})  "
+            f"# {entry['queries']} queries, {entry['collscans']} collection scans, {entry['seconds'] * 1000:.0f}ms total"
+        )
+    return "\n".join(lines)
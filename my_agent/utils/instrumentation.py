@@ -0,0 +1,402 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables.config import var_child_runnable_config
+
+ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+# Number of recent calls per node, tool or model the percentiles are computed over.
+WINDOW = int(os.environ.get("METRICS_WINDOW", 1024))
+# Finished spans kept until they are exported.
+SPAN_BUFFER = int(os.environ.get("METRICS_SPAN_BUFFER", 4096))
+QUANTILES = (0.5, 0.95, 0.99)
+# Spans whose tokens and retries roll up from the model calls made inside them.
+OWNER_KINDS = frozenset({"node", "tool"})
+# OTLP span kinds: internal work, and calls to another service.
+_OTLP_INTERNAL, _OTLP_CLIENT = 1, 3
+
+
+class RingBuffer:
+    """Fixed-size window of the latest values, with nearest-rank percentiles."""
+
+    __slots__ = ("values", "size", "index", "count", "total")
+
+    def __init__(self, size: int):
+        self.values = [0.0] * size
+        self.size = size
+        self.index = 0
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value: float) -> None:
+        self.values[self.index] = value
+        self.index = (self.index + 1) % self.size
+        self.count += 1
+        self.total += value
+
+    def quantiles(self, quantiles=QUANTILES) -> list[float]:
+        window = sorted(self.values[:min(self.count, self.size)])
+        if not window:
+            return [0.0 for _ in quantiles]
+        return [window[min(len(window) - 1, int(q * len(window)))] for q in quantiles]
+
+
+class Series:
+    """Everything recorded for one node, tool, model or database call."""
+
+    __slots__ = ("seconds", "payload_bytes", "tokens_in", "tokens_out", "retries", "errors")
+
+    def __init__(self, window: int):
+        self.seconds = RingBuffer(window)
+        self.payload_bytes = RingBuffer(window)
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.retries = 0
+        self.errors = 0
+
+
+class Span:
+    __slots__ = (
+        "trace_id", "span_id", "parent", "kind", "name", "started", "start_ns", "end_ns",
+        "tokens_in", "tokens_out", "payload_bytes", "retries", "error", "attributes",
+    )
+
+    def __init__(self, kind: str, name: str, span_id: str, parent: "Span | None", trace_id: str):
+        self.kind = kind
+        self.name = name
+        self.span_id = span_id
+        self.parent = parent
+        self.trace_id = trace_id
+        self.started = time.perf_counter()
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.payload_bytes = 0
+        self.retries = 0
+        self.error = None
+        self.attributes = {}
+
+    def owner(self) -> "Span | None":
+        """The closest node or tool span, this one included."""
+        span = self
+        while span is not None and span.kind not in OWNER_KINDS:
+            span = span.parent
+        return span
+
+
+def _payload_bytes(value) -> int:
+    if isinstance(value, str):
+        return len(value.encode())
+    if isinstance(value, BaseMessage):
+        return _payload_bytes(value.content)
+    if isinstance(value, dict):
+        return _payload_bytes(value.get("messages", value.get("text", "")))
+    if isinstance(value, (list, tuple)):
+        return sum(_payload_bytes(item) for item in value)
+    return 0
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class Instrumentation(BaseCallbackHandler):
+    """Callback handler timing every graph node, tool and model call, plus explicit spans.
+
+    Bound to the compiled graph with instrument(), it turns the runs LangChain
+    reports into spans. Those are the graph, its nodes (`langgraph_node`), tools and
+    chat model calls, plus code wrapped in span() such as MongoDB queries. Each
+    finished span adds its wall time and payload size to ring buffers for its kind
+    and name. Token usage and retries add to counters, and also count toward the
+    closest enclosing node or tool. Metrics are exported by render_prometheus(),
+    and spans by export_spans() as OTLP JSON.
+    """
+
+    run_inline = True
+
+    def __init__(self, window: int = WINDOW, span_buffer: int = SPAN_BUFFER, enabled: bool = ENABLED):
+        self.window = window
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._runs = {}
+        self._series = {}
+        self._finished = deque(maxlen=span_buffer)
+
+    # Recording
+
+    def _start(self, kind: str, name: str, run_id, parent_run_id) -> Span:
+        parent = self._runs.get(parent_run_id)
+        trace_id = parent.trace_id if parent is not None else run_id.hex
+        span = Span(kind, name, run_id.hex[16:], parent, trace_id)
+        self._runs[run_id] = span
+        return span
+
+    def _finish(self, span: Span, error: BaseException | None = None) -> None:
+        span.end_ns = time.time_ns()
+        seconds = time.perf_counter() - span.started
+        if error is not None:
+            span.error = repr(error)
+        key = (span.kind, span.name)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = Series(self.window)
+            series.seconds.add(seconds)
+            series.payload_bytes.add(span.payload_bytes)
+            series.tokens_in += span.tokens_in
+            series.tokens_out += span.tokens_out
+            series.retries += span.retries
+            series.errors += span.error is not None
+            self._finished.append(span)
+
+    def _end(self, run_id, output=None, error: BaseException | None = None) -> None:
+        span = self._runs.pop(run_id, None)
+        # Runs that are not spans of their own only map to their closest span
+        if span is None or span.span_id != run_id.hex[16:]:
+            return
+        if output is not None:
+            span.payload_bytes = _payload_bytes(output)
+        self._finish(span, error)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name", "chain")
+        if parent_run_id not in self._runs:
+            self._start("graph", name, run_id, parent_run_id)
+        elif (metadata or {}).get("langgraph_node") == name and any(tag.startswith("graph:step:") for tag in tags or ()):
+            self._start("node", name, run_id, parent_run_id)
+        else:
+            self._runs[run_id] = self._runs[parent_run_id]
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs) -> None:
+        self._end(run_id, outputs)
+
+    def on_chain_error(self, error, *, run_id, **kwargs) -> None:
+        self._end(run_id, error=error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs) -> None:
+        self._start("tool", kwargs.get("name") or (serialized or {}).get("name", "tool"), run_id, parent_run_id)
+
+    def on_tool_end(self, output, *, run_id, **kwargs) -> None:
+        self._end(run_id, output)
+
+    def on_tool_error(self, error, *, run_id, **kwargs) -> None:
+        self._end(run_id, error=error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, metadata=None, **kwargs) -> None:
+        name = (metadata or {}).get("ls_model_name") or (serialized or {}).get("name", "chat_model")
+        self._start("llm", name, run_id, parent_run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        span = self._runs.get(run_id)
+        if span is not None:
+            usage = {}
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or usage
+            span.tokens_in = usage.get("input_tokens", 0)
+            span.tokens_out = usage.get("output_tokens", 0)
+            owner = span.owner()
+            if owner is not None:
+                owner.tokens_in += span.tokens_in
+                owner.tokens_out += span.tokens_out
+            span.payload_bytes = sum(_payload_bytes(g.text) for generations in response.generations for g in generations)
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+        self._end(run_id, error=error)
+
+    def on_retry(self, retry_state, *, run_id, **kwargs) -> None:
+        span = self._runs.get(run_id)
+        owner = span.owner() if span is not None else None
+        if owner is not None:
+            owner.retries += 1
+
+    @contextmanager
+    def span(self, kind: str, name: str, **attributes):
+        """Records the enclosed code as a span of the node or tool run it executes in.
+
+        Set `payload_bytes` (or `attributes`) on the yielded span to record them.
+        """
+        if not self.enabled:
+            yield Span(kind, name, "", None, "")
+            return
+        config = var_child_runnable_config.get() or {}
+        parent = self._runs.get(getattr(config.get("callbacks"), "parent_run_id", None))
+        span_id = os.urandom(8).hex()
+        span = Span(kind, name, span_id, parent, parent.trace_id if parent is not None else os.urandom(16).hex())
+        span.attributes = attributes
+        try:
+            yield span
+        except BaseException as e:
+            self._finish(span, e)
+            raise
+        self._finish(span)
+
+    # Reading and exporting
+
+    def stats(self) -> dict:
+        """Returns per (kind, name) call counts, p50/p95/p99 wall times, payload sizes, tokens and retries."""
+        with self._lock:
+            items = list(self._series.items())
+            return {
+                key: {
+                    "count": series.seconds.count,
+                    "seconds": dict(zip(("p50", "p95", "p99"), series.seconds.quantiles())),
+                    "total_seconds": series.seconds.total,
+                    "payload_bytes": dict(zip(("p50", "p95", "p99"), series.payload_bytes.quantiles())),
+                    "tokens_in": series.tokens_in,
+                    "tokens_out": series.tokens_out,
+                    "retries": series.retries,
+                    "errors": series.errors,
+                }
+                for key, series in items
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+            self._finished.clear()
+
+    def render_prometheus(self, prefix: str = "agent") -> str:
+        """Renders the metrics in the Prometheus text exposition format."""
+        with self._lock:
+            items = sorted(self._series.items())
+            lines = []
+
+            def summary(metric: str, help_text: str, buffer_of) -> None:
+                lines.append(f"# HELP {prefix}_{metric} {help_text}")
+                lines.append(f"# TYPE {prefix}_{metric} summary")
+                for (kind, name), series in items:
+                    buffer = buffer_of(series)
+                    labels = f'kind="{_escape(kind)}",name="{_escape(name)}"'
+                    for q, value in zip(QUANTILES, buffer.quantiles()):
+                        lines.append(f'{prefix}_{metric}{{{labels},quantile="{q}"}} {value:.6g}')
+                    lines.append(f"{prefix}_{metric}_sum{{{labels}}} {buffer.total:.6g}")
+                    lines.append(f"{prefix}_{metric}_count{{{labels}}} {buffer.count}")
+
+            def counter(metric: str, help_text: str, values_of) -> None:
+                lines.append(f"# HELP {prefix}_{metric} {help_text}")
+                lines.append(f"# TYPE {prefix}_{metric} counter")
+                for (kind, name), series in items:
+                    for extra, value in values_of(series):
+                        lines.append(f'{prefix}_{metric}{{kind="{_escape(kind)}",name="{_escape(name)}"{extra}}} {value}')
+
+            summary("duration_seconds", f"Wall time of graph nodes, tools, model and database calls (last {self.window} calls).", lambda s: s.seconds)
+            summary("payload_bytes", f"Size of the output of each call (last {self.window} calls).", lambda s: s.payload_bytes)
+            counter("tokens_total", "Model tokens, including the model calls made inside a node or tool.", lambda s: [
+                (',direction="input"', s.tokens_in), (',direction="output"', s.tokens_out),
+            ])
+            counter("retries_total", "Retried model or tool calls.", lambda s: [("", s.retries)])
+            counter("errors_total", "Calls that raised.", lambda s: [("", s.errors)])
+        return "\n".join(lines) + "\n"
+
+    def _otlp(self, span: Span) -> dict:
+        attributes = {"agent.kind": span.kind, **span.attributes}
+        if span.tokens_in or span.tokens_out:
+            attributes["gen_ai.usage.input_tokens"] = span.tokens_in
+            attributes["gen_ai.usage.output_tokens"] = span.tokens_out
+        if span.payload_bytes:
+            attributes["agent.payload_bytes"] = span.payload_bytes
+        if span.retries:
+            attributes["agent.retries"] = span.retries
+        otlp = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": f"{span.kind} {span.name}",
+            "kind": _OTLP_CLIENT if span.kind in ("llm", "mongo") else _OTLP_INTERNAL,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [_attribute(key, value) for key, value in attributes.items()],
+            # OTLP status codes: 1 ok, 2 error
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+        }
+        if span.parent is not None:
+            otlp["parentSpanId"] = span.parent.span_id
+        return otlp
+
+    def export_spans(self, service_name: str = "my_agent") -> dict:
+        """Removes the finished spans and returns them as an OTLP JSON `ExportTraceServiceRequest`."""
+        with self._lock:
+            spans = list(self._finished)
+            self._finished.clear()
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_attribute("service.name", service_name)]},
+                "scopeSpans": [{"scope": {"name": "my_agent.instrumentation"}, "spans": [self._otlp(s) for s in spans]}],
+            }]
+        }
+
+    def instrument(self, graph):
+        """Returns `graph` reporting to this handler, and starts the exporters configured by the environment.
+
+        METRICS_PORT serves render_prometheus() at /metrics. METRICS_SPANS_PATH gets
+        one OTLP JSON line of spans every METRICS_FLUSH_INTERVAL seconds, the format
+        the OpenTelemetry collector's otlpjsonfile receiver reads.
+        """
+        if not self.enabled:
+            return graph
+        if os.environ.get("METRICS_PORT"):
+            serve_prometheus(self, int(os.environ["METRICS_PORT"]))
+        if os.environ.get("METRICS_SPANS_PATH"):
+            stream_spans(self, os.environ["METRICS_SPANS_PATH"], float(os.environ.get("METRICS_FLUSH_INTERVAL", 5)))
+        return graph.with_config(callbacks=[self])
+
+
+def serve_prometheus(instrumentation: Instrumentation, port: int) -> ThreadingHTTPServer:
+    """Serves the metrics at http://0.0.0.0:<port>/metrics from a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = instrumentation.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def stream_spans(instrumentation: Instrumentation, path: str, interval: float) -> threading.Thread:
+    """Appends the finished spans to `path` as OTLP JSON lines every `interval` seconds from a daemon thread."""
+
+    def flush():
+        while True:
+            time.sleep(interval)
+            request = instrumentation.export_spans()
+            if request["resourceSpans"][0]["scopeSpans"][0]["spans"]:
+                with open(path, "a") as f:
+                    f.write(json.dumps(request) + "\n")
+
+    thread = threading.Thread(target=flush, name="metrics-spans", daemon=True)
+    thread.start()
+    return thread
+
+
+# Bound to the graph in my_agent/agent.py.
+instrumentation = Instrumentation()
@@ -0,0 +1,113 @@
+import os
+from functools import lru_cache
+
+from my_agent.utils.prompts import prompt_cache_monitor
+
+DEFAULT_MODEL = "gpt-4o"
+DEFAULT_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", 60))
+# Requests go through the shared scheduler (rate limits, retries, failover); see my_agent/utils/scheduler.py
+SCHEDULER_ENABLED = os.environ.get("LLM_SCHEDULER", "1") != "0"
+# model=model pairs to fail over to; the OpenAI and Anthropic models of nodes._get_model back each other up
+FAILOVER = dict(
+    pair.split("=", 1)
+    for pair in os.environ.get("LLM_FAILOVER", "gpt-4o=claude-3-sonnet-20240229,claude-3-sonnet-20240229=gpt-4o").split(",")
+    if "=" in pair
+)
+
+_model_factory = None
+
+
+@lru_cache(maxsize=1)
+def _http_clients():
+    import httpx
+
+    limits = httpx.Limits(
+        max_connections=int(os.environ.get("LLM_MAX_CONNECTIONS", 100)),
+        max_keepalive_connections=int(os.environ.get("LLM_MAX_KEEPALIVE_CONNECTIONS", 20)),
+    )
+    from my_agent.utils.http_pool import LoopTransport
+
+    # Async connections are pooled per event loop; see LoopTransport
+    return httpx.Client(limits=limits), httpx.AsyncClient(transport=LoopTransport(limits))
+
+
+def _create_backend(model: str, temperature: float | None, timeout: float | None):
+    if _model_factory is not None:
+        return _model_factory(model=model, temperature=temperature, timeout=timeout)
+    # The scheduler retries; the provider clients would retry each attempt again
+    return build_chat_model(model, temperature, timeout, max_retries=0 if SCHEDULER_ENABLED else None)
+
+
+def _can_fail_over(model: str) -> bool:
+    if _model_factory is not None:
+        return True
+    return bool(os.environ.get("ANTHROPIC_API_KEY" if model.startswith("claude") else "OPENAI_API_KEY"))
+
+
+def _create_chat_model(model: str, temperature: float | None, timeout: float | None):
+    if not SCHEDULER_ENABLED:
+        return _create_backend(model, temperature, timeout)
+    from my_agent.utils.scheduler import ScheduledChatModel, get_scheduler
+
+    failover = FAILOVER.get(model)
+    return ScheduledChatModel(
+        model=model,
+        models=[model] + ([failover] if failover and _can_fail_over(failover) else []),
+        factory=lambda name: _create_backend(name, temperature, timeout),
+        scheduler=get_scheduler(),
+    )
+
+
+def build_chat_model(model: str, temperature: float | None = 0, timeout: float | None = DEFAULT_TIMEOUT, max_retries: int | None = None):
+    """Builds a new provider chat model, ignoring any factory set with set_chat_model_factory.
+
+    For factories that wrap the real model, e.g. to record its responses. `max_retries`
+    overrides the provider client's own retries.
+    """
+    # Every call reports its cached prompt tokens and time to first token
+    kwargs = {"timeout": timeout, "callbacks": [prompt_cache_monitor]}
+    if temperature is not None:
+        kwargs["temperature"] = temperature
+    if max_retries is not None:
+        kwargs["max_retries"] = max_retries
+
+    if model.startswith("claude"):
+        from langchain_anthropic import ChatAnthropic
+
+        return ChatAnthropic(model_name=model, **kwargs)
+
+    from langchain_openai import ChatOpenAI
+
+    http_client, http_async_client = _http_clients()
+    # stream_usage keeps token usage (and cached tokens) in streamed responses
+    return ChatOpenAI(
+        model=model, http_client=http_client, http_async_client=http_async_client, stream_usage=True, **kwargs
+    )
+
+
+@lru_cache(maxsize=16)
+def get_chat_model(model: str = DEFAULT_MODEL, temperature: float | None = 0, timeout: float | None = DEFAULT_TIMEOUT):
+    """Returns a long-lived chat model shared by every caller with the same settings.
+
+    The returned model serves both `invoke` and `ainvoke` over pooled, keep-alive
+    HTTP connections. Its requests are rate limited, retried and failed over to the
+    model's FAILOVER backend by the shared CallScheduler, unless LLM_SCHEDULER=0.
+
+    Args:
+        model: model name, e.g. 'gpt-4o' or 'claude-3-sonnet-20240229'
+        temperature: sampling temperature, None for the provider default
+        timeout: request timeout in seconds
+    """
+    return _create_chat_model(model, temperature, timeout)
+
+
+def set_chat_model_factory(factory) -> None:
+    """Overrides how chat models are built, e.g. to hand out a fake chat model.
+
+    Args:
+        factory: callable taking `model`, `temperature` and `timeout` keyword
+            arguments and returning a chat model, or None to restore the default
+    """
+    global _model_factory
+    _model_factory = factory
+    get_chat_model.cache_clear()
@@ -0,0 +1,179 @@
+import asyncio
+import atexit
+import os
+import threading
+import weakref
+
+# Connection settings are read from the environment (see `.env` in langgraph.json)
+# so credentials never live in the source tree.
+DEFAULT_DATABASE = "abraham_baldwin"
+
+_lock = threading.Lock()
+_client = None
+_client_pid = None
+_client_factory = None
+# Async clients are bound to the event loop they were created on.
+_async_clients = weakref.WeakKeyDictionary()
+_async_client_factory = None
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def client_settings() -> dict:
+    """Returns the MongoClient keyword arguments configured by the environment."""
+    return {
+        "maxPoolSize": _env_int("MONGODB_MAX_POOL_SIZE", 50),
+        "minPoolSize": _env_int("MONGODB_MIN_POOL_SIZE", 0),
+        "maxIdleTimeMS": _env_int("MONGODB_MAX_IDLE_TIME_MS", 300_000),
+        "connectTimeoutMS": _env_int("MONGODB_CONNECT_TIMEOUT_MS", 5_000),
+        "serverSelectionTimeoutMS": _env_int("MONGODB_SERVER_SELECTION_TIMEOUT_MS", 5_000),
+        "socketTimeoutMS": _env_int("MONGODB_SOCKET_TIMEOUT_MS", 30_000),
+    }
+
+
+def connect(uri: str):
+    """Opens a new MongoClient to `uri` with the pool settings of the environment."""
+    from pymongo import MongoClient
+
+    return MongoClient(uri, **client_settings())
+
+
+def _create_client():
+    if _client_factory is not None:
+        return _client_factory()
+
+    uri = os.environ.get("MONGODB_URI")
+    if not uri:
+        raise RuntimeError("MONGODB_URI is not set")
+    return connect(uri)
+
+
+def get_client():
+    """Returns the process-wide MongoClient, creating it on first use.
+
+    The client owns a connection pool that is shared by every tool call and graph
+    run in this process. A child process created with fork() gets its own client,
+    since pymongo clients must not be shared across a fork.
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+    with _lock:
+        if _client is None or _client_pid != pid:
+            # Any client inherited from the parent is abandoned, not closed: closing it
+            # here would tear down sockets the parent is still using.
+            _client = _create_client()
+            _client_pid = pid
+        return _client
+
+
+def default_database() -> str:
+    """Returns the name of the configured database: MONGODB_DATABASE or 'abraham_baldwin'."""
+    return os.environ.get("MONGODB_DATABASE", DEFAULT_DATABASE)
+
+
+def get_database(name: str | None = None):
+    """Returns a handle to the configured database on the shared client.
+
+    Args:
+        name: database name, defaults to MONGODB_DATABASE or 'abraham_baldwin'
+    """
+    return get_client()[name or default_database()]
+
+
+def close_client() -> None:
+    """Closes the shared client. The next get_client() call opens a new one."""
+    global _client, _client_pid
+    with _lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
+
+def aconnect(uri: str):
+    """Opens a new async MongoClient to `uri`, bound to the running event loop."""
+    try:
+        from pymongo import AsyncMongoClient
+    except ImportError:
+        # pymongo < 4.9 has no async client; motor provides the same API.
+        from motor.motor_asyncio import AsyncIOMotorClient as AsyncMongoClient
+    return AsyncMongoClient(uri, **client_settings())
+
+
+def _create_async_client():
+    if _async_client_factory is not None:
+        return _async_client_factory()
+
+    uri = os.environ.get("MONGODB_URI")
+    if not uri:
+        raise RuntimeError("MONGODB_URI is not set")
+    return aconnect(uri)
+
+
+def get_async_client():
+    """Returns the async MongoClient for the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = _create_async_client()
+    return client
+
+
+def get_async_database(name: str | None = None):
+    """Returns a handle to the configured database on the event loop's async client.
+
+    Args:
+        name: database name, defaults to MONGODB_DATABASE or 'abraham_baldwin'
+    """
+    return get_async_client()[name or default_database()]
+
+
+async def close_async_client() -> None:
+    """Closes the running event loop's async client."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        result = client.close()
+        if asyncio.iscoroutine(result):
+            await result
+
+
+def set_client_factory(factory) -> None:
+    """Overrides how the shared client is built, e.g. with `mongomock.MongoClient`.
+
+    Args:
+        factory: zero-argument callable returning a MongoClient-compatible object,
+            or None to restore the default
+    """
+    global _client_factory
+    close_client()
+    _client_factory = factory
+
+
+def set_async_client_factory(factory) -> None:
+    """Overrides how async clients are built, e.g. with a fake for benchmarks.
+
+    Args:
+        factory: zero-argument callable returning an AsyncMongoClient-compatible
+            object, or None to restore the default
+    """
+    global _async_client_factory
+    _async_clients.clear()
+    _async_client_factory = factory
+
+
+def _reset_after_fork() -> None:
+    global _client, _client_pid
+    _client = None
+    _client_pid = None
+    _async_clients.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+atexit.register(close_client)
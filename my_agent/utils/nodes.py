@@ -1,20 +1,23 @@
 from functools import lru_cache
-from langchain_anthropic import ChatAnthropic
-from langchain_openai import ChatOpenAI
-from my_agent.utils.tools import tools
-from langgraph.prebuilt import ToolNode
+from langchain_core.runnables import RunnableLambda
+from my_agent.utils.compaction import HistoryCompactor
+from my_agent.utils.models import get_chat_model
+from my_agent.utils.prompts import for_model, static_system
+from my_agent.utils.tool_schemas import tool_schemas
+from my_agent.utils.tools import get_tools
+from my_agent.utils.executor import ParallelToolNode
 
 
 @lru_cache(maxsize=4)
 def _get_model(model_name: str):
     if model_name == "openai":
-        model = ChatOpenAI(temperature=0, model_name="gpt-4o")
+        model = get_chat_model("gpt-4o", temperature=0)
     elif model_name == "anthropic":
-        model =  ChatAnthropic(temperature=0, model_name="claude-3-sonnet-20240229")
+        model = get_chat_model("claude-3-sonnet-20240229", temperature=0)
     else:
         raise ValueError(f"Unsupported model type: {model_name}")
 
-    model = model.bind_tools(tools)
+    model = model.bind_tools(tool_schemas(get_tools()))
     return model
 
 # Define the function that determines whether to continue or not
@@ -31,15 +34,31 @@ def should_continue(state):
 
 system_prompt = """Be a helpful assistant"""
 
+history = HistoryCompactor()
+
 # Define the function that calls the model
 def call_model(state, config):
-    messages = state["messages"]
-    messages = [{"role": "system", "content": system_prompt}] + messages
     model_name = config.get('configurable', {}).get("model_name", "anthropic")
     model = _get_model(model_name)
+    # Anthropic models get cache breakpoints after the system prompt and the latest message
+    messages = for_model([static_system(system_prompt)] + history.compact(state["messages"]), model, cache_history=True)
     response = model.invoke(messages)
     # We return a list, because this will get added to the existing list
     return {"messages": [response]}
 
 # Define the function to execute tools
-tool_node = ToolNode(tools)
\ No newline at end of file
+# The tools are built on the first tool call, not at import
+@lru_cache(maxsize=1)
+def _get_tool_node():
+    return ParallelToolNode(get_tools())
+
+
+def _run_tools(state, config):
+    return _get_tool_node().invoke(state, config)
+
+
+async def _arun_tools(state, config):
+    return await _get_tool_node().ainvoke(state, config)
+
+
+tool_node = RunnableLambda(_run_tools, afunc=_arun_tools, name="action")
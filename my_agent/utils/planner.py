@@ -0,0 +1,213 @@
+import json
+import os
+import re
+
+from langchain_core.messages import BaseMessage, HumanMessage, ToolMessage
+from langchain_core.runnables import RunnableLambda
+from langgraph.constants import TAG_NOSTREAM
+
+from my_agent.utils.models import get_chat_model
+from my_agent.utils.prompts import SCHEMA_RULES, for_model, layout
+from my_agent.utils.state import PlanStep, merge_plan
+
+# How often the LLM may rewrite the plan for one question before the agent carries on as is.
+MAX_REPLANS = int(os.environ.get("PLANNER_MAX_REPLANS", 2))
+
+# The plan every data question starts with; the LLM only rewrites it when a step fails.
+DEFAULT_STEPS = [
+    ("Identify the collections relevant to the user's question", "identify_relevant_mongodb_collections"),
+    ("Fetch the schemas of the relevant collections", "mongodb_schemas_for_collections"),
+    ("Create a MongoDB query for the question from the schemas", "create_mongodb_query"),
+    ("Execute the query", "execute_pymongo"),
+    ("Answer the user's question from the query results", None),
+]
+QUERY_EXECUTORS = ("execute_pymongo", "execute_mongodb_shell_syntax")
+# Tools that answer in JSON when they succeed.
+JSON_TOOLS = QUERY_EXECUTORS + ("materialized_statistics",)
+
+
+def initial_plan(steps=DEFAULT_STEPS) -> list[PlanStep]:
+    return [
+        {"id": i, "description": description, "tool": tool, "status": "pending"}
+        for i, (description, tool) in enumerate(steps, start=1)
+    ]
+
+
+PLANNER_INSTRUCTIONS = f"""You are a planner for an AI agent. You will be given the goal the agent has been working on, its current plan, its progress so far and new information from the environment.
+
+Rules to Follow:
+{SCHEMA_RULES}
+If there are no relevant collections, terminate the plan and tell the user that we don't have any information on that topic.
+
+Based on the new information and the tools available, update the remaining steps of the plan. Add, remove, or modify steps as needed. Make sure to only include steps that can be accomplished using the available tools. Provide the updated plan as a numbered list."""
+
+
+def plan_prompt(goal: str, current_plan: str, completed_steps: str, new_observations: str, available_tools: str) -> list[BaseMessage]:
+    # Instructions and tools are the same for every replan; the agent's progress comes last
+    return layout(
+        PLANNER_INSTRUCTIONS,
+        f"Available tools:\n{available_tools}",
+        variable=f"""Goal: {goal}
+
+Current plan:
+{current_plan}
+
+Progress so far:
+{completed_steps}
+
+New information from environment:
+{new_observations}""",
+    )
+
+
+def render_plan(plan: list[PlanStep]) -> str:
+    """Renders the plan for the assistant's prompt, pointing at the next pending step."""
+    lines = [f"{step['id']}. [{step['status']}] {step['description']}" for step in plan]
+    pending = [step for step in plan if step["status"] == "pending"]
+    if pending:
+        lines.append(f"Next step: {pending[0]['description']}")
+    return "Plan:\n" + "\n".join(lines)
+
+
+def _failed(message: ToolMessage) -> bool:
+    """Whether a tool result is an error or not what the step should have produced."""
+    if message.status == "error":
+        return True
+    content = str(message.content).strip()
+    if message.name in JSON_TOOLS:
+        # Successful queries always return JSON; anything else is an error message.
+        try:
+            json.loads(content)
+        except ValueError:
+            return True
+    if message.name == "create_mongodb_query":
+        return not content.startswith("db.")
+    return False
+
+
+def _trailing_tool_messages(messages) -> list[ToolMessage]:
+    tool_messages = []
+    for message in reversed(messages):
+        if not isinstance(message, ToolMessage):
+            break
+        tool_messages.append(message)
+    return tool_messages[::-1]
+
+
+def observe(plan: list[PlanStep], tool_messages: list[ToolMessage]) -> tuple[list[dict], list[ToolMessage]]:
+    """Matches tool results to pending steps and returns the step patches and the failures."""
+    patches, failures = [], []
+    claimed = set()
+    for message in tool_messages:
+        step = next(
+            (
+                s for s in plan
+                if s["status"] in ("pending", "failed") and s["id"] not in claimed
+                and (s["tool"] == message.name or (s["tool"] in QUERY_EXECUTORS and message.name in QUERY_EXECUTORS))
+            ),
+            None,
+        )
+        if step is None:
+            continue
+        claimed.add(step["id"])
+        result = str(message.content)[:200]
+        if _failed(message):
+            patches.append({"id": step["id"], "status": "failed", "result": result})
+            failures.append(message)
+        elif message.name == "identify_relevant_mongodb_collections" and str(message.content).strip() in ("[]", ""):
+            patches.append({"id": step["id"], "status": "done", "result": result})
+            # Rule 6: nothing to query, so tell the user we have no information on the topic.
+            for later in plan:
+                if later["id"] > step["id"] and later["tool"] is not None:
+                    patches.append({"id": later["id"], "status": "skipped"})
+                elif later["id"] > step["id"]:
+                    patches.append({"id": later["id"], "description": "Tell the user we don't have any information on that topic"})
+        else:
+            patches.append({"id": step["id"], "status": "done", "result": result})
+    return patches, failures
+
+
+def parse_plan(text: str, tool_names: list[str], start: int) -> list[PlanStep]:
+    """Turns a numbered-list plan from the LLM into pending steps numbered from `start`."""
+    steps = []
+    for line in text.splitlines():
+        match = re.match(r"\s*\d+[.)]\s*(.+)", line)
+        if not match:
+            continue
+        description = match.group(1).strip()
+        tool = next((name for name in tool_names if name in description), None)
+        steps.append({"id": start + len(steps), "description": description, "tool": tool, "status": "pending"})
+    return steps
+
+
+class Planner:
+    """Graph node that keeps a structured plan in the graph state.
+
+    Each new question starts from DEFAULT_STEPS without an LLM call, or from the steps
+    `fast_path(question)` returns when it returns any. After every tool turn the
+    results are matched to plan steps and applied as a diff; the LLM is asked to
+    rewrite the remaining steps only when a step fails, at most MAX_REPLANS times.
+    """
+
+    def __init__(self, tools, model=None, fast_path=None):
+        self.tool_names = [t.name if hasattr(t, "name") else t.__name__ for t in tools]
+        self.available_tools = "\n".join(
+            f"{name}: {(t.description if hasattr(t, 'description') else t.__doc__ or '').strip().splitlines()[0]}"
+            for name, t in zip(self.tool_names, tools)
+        )
+        self._model = model
+        self.fast_path = fast_path
+
+    @property
+    def model(self):
+        # Replans are internal; keep their tokens out of the client's message stream
+        return (self._model or get_chat_model("gpt-4o", temperature=0)).with_config(tags=[TAG_NOSTREAM])
+
+    def _update(self, state) -> tuple[dict, list[BaseMessage] | None]:
+        messages = state["messages"]
+        if isinstance(messages[-1], HumanMessage) or not state.get("plan"):
+            question = next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+            steps = (self.fast_path(question) if self.fast_path else None) or DEFAULT_STEPS
+            return {"plan": {"replace": initial_plan(steps)}, "replans": 0}, None
+
+        patches, failures = observe(state["plan"], _trailing_tool_messages(messages))
+        if not failures or state.get("replans", 0) >= MAX_REPLANS:
+            return {"plan": patches}, None
+
+        plan = merge_plan(state["plan"], patches)
+        goal = next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+        prompt = plan_prompt(
+            goal=goal,
+            current_plan="\n".join(f"{s['id']}. {s['description']}" for s in plan if s["status"] != "done"),
+            completed_steps="\n".join(f"{s['id']}. {s['description']}: {s.get('result', '')}" for s in plan if s["status"] == "done"),
+            new_observations="\n".join(f"{m.name} failed: {m.content}" for m in failures),
+            available_tools=self.available_tools,
+        )
+        return {"plan": patches}, prompt
+
+    def _replan(self, state, update: dict, response: str) -> dict:
+        plan = merge_plan(state["plan"], update["plan"])
+        done = [step for step in plan if step["status"] == "done"]
+        steps = parse_plan(response, self.tool_names, start=len(done) + 1)
+        if not steps:
+            return update
+        renumbered = [{**step, "id": i} for i, step in enumerate(done, start=1)]
+        return {"plan": {"replace": renumbered + steps}, "replans": state.get("replans", 0) + 1}
+
+    def invoke(self, state) -> dict:
+        update, prompt = self._update(state)
+        if prompt is None:
+            return update
+        model = self.model
+        return self._replan(state, update, model.invoke(for_model(prompt, model)).content)
+
+    async def ainvoke(self, state) -> dict:
+        update, prompt = self._update(state)
+        if prompt is None:
+            return update
+        model = self.model
+        return self._replan(state, update, (await model.ainvoke(for_model(prompt, model))).content)
+
+    def as_node(self, name: str = "planner") -> RunnableLambda:
+        return RunnableLambda(self.invoke, afunc=self.ainvoke, name=name)
+
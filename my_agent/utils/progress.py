@@ -0,0 +1,38 @@
+from langchain_core.callbacks import adispatch_custom_event, dispatch_custom_event
+from langgraph.config import get_stream_writer
+
+# Name of the custom event carrying tool progress in astream_events.
+PROGRESS_EVENT = "tool_progress"
+
+
+def _write(payload: dict) -> None:
+    try:
+        get_stream_writer()(payload)
+    except (RuntimeError, KeyError):
+        # Not running inside a graph
+        pass
+
+
+def emit_progress(event: str, **data) -> None:
+    """Reports tool progress to clients streaming the graph.
+
+    The payload `{"event": event, **data}` is sent on the "custom" stream mode of
+    `graph.stream` and as a `tool_progress` custom event of `astream_events`. Outside
+    a graph run it is dropped.
+    """
+    payload = {"event": event, **data}
+    _write(payload)
+    try:
+        dispatch_custom_event(PROGRESS_EVENT, payload)
+    except RuntimeError:
+        pass
+
+
+async def aemit_progress(event: str, **data) -> None:
+    """Async version of emit_progress for code running on the event loop."""
+    payload = {"event": event, **data}
+    _write(payload)
+    try:
+        await adispatch_custom_event(PROGRESS_EVENT, payload)
+    except RuntimeError:
+        pass
@@ -0,0 +1,149 @@
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+# Shared by every prompt that writes queries, so they all start with the same bytes.
+SCHEMA_RULES = """<schema_rules>
+1. Under no circumstances should you query for properties of a collection that are not listed in the schema.
+2. The word 'rooms' and 'classrooms' are synonymous. Classrooms is not a subset of rooms.
+3. The word 'professors' and 'faculty' are synonymous.
+4. The word 'courses' and 'classes' are synonymous.
+5. The word 'departments' and 'depts' are synonymous.
+</schema_rules>"""
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def text_block(text: str, cache: bool = False) -> dict:
+    """A text content block; `cache` ends a cacheable prefix on models that take markers."""
+    block = {"type": "text", "text": text}
+    if cache:
+        block["cache_control"] = CACHE_CONTROL
+    return block
+
+
+def static_system(text: str) -> SystemMessage:
+    """System message that forms the cacheable prefix of a prompt."""
+    return SystemMessage(content=[text_block(text, cache=True)])
+
+
+def layout(instructions: str, *context: str, variable: str) -> list[BaseMessage]:
+    """Builds a prompt as a static prefix followed by the variable part.
+
+    `instructions` become the system message, each `context` string (e.g. rendered
+    schemas) a cacheable block of the user message, and `variable` (the user's
+    question) its last block, so providers can reuse everything before it.
+    """
+    blocks = [text_block(text, cache=True) for text in context] + [text_block(variable)]
+    return [static_system(instructions), HumanMessage(content=blocks)]
+
+
+def supports_cache_control(model) -> bool:
+    """Whether `model` (or the model behind a binding or a scheduled model) takes cache_control markers."""
+    model = getattr(model, "bound", model)
+    # The primary backend of a scheduled model, itself possibly bound to tools
+    model = getattr(model, "primary", model)
+    model = getattr(model, "bound", model)
+    return type(model).__name__ == "ChatAnthropic"
+
+
+def _strip(message: BaseMessage) -> BaseMessage:
+    if not isinstance(message.content, list) or not any("cache_control" in b for b in message.content if isinstance(b, dict)):
+        return message
+    content = [{k: v for k, v in b.items() if k != "cache_control"} if isinstance(b, dict) else b for b in message.content]
+    if all(isinstance(b, dict) and b.get("type") == "text" for b in content):
+        content = "\n\n".join(b["text"] for b in content)
+    return message.model_copy(update={"content": content})
+
+
+def _mark_last(message: BaseMessage) -> BaseMessage:
+    content = message.content
+    if isinstance(content, str):
+        content = [text_block(content)] if content else []
+    if not content or not isinstance(content[-1], dict):
+        return message
+    content = [*content[:-1], {**content[-1], "cache_control": CACHE_CONTROL}]
+    return message.model_copy(update={"content": content})
+
+
+def for_model(messages: list[BaseMessage], model, cache_history: bool = False) -> list[BaseMessage]:
+    """Adapts a laid-out prompt to `model`.
+
+    Anthropic models keep the cache_control markers, and with `cache_history` the
+    last message also gets one, so the next turn reuses the whole conversation so
+    far. Other providers cache matching prefixes on their own (OpenAI from 1024
+    tokens) and get the markers stripped.
+    """
+    if not supports_cache_control(model):
+        return [_strip(message) for message in messages]
+    if cache_history and messages:
+        return [*messages[:-1], _mark_last(messages[-1])]
+    return list(messages)
+
+
+class PromptCacheMonitor(BaseCallbackHandler):
+    """Callback handler recording cached prompt tokens and time to first token per model call.
+
+    Time to first token is measured from the first streamed token; calls that do
+    not stream count the time to the full response.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = {}
+        self._first_token = {}
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls = 0
+            self.input_tokens = 0
+            self.cache_read_tokens = 0
+            self.cache_creation_tokens = 0
+            self.ttfts = []
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs) -> None:
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs) -> None:
+        self._first_token.setdefault(run_id, time.perf_counter())
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        started = self._started.pop(run_id, None)
+        first_token = self._first_token.pop(run_id, time.perf_counter())
+        usage = {}
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or usage
+        details = usage.get("input_token_details", {})
+        with self._lock:
+            self.calls += 1
+            self.input_tokens += usage.get("input_tokens", 0)
+            self.cache_read_tokens += details.get("cache_read", 0) or 0
+            self.cache_creation_tokens += details.get("cache_creation", 0) or 0
+            if started is not None:
+                self.ttfts.append(first_token - started)
+
+    def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+        self._started.pop(run_id, None)
+        self._first_token.pop(run_id, None)
+
+    def stats(self) -> dict:
+        """Returns call and token counts, the cached-token ratio and TTFT percentiles in seconds."""
+        with self._lock:
+            ttfts = sorted(self.ttfts)
+            return {
+                "calls": self.calls,
+                "input_tokens": self.input_tokens,
+                "cache_read_tokens": self.cache_read_tokens,
+                "cache_creation_tokens": self.cache_creation_tokens,
+                "cached_ratio": self.cache_read_tokens / self.input_tokens if self.input_tokens else 0.0,
+                "ttft_p50": ttfts[len(ttfts) // 2] if ttfts else None,
+                "ttft_p95": ttfts[min(len(ttfts) - 1, int(len(ttfts) * 0.95))] if ttfts else None,
+            }
+
+
+# Attached to every model built by get_chat_model.
+prompt_cache_monitor = PromptCacheMonitor()
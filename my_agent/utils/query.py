@@ -0,0 +1,401 @@
+import ast
+import inspect
+import os
+import re
+from datetime import datetime
+from functools import lru_cache
+from typing import NamedTuple
+
+OPERATIONS = ("find", "find_one", "count_documents", "aggregate", "distinct")
+# Shell spellings of the whitelisted operations.
+OPERATION_ALIASES = {"findOne": "find_one", "count": "count_documents", "countDocuments": "count_documents"}
+CURSOR_METHODS = ("sort", "skip", "limit")
+
+# Operators that run server-side JavaScript are never allowed.
+FORBIDDEN_OPERATORS = frozenset({"$where", "$function", "$accumulator"})
+# Stages that write to the database are never allowed.
+FORBIDDEN_STAGES = frozenset({"$out", "$merge"})
+# Stages after which documents no longer have the collection's schema.
+RESHAPING_STAGES = frozenset(
+    {"$group", "$project", "$addFields", "$set", "$unset", "$lookup", "$replaceRoot", "$replaceWith", "$count", "$bucket", "$facet", "$unwind"}
+)
+LOGICAL_OPERATORS = frozenset({"$and", "$or", "$nor"})
+
+MAX_LIMIT = int(os.environ.get("QUERY_MAX_LIMIT", 1000))
+
+
+class QueryError(ValueError):
+    """Raised when a generated query cannot be parsed or is not allowed."""
+
+
+class QueryPlan(NamedTuple):
+    collection: str
+    operation: str
+    filter: dict
+    projection: dict | None = None
+    sort: list | None = None
+    skip: int = 0
+    limit: int = 0
+    pipeline: list | None = None
+    key: str | None = None
+
+
+_JS_TOKENS = re.compile(
+    r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')"""  # string literals, kept as is
+    r"""|([{,]\s*)([A-Za-z_$][\w$.]*)(\s*:)"""  # unquoted object keys
+    r"""|\b(true|false|null)\b"""  # JavaScript literals
+    r"""|\bnew\s+"""  # `new ISODate(...)`
+)
+_JS_LITERALS = {"true": "True", "false": "False", "null": "None"}
+_NAMED_CONSTANTS = {"True": True, "False": False, "None": None, "ASCENDING": 1, "DESCENDING": -1}
+
+
+def _pythonize(text: str) -> str:
+    def replace(match):
+        if match.group(1):
+            return match.group(1)
+        if match.group(3):
+            return f'{match.group(2)}"{match.group(3)}"{match.group(4)}'
+        if match.group(5):
+            return _JS_LITERALS[match.group(5)]
+        return ""
+
+    return _JS_TOKENS.sub(replace, text.strip().rstrip(";"))
+
+
+def _literal(node):
+    """Evaluates a literal expression node without eval()."""
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, ast.Dict):
+        if any(key is None for key in node.keys):
+            raise QueryError("Dictionary unpacking is not allowed")
+        return {_literal(key): _literal(value) for key, value in zip(node.keys, node.values)}
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return [_literal(element) for element in node.elts]
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        value = _literal(node.operand)
+        if not isinstance(value, (int, float)):
+            raise QueryError("Unary operators only apply to numbers")
+        return -value if isinstance(node.op, ast.USub) else value
+    if isinstance(node, ast.Name) and node.id in _NAMED_CONSTANTS:
+        return _NAMED_CONSTANTS[node.id]
+    if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == "pymongo" and node.attr in _NAMED_CONSTANTS:
+        return _NAMED_CONSTANTS[node.attr]
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and len(node.args) == 1 and not node.keywords:
+        argument = _literal(node.args[0])
+        if node.func.id in ("ISODate", "Date") and isinstance(argument, str):
+            try:
+                return datetime.fromisoformat(argument.replace("Z", "+00:00"))
+            except ValueError:
+                raise QueryError(f"Invalid date: {argument!r}") from None
+        if node.func.id == "ObjectId" and isinstance(argument, str):
+            from bson import ObjectId
+
+            if not ObjectId.is_valid(argument):
+                raise QueryError(f"Invalid ObjectId: {argument!r}")
+            return ObjectId(argument)
+        if node.func.id in ("NumberInt", "NumberLong") and isinstance(argument, (int, str)):
+            try:
+                return int(argument)
+            except ValueError:
+                raise QueryError(f"Invalid {node.func.id}: {argument!r}") from None
+    raise QueryError(f"Unsupported expression: {ast.unparse(node)}")
+
+
+def _sort_spec(args: list, kwargs: dict) -> list:
+    if "key_or_list" in kwargs:
+        args = [kwargs.pop("key_or_list")] + args
+    if "direction" in kwargs:
+        args = args + [kwargs.pop("direction")]
+    if kwargs or not args or len(args) > 2:
+        raise QueryError("sort() takes a field and direction or a list of them")
+    spec = args[0]
+    if isinstance(spec, str):
+        spec = [(spec, args[1] if len(args) > 1 else 1)]
+    elif isinstance(spec, dict):
+        spec = list(spec.items())
+    if not isinstance(spec, list) or not all(
+        isinstance(item, (list, tuple)) and len(item) == 2 and isinstance(item[0], str) for item in spec
+    ):
+        raise QueryError("sort() takes a field and direction or a list of them")
+    return [tuple(item) for item in spec]
+
+
+def _int_argument(method: str, args: list, kwargs: dict) -> int:
+    values = args + list(kwargs.values())
+    if len(values) != 1 or not isinstance(values[0], int) or isinstance(values[0], bool) or values[0] < 0:
+        raise QueryError(f"{method}() takes a single non-negative integer")
+    return values[0]
+
+
+def _int_keyword(name: str, kwargs: dict) -> int:
+    return _int_argument(name, [kwargs.pop(name)], {}) if name in kwargs else 0
+
+
+class QueryCompiler:
+    """Compiles generated `db.<collection>.<operation>(...)` text into a validated QueryPlan.
+
+    Both pymongo and shell spellings are accepted (unquoted keys, true/false/null,
+    `.count()`, `.sort({...})`). Only the whitelisted read operations are allowed, and
+    every field referenced by filters, projections, sorts and leading pipeline stages
+    must exist in the registry's schema for the collection. Finds without a projection
+    get one restricted to the schema's fields. Compiled plans are cached by query text.
+    """
+
+    def __init__(self, registry, max_limit: int = MAX_LIMIT, cache_size: int = 1024, default_projection: bool = True):
+        self.registry = registry
+        self.max_limit = max_limit
+        self.default_projection = default_projection
+        self.compile = lru_cache(maxsize=cache_size)(self._compile)
+
+    def _compile(self, query: str) -> QueryPlan:
+        try:
+            tree = ast.parse(_pythonize(query), mode="eval")
+        except SyntaxError as e:
+            raise QueryError(f"Could not parse query: {e.msg}") from None
+
+        calls = []
+        node = tree.body
+        while isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr != "getCollection":
+            calls.append((node.func.attr, node.args, node.keywords))
+            node = node.func.value
+        calls.reverse()
+        collection = self._collection_name(node)
+        if not calls:
+            raise QueryError("Query must call an operation on the collection")
+
+        operation, args, keywords = calls[0]
+        operation = OPERATION_ALIASES.get(operation, operation)
+        if operation not in OPERATIONS:
+            raise QueryError(f"Operation '{operation}' is not allowed; use one of {', '.join(OPERATIONS)}")
+        args = [_literal(arg) for arg in args]
+        kwargs = {keyword.arg: _literal(keyword.value) for keyword in keywords}
+        plan = self._plan(collection, operation, args, kwargs)
+
+        for method, method_args, method_keywords in calls[1:]:
+            method_args = [_literal(arg) for arg in method_args]
+            method_kwargs = {keyword.arg: _literal(keyword.value) for keyword in method_keywords}
+            if method in ("count", "countDocuments") and plan.operation == "find" and not method_args:
+                plan = plan._replace(operation="count_documents", projection=None, sort=None)
+            elif plan.operation != "find" or method not in CURSOR_METHODS:
+                raise QueryError(f"'.{method}()' is not allowed after {plan.operation}()")
+            elif method == "sort":
+                plan = plan._replace(sort=_sort_spec(method_args, method_kwargs))
+            elif method == "skip":
+                plan = plan._replace(skip=_int_argument(method, method_args, method_kwargs))
+            else:
+                plan = plan._replace(limit=_int_argument(method, method_args, method_kwargs))
+
+        self._validate(plan)
+        return plan
+
+    def _collection_name(self, node) -> str:
+        if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == "db":
+            name = node.attr
+        elif isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and node.value.id == "db":
+            name = _literal(node.slice)
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "getCollection":
+            name = _literal(node.args[0]) if node.args else None
+        else:
+            raise QueryError("Query must start with db.<collection>")
+        if self.registry.get(name) is None:
+            raise QueryError(f"Unknown collection '{name}'")
+        return name
+
+    def _plan(self, collection: str, operation: str, args: list, kwargs: dict) -> QueryPlan:
+        def take(position: int, name: str, default=None):
+            if name in kwargs:
+                return kwargs.pop(name)
+            return args[position] if len(args) > position else default
+
+        if operation in ("find", "find_one"):
+            plan = QueryPlan(collection, "find", take(0, "filter", {}), take(1, "projection"))
+            if "sort" in kwargs:
+                plan = plan._replace(sort=_sort_spec([kwargs.pop("sort")], {}))
+            plan = plan._replace(skip=_int_keyword("skip", kwargs), limit=_int_keyword("limit", kwargs))
+            if operation == "find_one":
+                plan = plan._replace(operation="find_one", limit=1)
+            if plan.projection is None and self.default_projection:
+                plan = plan._replace(projection=self.registry.projection(collection))
+            if len(args) > 2:
+                raise QueryError(f"{operation}() takes at most a filter and a projection")
+        elif operation == "count_documents":
+            plan = QueryPlan(
+                collection, operation, take(0, "filter", {}), limit=_int_keyword("limit", kwargs), skip=_int_keyword("skip", kwargs)
+            )
+        elif operation == "distinct":
+            plan = QueryPlan(collection, operation, take(1, "filter", {}) or {}, key=take(0, "key"))
+            if not isinstance(plan.key, str):
+                raise QueryError("distinct() takes a field name")
+        else:
+            plan = QueryPlan(collection, operation, {}, pipeline=take(0, "pipeline"))
+            if not isinstance(plan.pipeline, list):
+                raise QueryError("aggregate() takes a list of pipeline stages")
+        if kwargs:
+            raise QueryError(f"Unsupported arguments to {operation}(): {', '.join(kwargs)}")
+        return plan
+
+    def _check_field(self, collection: str, path) -> None:
+        if not isinstance(path, str):
+            raise QueryError(f"Field names must be strings, got {path!r}")
+        if path != "_id" and not path.startswith("_id.") and self.registry.field(collection, path) is None:
+            raise QueryError(f"Field '{path}' is not in the {collection} schema")
+
+    def _check_operators(self, value) -> None:
+        if isinstance(value, dict):
+            for key, item in value.items():
+                if key in FORBIDDEN_OPERATORS:
+                    raise QueryError(f"Operator '{key}' is not allowed")
+                self._check_operators(item)
+        elif isinstance(value, list):
+            for item in value:
+                self._check_operators(item)
+
+    def _check_filter(self, collection: str, query) -> None:
+        if not isinstance(query, dict):
+            raise QueryError("Filters must be documents")
+        for key, value in query.items():
+            if not isinstance(key, str):
+                raise QueryError(f"Field names must be strings, got {key!r}")
+            if key in LOGICAL_OPERATORS:
+                if not isinstance(value, list):
+                    raise QueryError(f"'{key}' takes a list of filters")
+                for clause in value:
+                    self._check_filter(collection, clause)
+            elif not key.startswith("$"):
+                self._check_field(collection, key)
+
+    def _check_collection(self, name, stage: str) -> None:
+        if not isinstance(name, str) or self.registry.get(name) is None:
+            raise QueryError(f"Unknown collection '{name}' in {stage}")
+
+    def _check_stages(self, pipeline) -> None:
+        """Checks the stages of a pipeline and of the pipelines nested in it, and the collections they read."""
+        if not isinstance(pipeline, list):
+            raise QueryError("Pipelines must be lists of stages")
+        for stage in pipeline:
+            if not isinstance(stage, dict) or len(stage) != 1:
+                raise QueryError("Each pipeline stage must be a document with a single operator")
+            (name, spec), = stage.items()
+            if name in FORBIDDEN_STAGES:
+                raise QueryError(f"Pipeline stage '{name}' is not allowed")
+            if name in ("$lookup", "$graphLookup"):
+                if not isinstance(spec, dict):
+                    raise QueryError(f"{name} takes a document")
+                self._check_collection(spec.get("from"), name)
+                if "pipeline" in spec:
+                    self._check_stages(spec["pipeline"])
+            elif name == "$unionWith":
+                # {$unionWith: "coll"} or {$unionWith: {coll: "coll", pipeline: [...]}}
+                if isinstance(spec, dict):
+                    self._check_collection(spec.get("coll"), name)
+                    if "pipeline" in spec:
+                        self._check_stages(spec["pipeline"])
+                else:
+                    self._check_collection(spec, name)
+            elif name == "$facet":
+                if not isinstance(spec, dict):
+                    raise QueryError("$facet takes a document of pipelines")
+                for facet in spec.values():
+                    self._check_stages(facet)
+
+    def _validate(self, plan: QueryPlan) -> None:
+        collection = plan.collection
+        self._check_operators([plan.filter, plan.projection, plan.pipeline])
+        self._check_filter(collection, plan.filter)
+        if plan.projection is not None:
+            if not isinstance(plan.projection, (dict, list)):
+                raise QueryError("Projections must be documents or lists of fields")
+            for field in plan.projection:
+                self._check_field(collection, field)
+        for field, _ in plan.sort or ():
+            self._check_field(collection, field)
+        if plan.key is not None:
+            self._check_field(collection, plan.key)
+        if plan.limit > self.max_limit:
+            raise QueryError(f"Limit {plan.limit} exceeds the maximum of {self.max_limit}")
+
+        if plan.pipeline is not None:
+            self._check_stages(plan.pipeline)
+            reshaped = False
+            for stage in plan.pipeline:
+                (name, spec), = stage.items()
+                if not reshaped:
+                    if name == "$match":
+                        self._check_filter(collection, spec)
+                    elif name == "$sort" and isinstance(spec, dict):
+                        for field in spec:
+                            self._check_field(collection, field)
+                    elif name == "$unwind":
+                        path = spec.get("path") if isinstance(spec, dict) else spec
+                        self._check_field(collection, str(path).lstrip("$"))
+                reshaped = reshaped or name in RESHAPING_STAGES
+
+
+def count_plan(plan: QueryPlan, db) -> int | None:
+    """Returns the number of documents a find plan matches, ignoring skip and limit."""
+    if plan.operation != "find":
+        return None
+    return db[plan.collection].count_documents(plan.filter)
+
+
+def execute_plan(plan: QueryPlan, db):
+    """Runs a compiled plan against `db` and returns a cursor, list, document or count."""
+    collection = db[plan.collection]
+    if plan.operation == "count_documents":
+        options = {key: value for key, value in (("limit", plan.limit), ("skip", plan.skip)) if value}
+        return collection.count_documents(plan.filter, **options)
+    if plan.operation == "distinct":
+        return collection.distinct(plan.key, plan.filter)
+    if plan.operation == "aggregate":
+        return collection.aggregate(plan.pipeline)
+    if plan.operation == "find_one":
+        return collection.find_one(plan.filter, plan.projection, skip=plan.skip, sort=plan.sort)
+
+    cursor = collection.find(plan.filter, plan.projection)
+    if plan.sort:
+        cursor = cursor.sort(plan.sort)
+    if plan.skip:
+        cursor = cursor.skip(plan.skip)
+    if plan.limit:
+        cursor = cursor.limit(plan.limit)
+    return cursor
+
+
+async def _resolve(value):
+    return await value if inspect.isawaitable(value) else value
+
+
+async def acount_plan(plan: QueryPlan, db) -> int | None:
+    """Async version of count_plan for an async (pymongo or motor) database."""
+    if plan.operation != "find":
+        return None
+    return await db[plan.collection].count_documents(plan.filter)
+
+
+async def aexecute_plan(plan: QueryPlan, db):
+    """Async version of execute_plan for an async (pymongo or motor) database.
+
+    Returns an async cursor for find and aggregate.
+    """
+    collection = db[plan.collection]
+    if plan.operation == "count_documents":
+        options = {key: value for key, value in (("limit", plan.limit), ("skip", plan.skip)) if value}
+        return await collection.count_documents(plan.filter, **options)
+    if plan.operation == "distinct":
+        return await collection.distinct(plan.key, plan.filter)
+    if plan.operation == "aggregate":
+        # pymongo's async aggregate is a coroutine, motor's returns the cursor directly.
+        return await _resolve(collection.aggregate(plan.pipeline))
+    if plan.operation == "find_one":
+        return await collection.find_one(plan.filter, plan.projection, skip=plan.skip, sort=plan.sort)
+
+    cursor = collection.find(plan.filter, plan.projection)
+    if plan.sort:
+        cursor = cursor.sort(plan.sort)
+    if plan.skip:
+        cursor = cursor.skip(plan.skip)
+    if plan.limit:
+        cursor = cursor.limit(plan.limit)
+    return cursor
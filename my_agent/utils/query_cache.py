@@ -0,0 +1,292 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from my_agent.utils.query import QueryPlan
+
+# Stages whose documents come from another collection, and the option naming it.
+FOREIGN_COLLECTION_STAGES = {"$lookup": "from", "$graphLookup": "from", "$unionWith": "coll"}
+
+
+def _canonical(value, ordered: bool = False):
+    if isinstance(value, dict):
+        # Key order matters in sort specifications, everywhere else it does not.
+        items = value.items() if ordered else sorted(value.items())
+        return {key: _canonical(item, ordered=key == "$sort") for key, item in items}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    # ObjectId, datetime, Decimal128, ...: keep the type so 1 and ObjectId("1...") differ.
+    return {f"${type(value).__name__}": str(value)}
+
+
+def canonical_query(plan: QueryPlan) -> str:
+    """Returns a cache key for a compiled plan that ignores filter key order and number spelling."""
+    return json.dumps(
+        {
+            "collection": plan.collection,
+            "operation": plan.operation,
+            "filter": _canonical(plan.filter),
+            "projection": _canonical(plan.projection),
+            "sort": _canonical(plan.sort),
+            "skip": plan.skip,
+            "limit": plan.limit,
+            "pipeline": _canonical(plan.pipeline),
+            "key": plan.key,
+        },
+        separators=(",", ":"),
+    )
+
+
+def _foreign_collections(value) -> set[str]:
+    found = set()
+    if isinstance(value, dict):
+        for key, item in value.items():
+            option = FOREIGN_COLLECTION_STAGES.get(key)
+            if option is not None:
+                name = item if isinstance(item, str) else item.get(option)
+                if isinstance(name, str):
+                    found.add(name)
+            found |= _foreign_collections(item)
+    elif isinstance(value, list):
+        for item in value:
+            found |= _foreign_collections(item)
+    return found
+
+
+def plan_collections(plan: QueryPlan) -> tuple[str, ...]:
+    """Returns every collection a plan reads, including $lookup/$unionWith sources."""
+    return tuple(sorted({plan.collection} | _foreign_collections(plan.pipeline)))
+
+
+class CollectionVersions:
+    """Per-collection version counters that are bumped whenever a collection changes.
+
+    `start()` follows a database change stream in a background thread. Where change
+    streams are unavailable (standalone servers, mongomock), it polls every tracked
+    collection every `poll_interval` seconds instead and bumps a collection when its
+    watermark moves: its document count and highest `watermark_field` value, or a
+    hash of its documents when they have no such field, as in-place updates would
+    go unnoticed otherwise. Collections without the field and with more than
+    `hash_max_docs` documents are not cacheable while polling. `poll()` runs one
+    polling pass synchronously.
+    """
+
+    def __init__(self, get_db, watermark_field: str = "lastEdited", poll_interval: float = 5.0, hash_max_docs: int = 10_000):
+        self.get_db = get_db
+        self.watermark_field = watermark_field
+        self.poll_interval = poll_interval
+        self.hash_max_docs = hash_max_docs
+        self.mode = None
+        self._versions = {}
+        self._watermarks = {}
+        self._tracked = set()
+        self._uncacheable = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+
+    def version(self, collection: str) -> int:
+        with self._lock:
+            self._tracked.add(collection)
+            return self._versions.get(collection, 0)
+
+    def bump(self, collection: str | None = None) -> None:
+        """Invalidates one collection, or every collection when None."""
+        with self._lock:
+            for name in [collection] if collection else set(self._versions) | self._tracked:
+                self._versions[name] = self._versions.get(name, 0) + 1
+
+    def cacheable(self, collections) -> bool:
+        """Whether changes to all of `collections` are noticed, so results reading them may be cached."""
+        with self._lock:
+            return self.mode == "change_stream" or self._uncacheable.isdisjoint(collections)
+
+    def watermark(self, collection: str):
+        """The collection's document count and latest `watermark_field` value or content hash, None if unknown."""
+        db = self.get_db()
+        count = db[collection].estimated_document_count()
+        latest = db[collection].find_one(
+            {self.watermark_field: {"$exists": True}},
+            {self.watermark_field: 1, "_id": 0},
+            sort=[(self.watermark_field, -1)],
+        )
+        if latest is not None:
+            return count, latest[self.watermark_field]
+        if count > self.hash_max_docs:
+            return None
+        from bson.json_util import dumps
+
+        digest = hashlib.sha256()
+        for document in db[collection].find({}).sort("_id", 1):
+            digest.update(dumps(document).encode())
+        return count, digest.hexdigest()
+
+    def poll(self) -> None:
+        with self._lock:
+            tracked = list(self._tracked)
+        for collection in tracked:
+            watermark = self.watermark(collection)
+            with self._lock:
+                if watermark is None:
+                    self._uncacheable.add(collection)
+                else:
+                    self._uncacheable.discard(collection)
+            # A collection seen for the first time is bumped too: entries cached before
+            # its first watermark may already be stale. So is one whose changes can't be seen.
+            if watermark is None or self._watermarks.get(collection, object()) != watermark:
+                self._watermarks[collection] = watermark
+                self.bump(collection)
+
+    def start(self) -> None:
+        """Starts the background watcher once per process."""
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="query-cache-invalidation", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        try:
+            with self.get_db().watch(max_await_time_ms=1000) as stream:
+                self.mode = "change_stream"
+                # Anything cached before the stream opened may have missed a change.
+                self.bump()
+                while not self._stop.is_set():
+                    change = stream.try_next()
+                    if change is None:
+                        continue
+                    collection = change.get("ns", {}).get("coll")
+                    if collection is None or change["operationType"] == "rename":
+                        self.bump()
+                    else:
+                        self.bump(collection)
+                    if change["operationType"] == "invalidate":
+                        break
+        except Exception:
+            # No replica set, no permission or a lost stream: changes may have been missed.
+            if self.mode == "change_stream":
+                self.bump()
+        self.mode = "poll"
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception:
+                continue
+
+
+class QueryResultCache:
+    """LRU/TTL cache of serialized query results, bounded by entry count and bytes.
+
+    Entries are keyed by `canonical_query` and remember the version of every
+    collection the plan reads; a lookup after any of them changed is a miss.
+    """
+
+    def __init__(self, versions: CollectionVersions, maxsize: int = 1024, ttl: float | None = 300, max_bytes: int = 32_000_000):
+        self.versions = versions
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def stamp(self, plan: QueryPlan) -> tuple:
+        """Versions of the collections `plan` reads; take it before running the query."""
+        return tuple((name, self.versions.version(name)) for name in plan_collections(plan))
+
+    def _pop(self, key: str) -> None:
+        _, _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def get(self, plan: QueryPlan) -> str | None:
+        key = canonical_query(plan)
+        stamp = self.stamp(plan)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, entry_stamp, expires, _ = entry
+                if entry_stamp == stamp and (expires is None or expires >= time.monotonic()):
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._pop(key)
+            self.misses += 1
+            return None
+
+    def set(self, plan: QueryPlan, value: str, stamp: tuple) -> None:
+        size = len(value)
+        if size > self.max_bytes or self.maxsize <= 0 or not self.versions.cacheable(name for name, _ in stamp):
+            return
+        key = canonical_query(plan)
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        self.versions.start()
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (value, stamp, expires, size)
+            self._bytes += size
+            while len(self._data) > self.maxsize or self._bytes > self.max_bytes:
+                self._pop(next(iter(self._data)))
+
+    def invalidate(self, collection: str | None = None) -> None:
+        """Drops cached results for one collection, or all of them."""
+        self.versions.bump(collection)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._data),
+            "bytes": self._bytes,
+            "invalidation": self.versions.mode,
+        }
+
+
+def build_query_cache(get_db) -> QueryResultCache:
+    """Returns a query result cache for the database `get_db()` returns, configured by the environment.
+
+    QUERY_CACHE_MAXSIZE (0 disables it), QUERY_CACHE_TTL and QUERY_CACHE_MAX_BYTES
+    bound it; QUERY_CACHE_WATERMARK_FIELD, QUERY_CACHE_POLL_INTERVAL and
+    QUERY_CACHE_HASH_MAX_DOCS configure the polling fallback.
+    """
+    versions = CollectionVersions(
+        get_db,
+        watermark_field=os.environ.get("QUERY_CACHE_WATERMARK_FIELD", "lastEdited"),
+        poll_interval=float(os.environ.get("QUERY_CACHE_POLL_INTERVAL", 5)),
+        hash_max_docs=int(os.environ.get("QUERY_CACHE_HASH_MAX_DOCS", 10_000)),
+    )
+    return QueryResultCache(
+        versions,
+        maxsize=int(os.environ.get("QUERY_CACHE_MAXSIZE", 1024)),
+        ttl=float(os.environ.get("QUERY_CACHE_TTL", 300)) or None,
+        max_bytes=int(os.environ.get("QUERY_CACHE_MAX_BYTES", 32_000_000)),
+    )
+
+
+@lru_cache(maxsize=1)
+def get_query_cache() -> QueryResultCache:
+    """Returns the query result cache for the default database."""
+    from my_agent.utils.mongo import get_database
+
+    return build_query_cache(get_database)
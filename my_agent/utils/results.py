@@ -0,0 +1,179 @@
+import inspect
+import json
+import os
+
+from my_agent.utils.tokens import count_tokens
+
+MAX_DOCS = int(os.environ.get("RESULT_MAX_DOCS", 50))
+MAX_BYTES = int(os.environ.get("RESULT_MAX_BYTES", 64_000))
+MAX_TOKENS = int(os.environ.get("RESULT_MAX_TOKENS", 8_000))
+BATCH_SIZE = int(os.environ.get("RESULT_BATCH_SIZE", 100))
+# How many documents are read between two progress reports.
+PROGRESS_EVERY = int(os.environ.get("RESULT_PROGRESS_EVERY", 10))
+
+
+def dumps(value) -> str:
+    # bson ships with pymongo; it is imported by the first query rather than at startup
+    from bson.json_util import dumps as bson_dumps
+
+    return bson_dumps(value)
+
+
+def _is_scalar(results) -> bool:
+    return results is None or isinstance(results, (dict, str, bytes, int, float, bool))
+
+
+def _warned(warning: str | None) -> str:
+    return f', "warning": {json.dumps(warning)}' if warning else ""
+
+
+def _truncated(document: dict, max_bytes: int, max_tokens: int) -> str:
+    """Dumps the fields of a document that fit the budgets, in order, and lists the others under "_truncated"."""
+    # Room for the names of the fields left out, or their count when the names alone are too long
+    names = json.dumps(list(document))
+    list_names = len(names) <= max_bytes // 4
+    reserved = len(names) + 20 if list_names else 40
+    reserved_tokens = count_tokens(names) + 8 if list_names else 12
+    fields, dropped, size, tokens = [], [], 2 + reserved, reserved_tokens
+    for name, value in document.items():
+        encoded = dumps({name: value})[1:-1]
+        field_tokens = count_tokens(encoded)
+        if size + len(encoded) > max_bytes or tokens + field_tokens > max_tokens:
+            dropped.append(name)
+            continue
+        fields.append(encoded)
+        size += len(encoded) + 2
+        tokens += field_tokens
+    if dropped:
+        fields.append(f'"_truncated": {json.dumps(dropped) if list_names else len(dropped)}')
+    return "{" + ", ".join(fields) + "}"
+
+
+def _fits(encoded: str, max_bytes: int, max_tokens: int) -> bool:
+    return len(encoded) <= max_bytes and count_tokens(encoded) <= max_tokens
+
+
+def _dump_scalar(results, warning: str | None, max_bytes: int, max_tokens: int) -> str:
+    encoded = dumps(results)
+    if isinstance(results, dict) and not _fits(encoded, max_bytes, max_tokens):
+        encoded = _truncated(results, max_bytes, max_tokens)
+    if not warning:
+        return encoded
+    return f'{{"result": {encoded}{_warned(warning)}}}'
+
+
+class _BoundedPayload:
+    """Accumulates serialized documents until a budget would be exceeded."""
+
+    def __init__(self, max_docs: int, max_bytes: int, max_tokens: int):
+        self.max_docs = max_docs
+        self.max_bytes = max_bytes
+        self.max_tokens = max_tokens
+        self.documents = []
+        self.size = 0
+        self.tokens = 0
+        self.more_available = False
+
+    def add(self, document) -> bool:
+        """Adds a document, returning False once the payload is full.
+
+        A first document larger than the budgets on its own is added with the fields that fit.
+        """
+        encoded = dumps(document)
+        document_tokens = count_tokens(encoded)
+        if not self.documents and isinstance(document, dict) and (len(encoded) > self.max_bytes or document_tokens > self.max_tokens):
+            encoded = _truncated(document, self.max_bytes, self.max_tokens)
+            document_tokens = count_tokens(encoded)
+        if (
+            len(self.documents) >= self.max_docs
+            or self.size + len(encoded) > self.max_bytes
+            or self.tokens + document_tokens > self.max_tokens
+        ):
+            self.more_available = True
+            return False
+        self.documents.append(encoded)
+        self.size += len(encoded) + 1
+        self.tokens += document_tokens
+        return True
+
+    def render(self, total, warning: str | None = None) -> str:
+        return (
+            f'{{"results": [{",".join(self.documents)}], "returned": {len(self.documents)}, '
+            f'"total": {json.dumps(total)}, "more_available": {json.dumps(self.more_available)}{_warned(warning)}}}'
+        )
+
+
+def serialize_results(results, max_docs: int = MAX_DOCS, max_bytes: int = MAX_BYTES, max_tokens: int = MAX_TOKENS, count=None, progress=None, warning=None) -> str:
+    """Serializes query results to JSON without materializing more than the budgets allow.
+
+    Scalars and single documents are dumped as is, keeping only the fields that fit
+    the byte and token budgets of a larger document. Cursors and lists are read one
+    batch at a time until the document, byte or token budget is reached, and are
+    returned as `{"results": [...], "returned": n, "total": n, "more_available": bool}`.
+    A warning is added as a "warning" key, scalars then being given as "result".
+
+    Args:
+        results: cursor, list, document or scalar returned by the query
+        max_docs: maximum number of documents to return
+        max_bytes: maximum size of the serialized documents
+        max_tokens: maximum number of tokens in the serialized documents
+        count: optional callable returning the total number of matching documents,
+            called only when the results are truncated
+        progress: optional callable receiving the serialized documents read so far
+            and whether reading is done, called every PROGRESS_EVERY documents and
+            once at the end
+        warning: optional note for the model, e.g. that the query was limited
+    """
+    if _is_scalar(results):
+        return _dump_scalar(results, warning, max_bytes, max_tokens)
+
+    if hasattr(results, "batch_size"):
+        results.batch_size(min(BATCH_SIZE, max_docs + 1))
+
+    payload = _BoundedPayload(max_docs, max_bytes, max_tokens)
+    try:
+        for document in results:
+            if not payload.add(document):
+                break
+            if progress is not None and len(payload.documents) % PROGRESS_EVERY == 0:
+                progress(payload.documents, False)
+    finally:
+        # Release the server-side cursor instead of waiting for it to time out.
+        if hasattr(results, "close"):
+            results.close()
+
+    if progress is not None:
+        progress(payload.documents, True)
+    total = len(payload.documents)
+    if payload.more_available:
+        total = count() if count is not None else None
+    return payload.render(total, warning)
+
+
+async def aserialize_results(results, max_docs: int = MAX_DOCS, max_bytes: int = MAX_BYTES, max_tokens: int = MAX_TOKENS, count=None, progress=None, warning=None) -> str:
+    """Async version of serialize_results for async cursors; `count` and `progress` are coroutine functions."""
+    if _is_scalar(results) or not hasattr(results, "__aiter__"):
+        return serialize_results(results, max_docs, max_bytes, max_tokens, warning=warning)
+
+    if hasattr(results, "batch_size"):
+        results.batch_size(min(BATCH_SIZE, max_docs + 1))
+
+    payload = _BoundedPayload(max_docs, max_bytes, max_tokens)
+    try:
+        async for document in results:
+            if not payload.add(document):
+                break
+            if progress is not None and len(payload.documents) % PROGRESS_EVERY == 0:
+                await progress(payload.documents, False)
+    finally:
+        if hasattr(results, "close"):
+            closed = results.close()
+            if inspect.isawaitable(closed):
+                await closed
+
+    if progress is not None:
+        await progress(payload.documents, True)
+    total = len(payload.documents)
+    if payload.more_available:
+        total = await count() if count is not None else None
+    return payload.render(total, warning)
@@ -0,0 +1,359 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import NamedTuple
+
+from my_agent.utils.mongo import get_database
+from my_agent.utils.router import tokenize
+
+DEFAULT_ROLLUPS_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "rollups.json")
+# Rollups older than this are refreshed before they answer a question.
+REFRESH_INTERVAL = float(os.environ.get("ROLLUP_REFRESH_INTERVAL", 60))
+# Words in a group-by field name that say nothing about what is grouped.
+GENERIC_TOKENS = frozenset({"name", "display", "id"})
+AGGREGATE_CUES = re.compile(r"\b(per|each|every|by|how many|number of|count|total|breakdown|most|fewest|least)\b")
+FETCH_BATCH = 500
+
+
+class Rollup(NamedTuple):
+    name: str
+    collection: str
+    group_by: str
+    sum: tuple[str, ...] = ()
+    description: str = ""
+
+
+def _values(document, path: str) -> list:
+    """Resolves a dotted path like Mongo does, flattening arrays along the way.
+
+    A missing field resolves to [None]; an empty array to no values at all.
+    """
+    values = [document]
+    for part in path.split("."):
+        resolved = []
+        for value in values:
+            value = value.get(part) if isinstance(value, dict) else None
+            if isinstance(value, list):
+                resolved.extend(value)
+            else:
+                resolved.append(value)
+        values = resolved
+    return values
+
+
+def _group_key(value) -> str:
+    if isinstance(value, dict):
+        value = value.get("name", value.get("id", value))
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+def contribution(rollup: Rollup, document) -> list[tuple[str, str, str, float]]:
+    """Returns the (rollup, group, metric, value) rows one document adds to a rollup."""
+    rows = []
+    sums = {
+        field: sum(v for v in _values(document, field) if isinstance(v, (int, float)) and not isinstance(v, bool))
+        for field in rollup.sum
+    }
+    # Documents in an array-valued group count once per distinct element and not at all
+    # when it is empty, like $unwind + $group.
+    for group in {_group_key(value) for value in _values(document, rollup.group_by)}:
+        rows.append((rollup.name, group, "count", 1))
+        rows.extend((rollup.name, group, f"{field}_sum", value) for field, value in sums.items())
+    return rows
+
+
+class RollupStore:
+    """Precomputed per-group counts and sums, kept in SQLite and refreshed incrementally.
+
+    Every document's contribution to the rollups of its collection is stored by _id.
+    A refresh then only needs the changed documents: those whose `watermark_field`
+    reached the last refresh's (edits within the same second included), plus inserts
+    and deletes found by comparing _ids when the document count changed. Collections
+    without the watermark field in their schema are rebuilt in full: once stale, they
+    are rebuilt in a background thread while queries keep reading the last build.
+    """
+
+    def __init__(self, rollups: list[Rollup], get_db, path: str = ":memory:", watermarked=(), watermark_field: str = "lastEdited", refresh_interval: float = REFRESH_INTERVAL):
+        self.rollups = {rollup.name: rollup for rollup in rollups}
+        self.get_db = get_db
+        self.watermarked = set(watermarked)
+        self.watermark_field = watermark_field
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self._rebuilding = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS rollup_values (
+                rollup TEXT, grp TEXT, metric TEXT, value REAL, PRIMARY KEY (rollup, grp, metric)
+            );
+            CREATE TABLE IF NOT EXISTS rollup_contributions (
+                collection TEXT, doc_id TEXT, rows TEXT, PRIMARY KEY (collection, doc_id)
+            );
+            CREATE TABLE IF NOT EXISTS rollup_state (
+                collection TEXT PRIMARY KEY, watermark TEXT, documents INTEGER, refreshed_at REAL
+            );
+            """
+        )
+
+    @classmethod
+    def from_file(cls, filename: str, registry, get_db, **kwargs) -> "RollupStore":
+        """Loads rollup definitions from JSON and checks their fields against the schema registry."""
+        with open(filename) as f:
+            definitions = json.load(f)
+        rollups = []
+        for definition in definitions:
+            rollup = Rollup(
+                definition["name"], definition["collection"], definition["group_by"],
+                tuple(definition.get("sum", ())), definition.get("description", ""),
+            )
+            for field in (rollup.group_by, *rollup.sum):
+                if registry.field(rollup.collection, field) is None:
+                    raise ValueError(f"Rollup '{rollup.name}': field '{field}' is not in the {rollup.collection} schema")
+            rollups.append(rollup)
+        watermark_field = kwargs.get("watermark_field", "lastEdited")
+        watermarked = {r.collection for r in rollups if registry.field(r.collection, watermark_field) is not None}
+        return cls(rollups, get_db, watermarked=watermarked, **kwargs)
+
+    @property
+    def collections(self) -> list[str]:
+        return sorted({rollup.collection for rollup in self.rollups.values()})
+
+    def describe(self) -> str:
+        return "\n".join(f"- {rollup.name}: {rollup.description}" for rollup in self.rollups.values())
+
+    def match(self, question: str) -> Rollup | None:
+        """Returns the rollup that answers an aggregate question about one collection per group, if any."""
+        if not AGGREGATE_CUES.search(question.lower()):
+            return None
+        tokens = set(tokenize(question))
+        for rollup in self.rollups.values():
+            subject = set(tokenize(rollup.collection))
+            group = set(tokenize(rollup.group_by)) - GENERIC_TOKENS
+            if subject <= tokens and group and group <= tokens:
+                return rollup
+        return None
+
+    # Refreshing
+
+    def _projection(self, collection: str) -> dict:
+        fields = {self.watermark_field} if collection in self.watermarked else set()
+        for rollup in self.rollups.values():
+            if rollup.collection == collection:
+                fields |= {rollup.group_by.split(".")[0], *(f.split(".")[0] for f in rollup.sum)}
+        return {field: 1 for field in fields}
+
+    def _rows(self, collection: str, document) -> list:
+        return [row for r in self.rollups.values() if r.collection == collection for row in contribution(r, document)]
+
+    def _apply(self, collection: str, changes: dict, full: bool = False) -> None:
+        """Replaces the contributions of changed documents ({doc_id: rows, or None when deleted})."""
+        deltas = defaultdict(float)
+        if not full:
+            ids = list(changes)
+            for start in range(0, len(ids), FETCH_BATCH):
+                chunk = ids[start:start + FETCH_BATCH]
+                placeholders = ",".join("?" * len(chunk))
+                for (rows,) in self._conn.execute(
+                    f"SELECT rows FROM rollup_contributions WHERE collection = ? AND doc_id IN ({placeholders})",
+                    (collection, *chunk),
+                ):
+                    for rollup, group, metric, value in json.loads(rows):
+                        deltas[(rollup, group, metric)] -= value
+        for rows in changes.values():
+            for rollup, group, metric, value in rows or ():
+                deltas[(rollup, group, metric)] += value
+
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.executemany(
+                "INSERT INTO rollup_values VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (rollup, grp, metric) DO UPDATE SET value = value + excluded.value",
+                [(*key, value) for key, value in deltas.items()],
+            )
+            self._conn.execute(
+                "DELETE FROM rollup_values WHERE (rollup, grp) IN "
+                "(SELECT rollup, grp FROM rollup_values WHERE metric = 'count' AND value <= 0)"
+            )
+            self._conn.executemany(
+                "DELETE FROM rollup_contributions WHERE collection = ? AND doc_id = ?",
+                [(collection, doc_id) for doc_id, rows in changes.items() if rows is None],
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO rollup_contributions VALUES (?, ?, ?)",
+                [(collection, doc_id, json.dumps(rows)) for doc_id, rows in changes.items() if rows is not None],
+            )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def _save_state(self, collection: str, watermark, documents: int) -> None:
+        from bson import json_util
+
+        self._conn.execute(
+            "INSERT OR REPLACE INTO rollup_state VALUES (?, ?, ?, ?)",
+            (collection, json_util.dumps(watermark), documents, time.time()),
+        )
+
+    def _max_watermark(self, documents, current=None):
+        values = [d.get(self.watermark_field) for d in documents if d.get(self.watermark_field) is not None]
+        return max([current, *values], key=lambda v: (v is not None, v)) if values else current
+
+    def _rebuild(self, collection: str) -> int:
+        # Documents are read without the lock; the rollups are swapped in while holding it
+        changes, watermark = {}, None
+        documents = self.get_db()[collection].find({}, self._projection(collection)).batch_size(FETCH_BATCH)
+        for document in documents:
+            changes[str(document["_id"])] = self._rows(collection, document)
+            watermark = self._max_watermark([document], watermark)
+        names = [r.name for r in self.rollups.values() if r.collection == collection]
+        with self._lock:
+            self._conn.execute(f"DELETE FROM rollup_values WHERE rollup IN ({','.join('?' * len(names))})", names)
+            self._conn.execute("DELETE FROM rollup_contributions WHERE collection = ?", (collection,))
+            self._apply(collection, changes, full=True)
+            self._save_state(collection, watermark, len(changes))
+        return len(changes)
+
+    def _update(self, collection: str, watermark) -> int:
+        db = self.get_db()
+        projection = self._projection(collection)
+        # $gte: documents edited in the same second as the last refresh may have come after it.
+        # Those seen then are fetched again and skipped unless their contribution changed.
+        changed = list(db[collection].find({self.watermark_field: {"$gte": watermark}}, projection)) if watermark is not None else []
+        changes = {str(d["_id"]): self._rows(collection, d) for d in changed}
+        stored_rows = self._stored_rows(collection, list(changes))
+        changes = {doc_id: rows for doc_id, rows in changes.items() if stored_rows.get(doc_id) != json.dumps(rows)}
+
+        (stored,) = self._conn.execute(
+            "SELECT COUNT(*) FROM rollup_contributions WHERE collection = ?", (collection,)
+        ).fetchone()
+        stored += sum(1 for doc_id in changes if not self._known(collection, doc_id))
+        if db[collection].estimated_document_count() != stored:
+            # Inserts without a watermark or deletes: compare _ids to find them.
+            ids = {str(d["_id"]): d["_id"] for d in db[collection].find({}, {"_id": 1})}
+            known = {doc_id for (doc_id,) in self._conn.execute(
+                "SELECT doc_id FROM rollup_contributions WHERE collection = ?", (collection,)
+            )} | set(changes)
+            changes.update({doc_id: None for doc_id in known - set(ids)})
+            new = [ids[doc_id] for doc_id in set(ids) - known]
+            for start in range(0, len(new), FETCH_BATCH):
+                for d in db[collection].find({"_id": {"$in": new[start:start + FETCH_BATCH]}}, projection):
+                    changed.append(d)
+                    changes[str(d["_id"])] = self._rows(collection, d)
+
+        if changes:
+            self._apply(collection, changes)
+        (documents,) = self._conn.execute(
+            "SELECT COUNT(*) FROM rollup_contributions WHERE collection = ?", (collection,)
+        ).fetchone()
+        self._save_state(collection, self._max_watermark(changed, watermark), documents)
+        return len(changes)
+
+    def _stored_rows(self, collection: str, ids: list[str]) -> dict[str, str]:
+        stored = {}
+        for start in range(0, len(ids), FETCH_BATCH):
+            chunk = ids[start:start + FETCH_BATCH]
+            stored.update(self._conn.execute(
+                f"SELECT doc_id, rows FROM rollup_contributions WHERE collection = ? AND doc_id IN ({','.join('?' * len(chunk))})",
+                (collection, *chunk),
+            ))
+        return stored
+
+    def _known(self, collection: str, doc_id: str) -> bool:
+        return self._conn.execute(
+            "SELECT 1 FROM rollup_contributions WHERE collection = ? AND doc_id = ?", (collection, doc_id)
+        ).fetchone() is not None
+
+    def refresh(self, collection: str | None = None, full: bool = False) -> dict:
+        """Brings rollups up to date and returns, per collection, how and how many documents were processed."""
+        from bson import json_util
+
+        report = {}
+        for name in [collection] if collection else self.collections:
+            start = time.perf_counter()
+            with self._lock:
+                state = self._conn.execute(
+                    "SELECT watermark FROM rollup_state WHERE collection = ?", (name,)
+                ).fetchone()
+                incremental = not full and state is not None and name in self.watermarked
+                if incremental:
+                    documents = self._update(name, json_util.loads(state[0]))
+            if not incremental:
+                documents = self._rebuild(name)
+            mode = "incremental" if incremental else "full"
+            report[name] = {"mode": mode, "documents": documents, "seconds": time.perf_counter() - start}
+        return report
+
+    def refreshed_at(self, collection: str) -> float | None:
+        with self._lock:
+            row = self._conn.execute("SELECT refreshed_at FROM rollup_state WHERE collection = ?", (collection,)).fetchone()
+        return row[0] if row else None
+
+    def ensure_fresh(self, collection: str) -> None:
+        """Refreshes a stale collection; full rebuilds of collections built before run in the background."""
+        refreshed_at = self.refreshed_at(collection)
+        if refreshed_at is None:
+            self.refresh(collection)
+        elif time.time() - refreshed_at > self.refresh_interval:
+            if collection in self.watermarked:
+                self.refresh(collection)
+            else:
+                self._rebuild_in_background(collection)
+
+    def _rebuild_in_background(self, collection: str) -> None:
+        with self._lock:
+            thread = self._rebuilding.get(collection)
+            if thread is not None and thread.is_alive():
+                return
+            thread = self._rebuilding[collection] = threading.Thread(
+                target=self.refresh, args=(collection,), name=f"rollup-rebuild-{collection}", daemon=True
+            )
+            thread.start()
+
+    # Reading
+
+    def query(self, name: str, group: str | None = None, top: int | None = None) -> list[dict]:
+        """Returns the groups of a rollup, largest count first, each with its count and sums."""
+        rollup = self.rollups[name]
+        self.ensure_fresh(rollup.collection)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT grp, metric, value FROM rollup_values WHERE rollup = ?", (name,)
+            ).fetchall()
+        groups = defaultdict(dict)
+        for grp, metric, value in rows:
+            groups[grp][metric] = int(value) if float(value).is_integer() else value
+        results = [{"group": json.loads(grp), **metrics} for grp, metrics in groups.items()]
+        if group is not None:
+            results = [r for r in results if str(r["group"]).lower() == group.lower()]
+        results.sort(key=lambda r: r.get("count", 0), reverse=True)
+        return results[:top] if top else results
+
+    def close(self) -> None:
+        with self._lock:
+            threads = list(self._rebuilding.values())
+        for thread in threads:
+            thread.join()
+        with self._lock:
+            self._conn.close()
+
+
+def load_rollup_store(registry, get_db=get_database, path: str | None = None) -> RollupStore:
+    """Loads the rollups in AGENT_ROLLUPS_PATH (or `my_agent/rollups.json`) for the database `get_db()` returns.
+
+    Args:
+        registry: schema registry the rollup fields are checked against
+        get_db: returns the database to roll up, the default database if omitted
+        path: SQLite file to keep them in, ROLLUP_STORE_PATH (or memory) if omitted
+    """
+    return RollupStore.from_file(
+        os.environ.get("AGENT_ROLLUPS_PATH", DEFAULT_ROLLUPS_PATH),
+        registry,
+        get_db,
+        path=path or os.environ.get("ROLLUP_STORE_PATH", ":memory:"),
+    )
@@ -0,0 +1,110 @@
+import math
+import re
+from collections import defaultdict
+from typing import NamedTuple
+
+# The synonym table from the agent's schema rules, keyed by stemmed token.
+SYNONYMS = {
+    "classroom": "room",
+    "faculty": "professor",
+    "class": "course",
+    "dept": "department",
+}
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from give has have how i in is it list me "
+    "many much of on or per show tell that the their there these this to what when where "
+    "which who whose with all any each every number count".split()
+)
+
+FIELD_WEIGHT = 1.5
+DESCRIPTION_WEIGHT = 0.5
+
+
+class Route(NamedTuple):
+    collections: list[str]
+    scores: dict[str, float]
+    confidence: float
+
+
+def _stem(token: str) -> str:
+    if len(token) <= 3:
+        return token
+    if token.endswith("ies"):
+        return token[:-3] + "y"
+    if token.endswith(("ches", "shes", "xes", "sses")):
+        return token[:-2]
+    if token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> list[str]:
+    """Splits camelCase and punctuation, lowercases, stems and maps synonyms."""
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", text)
+    text = re.sub(r"'s\b", "", text)
+    tokens = []
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if word in STOPWORDS:
+            continue
+        stem = _stem(word)
+        tokens.append(SYNONYMS.get(stem, stem))
+    return tokens
+
+
+class CollectionRouter:
+    """Picks the collections relevant to a question from an inverted index of the schemas.
+
+    A question that names collections (directly or through a synonym) routes to those
+    collections with full confidence. Otherwise field names and field descriptions are
+    scored with decreasing weights, scaled by how few collections share the token, and
+    the confidence drops when the best candidates score close to each other.
+    """
+
+    def __init__(self, schemas: list[dict], min_ratio: float = 0.5):
+        self.min_ratio = min_ratio
+        self.collections = [schema["collection"] for schema in schemas]
+        self.names = {}
+        postings = defaultdict(lambda: defaultdict(float))
+        for schema in schemas:
+            collection = schema["collection"]
+            for token in tokenize(collection):
+                self.names[token] = collection
+            for field, spec in schema["fields"].items():
+                for token in tokenize(field):
+                    postings[token][collection] = max(postings[token][collection], FIELD_WEIGHT)
+                for token in tokenize(spec.get("description", "")):
+                    postings[token][collection] = max(postings[token][collection], DESCRIPTION_WEIGHT)
+
+        total = len(schemas)
+        self.index = {}
+        for token, weights in postings.items():
+            idf = math.log(1 + total / len(weights))
+            self.index[token] = {collection: weight * idf for collection, weight in weights.items()}
+        self._max_score = FIELD_WEIGHT * math.log(1 + total) if total else 1.0
+
+    def route(self, user_query: str) -> Route:
+        """Returns the matching collections, best first, with a 0-1 confidence.
+
+        Args:
+            user_query: user query
+        """
+        tokens = set(tokenize(user_query))
+        scores = defaultdict(float)
+        for token in tokens:
+            for collection, weight in self.index.get(token, {}).items():
+                scores[collection] += weight
+
+        named = {self.names[token] for token in tokens if token in self.names}
+        if named:
+            collections = sorted(named, key=lambda collection: scores[collection], reverse=True)
+            return Route(collections, dict(scores), 1.0)
+        if not scores:
+            return Route([], {}, 0.0)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        top = ranked[0][1]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+        collections = [collection for collection, score in ranked if score >= top * self.min_ratio]
+        confidence = min(1.0, top / self._max_score) * (1 - runner_up / top)
+        return Route(collections, dict(ranked), confidence)
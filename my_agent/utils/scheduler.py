@@ -0,0 +1,643 @@
+import asyncio
+import itertools
+import os
+import random
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, wait
+from functools import lru_cache
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+from pydantic import PrivateAttr
+
+from my_agent.utils.instrumentation import RingBuffer
+from my_agent.utils.prompts import for_model
+
+# Requests per second per model, 0 for no limit; bursts of up to LLM_RATE_BURST requests.
+RATE_LIMIT = float(os.environ.get("LLM_RATE_LIMIT", 0))
+RATE_BURST = float(os.environ.get("LLM_RATE_BURST", 0))
+# Concurrent requests per model: the limit halves on a 429 and grows back by one per limit's worth of successes.
+MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 32))
+MIN_CONCURRENCY = int(os.environ.get("LLM_MIN_CONCURRENCY", 1))
+MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 4))
+# Full-jitter exponential backoff: a random wait of up to BACKOFF_BASE * 2**n seconds, capped at BACKOFF_MAX.
+BACKOFF_BASE = float(os.environ.get("LLM_BACKOFF_BASE", 0.5))
+BACKOFF_MAX = float(os.environ.get("LLM_BACKOFF_MAX", 20))
+# No retry starts later than this many seconds after the first attempt.
+CALL_DEADLINE = float(os.environ.get("LLM_CALL_DEADLINE", 180))
+# Consecutive errors on one backend before the next one is tried; a 429 fails over at once.
+FAILOVER_AFTER = int(os.environ.get("LLM_FAILOVER_AFTER", 2))
+# Send a second, hedged request when the first one is slower than the model's p95 latency.
+HEDGE = os.environ.get("LLM_HEDGE", "0") != "0"
+HEDGE_QUANTILE = 0.95
+HEDGE_MIN_SAMPLES = int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", 20))
+LATENCY_WINDOW = 256
+
+
+def _status(error) -> int | None:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def retry_after(error) -> float | None:
+    """Seconds from the Retry-After header of a provider error, if it has one."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return max(0.0, float(headers.get("retry-after")))
+    except (TypeError, ValueError):
+        return None
+
+
+def classify(error: BaseException) -> str | None:
+    """'throttled' for rate limits, 'transient' for errors worth retrying, None for the others."""
+    status = _status(error)
+    if status == 429 or type(error).__name__ == "RateLimitError":
+        return "throttled"
+    if status is not None:
+        # 529 is Anthropic's "overloaded"
+        return "transient" if status >= 500 or status in (408, 409) else None
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return "transient"
+    # openai.APITimeoutError, anthropic.APIConnectionError, httpx.ConnectError, ...
+    name = type(error).__name__
+    return "transient" if "Timeout" in name or "Connection" in name else None
+
+
+class TokenBucket:
+    """Rate limiter: `rate` requests per second with bursts of up to `burst`.
+
+    reserve() takes a token, going into debt when the bucket is empty, and returns
+    how long the caller must wait before sending; callers are served in order.
+    pause() holds every request back, e.g. for a Retry-After.
+    """
+
+    def __init__(self, rate: float, burst: float = 0):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            delay = max(0.0, self.paused_until - now)
+            if self.rate <= 0:
+                return delay
+            self._refill(now)
+            self.tokens -= 1
+            return max(delay, -self.tokens / self.rate)
+
+    def try_take(self) -> bool:
+        """Takes a token only if one is available right away."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return False
+            if self.rate <= 0:
+                return True
+            self._refill(now)
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class AdaptiveLimiter:
+    """Concurrency limit that adapts to the provider (AIMD).
+
+    Each success raises the limit by 1/limit, so by about one per round of
+    requests, up to `maximum`; a throttled request halves it, down to `minimum`,
+    unless it was sent before the last decrease and so under the old limit.
+    Threads and event loops wait in one FIFO queue and a released slot is handed
+    to the next waiter.
+    """
+
+    def __init__(self, maximum: int, minimum: int = 1):
+        self.maximum = maximum
+        self.minimum = min(minimum, maximum)
+        self.limit = float(maximum)
+        self.in_flight = 0
+        self._decreased = 0.0
+        self._lock = threading.Lock()
+        self._waiters = deque()
+
+    def _take(self) -> bool:
+        if self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return True
+        return False
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            return not self._waiters and self._take()
+
+    def acquire(self) -> None:
+        with self._lock:
+            if not self._waiters and self._take():
+                return
+            event = threading.Event()
+            self._waiters.append(event)
+        event.wait()
+
+    async def aacquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if not self._waiters and self._take():
+                return
+            future = loop.create_future()
+            waiter = (loop, future)
+            self._waiters.append(waiter)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                try:
+                    self._waiters.remove(waiter)
+                    waiting = True
+                except ValueError:
+                    waiting = False
+            # The slot was already handed over: _handoff gives it back if the future
+            # was cancelled first, but not once it resolved it
+            if not waiting and future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def _handoff(self, future) -> None:
+        if future.cancelled():
+            self.release()
+        else:
+            future.set_result(None)
+
+    def _wake(self) -> None:
+        while self._waiters and self._take():
+            waiter = self._waiters.popleft()
+            if isinstance(waiter, threading.Event):
+                waiter.set()
+            else:
+                loop, future = waiter
+                loop.call_soon_threadsafe(self._handoff, future)
+
+    def release(self, throttled: bool = False, succeeded: bool = False, started: float | None = None) -> None:
+        """Frees a slot; `started` is the time.monotonic() the request was sent."""
+        with self._lock:
+            self.in_flight -= 1
+            if throttled and (started is None or started >= self._decreased):
+                self.limit = max(float(self.minimum), self.limit / 2)
+                self._decreased = time.monotonic()
+            elif succeeded:
+                self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+            self._wake()
+
+
+class _Lane:
+    """Rate limiter, concurrency limit, latencies and counters of one model."""
+
+    def __init__(self, rate: float, burst: float, maximum: int, minimum: int):
+        self.bucket = TokenBucket(rate, burst)
+        self.limiter = AdaptiveLimiter(maximum, minimum)
+        self.latencies = RingBuffer(LATENCY_WINDOW)
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def count(self, key: str) -> None:
+        with self._lock:
+            self.counts[key] += 1
+
+    def hedge_delay(self, min_samples: int) -> float | None:
+        with self._lock:
+            if self.latencies.count < min_samples:
+                return None
+            return self.latencies.quantiles((HEDGE_QUANTILE,))[0]
+
+    def try_hedge(self) -> bool:
+        # A hedge is only worth sending if it needn't queue
+        if not self.limiter.try_acquire():
+            return False
+        if not self.bucket.try_take():
+            self.limiter.release()
+            return False
+        return True
+
+    def finished(self, error: BaseException | None, started: float, backoff: float = 0.0, stream: bool = False) -> None:
+        """Releases the request sent at `started`, recording its latency unless it failed or streamed."""
+        throttled = error is not None and classify(error) == "throttled"
+        if throttled:
+            self.count("throttled")
+            self.bucket.pause(retry_after(error) or backoff)
+        self.limiter.release(throttled=throttled, succeeded=error is None, started=started)
+        if error is None and not stream:
+            with self._lock:
+                self.latencies.add(time.monotonic() - started)
+
+
+class CallScheduler:
+    """Sends model requests under a per-model rate limit and adaptive concurrency limit.
+
+    A request is given as (model name, request function) pairs, the first one
+    primary and the others to fail over to. Errors worth retrying are retried
+    with full-jitter exponential backoff (or the provider's Retry-After); a 429,
+    or FAILOVER_AFTER errors in a row, moves on to the next model. With `hedge`,
+    a request still running after the model's p95 latency gets a duplicate and
+    the first answer wins. Streams are retried and fail over only until their
+    first chunk.
+    """
+
+    def __init__(
+        self,
+        rate: float = RATE_LIMIT,
+        burst: float = RATE_BURST,
+        max_concurrency: int = MAX_CONCURRENCY,
+        min_concurrency: int = MIN_CONCURRENCY,
+        max_retries: int = MAX_RETRIES,
+        backoff_base: float = BACKOFF_BASE,
+        backoff_max: float = BACKOFF_MAX,
+        deadline: float = CALL_DEADLINE,
+        failover_after: int = FAILOVER_AFTER,
+        hedge: bool = HEDGE,
+        hedge_min_samples: int = HEDGE_MIN_SAMPLES,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.deadline = deadline
+        self.failover_after = failover_after
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self._lanes = {}
+        self._lock = threading.Lock()
+
+    def lane(self, model: str) -> _Lane:
+        with self._lock:
+            lane = self._lanes.get(model)
+            if lane is None:
+                lane = self._lanes[model] = _Lane(self.rate, self.burst, self.max_concurrency, self.min_concurrency)
+            return lane
+
+    def backoff(self, attempt: int, error: BaseException | None = None) -> float:
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+        after = retry_after(error) if error is not None else None
+        return max(delay, after) if after is not None else delay
+
+    def _next(self, requests: list, index: int, streak: int, attempt: int, error: Exception, started: float):
+        """The (index, streak, delay) of the retry after `error`, or None to give up."""
+        kind = classify(error)
+        if kind is None or attempt >= self.max_retries:
+            return None
+        streak += 1
+        delay = self.backoff(streak, error)
+        if len(requests) > 1 and (kind == "throttled" or streak >= self.failover_after):
+            # The next model has its own limits; a paused one makes the attempt wait
+            self.lane(requests[index][0]).count("failovers")
+            index, streak, delay = (index + 1) % len(requests), 0, 0.0
+        if time.monotonic() - started + delay > self.deadline:
+            return None
+        self.lane(requests[index][0]).count("retries")
+        return index, streak, delay
+
+    # Sync
+
+    def call(self, requests: list, on_retry=None):
+        """Returns the first successful result of the request functions, retrying and failing over.
+
+        Args:
+            requests: (model name, function sending one request) pairs, primary first
+            on_retry: called with the error, the attempt number and the delay before each retry
+        """
+        started = time.monotonic()
+        index = streak = 0
+        for attempt in itertools.count(1):
+            model, func = requests[index]
+            try:
+                return self._attempt(self.lane(model), func)
+            except Exception as e:
+                step = self._next(requests, index, streak, attempt, e, started)
+                if step is None:
+                    raise
+                index, streak, delay = step
+                if on_retry is not None:
+                    on_retry(e, attempt, delay)
+                time.sleep(delay)
+
+    def _attempt(self, lane: _Lane, func):
+        time.sleep(lane.bucket.reserve())
+        lane.limiter.acquire()
+        lane.count("requests")
+        start = time.monotonic()
+        try:
+            result = self._hedged(lane, func)
+        except BaseException as e:
+            lane.finished(e, start, backoff=self.backoff(1))
+            raise
+        lane.finished(None, start)
+        return result
+
+    def _hedged(self, lane: _Lane, func):
+        delay = lane.hedge_delay(self.hedge_min_samples) if self.hedge else None
+        if delay is None:
+            return func()
+        pool = ContextThreadPoolExecutor(max_workers=2)
+        try:
+            first = pool.submit(func)
+            done, _ = wait([first], timeout=delay)
+            if done or not lane.try_hedge():
+                return first.result()
+            lane.count("hedges")
+            second = pool.submit(func)
+            second.add_done_callback(lambda future: lane.limiter.release())
+            pending = {first, second}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        if future is second:
+                            lane.count("hedge_wins")
+                        return future.result()
+            return first.result()
+        finally:
+            # The losing request's thread finishes in the background
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def stream(self, requests: list, on_retry=None):
+        """Yields the chunks of the first request function whose iterator produces one, retrying until then."""
+        started = time.monotonic()
+        index = streak = 0
+        for attempt in itertools.count(1):
+            model, func = requests[index]
+            lane = self.lane(model)
+            time.sleep(lane.bucket.reserve())
+            lane.limiter.acquire()
+            lane.count("requests")
+            start = time.monotonic()
+            try:
+                chunks = iter(func())
+                first = next(chunks)
+            except StopIteration:
+                lane.finished(None, start, stream=True)
+                return
+            except Exception as e:
+                lane.finished(e, start, backoff=self.backoff(1))
+                step = self._next(requests, index, streak, attempt, e, started)
+                if step is None:
+                    raise
+                index, streak, delay = step
+                if on_retry is not None:
+                    on_retry(e, attempt, delay)
+                time.sleep(delay)
+                continue
+            try:
+                yield first
+                yield from chunks
+            except BaseException as e:
+                lane.finished(e, start, stream=True)
+                raise
+            lane.finished(None, start, stream=True)
+            return
+
+    # Async
+
+    async def acall(self, requests: list, on_retry=None):
+        """Async version of call; the request functions return awaitables and `on_retry` is a coroutine function."""
+        started = time.monotonic()
+        index = streak = 0
+        for attempt in itertools.count(1):
+            model, afunc = requests[index]
+            try:
+                return await self._aattempt(self.lane(model), afunc)
+            except Exception as e:
+                step = self._next(requests, index, streak, attempt, e, started)
+                if step is None:
+                    raise
+                index, streak, delay = step
+                if on_retry is not None:
+                    await on_retry(e, attempt, delay)
+                await asyncio.sleep(delay)
+
+    async def _aattempt(self, lane: _Lane, afunc):
+        await asyncio.sleep(lane.bucket.reserve())
+        await lane.limiter.aacquire()
+        lane.count("requests")
+        start = time.monotonic()
+        try:
+            result = await self._ahedged(lane, afunc)
+        except BaseException as e:
+            lane.finished(e, start, backoff=self.backoff(1))
+            raise
+        lane.finished(None, start)
+        return result
+
+    async def _ahedged(self, lane: _Lane, afunc):
+        delay = lane.hedge_delay(self.hedge_min_samples) if self.hedge else None
+        if delay is None:
+            return await afunc()
+        first = asyncio.ensure_future(afunc())
+        tasks = [first]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done or not lane.try_hedge():
+                return await first
+            lane.count("hedges")
+            second = asyncio.ensure_future(afunc())
+            second.add_done_callback(lambda task: lane.limiter.release())
+            tasks.append(second)
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if not task.cancelled() and task.exception() is None:
+                        if task is second:
+                            lane.count("hedge_wins")
+                        return task.result()
+            return first.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def astream(self, requests: list, on_retry=None):
+        """Async version of stream; the request functions return async iterators."""
+        started = time.monotonic()
+        index = streak = 0
+        for attempt in itertools.count(1):
+            model, func = requests[index]
+            lane = self.lane(model)
+            await asyncio.sleep(lane.bucket.reserve())
+            await lane.limiter.aacquire()
+            lane.count("requests")
+            start = time.monotonic()
+            try:
+                chunks = aiter(func())
+                first = await anext(chunks)
+            except StopAsyncIteration:
+                lane.finished(None, start, stream=True)
+                return
+            except Exception as e:
+                lane.finished(e, start, backoff=self.backoff(1))
+                step = self._next(requests, index, streak, attempt, e, started)
+                if step is None:
+                    raise
+                index, streak, delay = step
+                if on_retry is not None:
+                    await on_retry(e, attempt, delay)
+                await asyncio.sleep(delay)
+                continue
+            try:
+                yield first
+                async for chunk in chunks:
+                    yield chunk
+            except BaseException as e:
+                lane.finished(e, start, stream=True)
+                raise
+            lane.finished(None, start, stream=True)
+            return
+
+    def stats(self) -> dict:
+        """Per model: the current concurrency limit, requests in flight, p50/p95 latency and counters."""
+        with self._lock:
+            lanes = dict(self._lanes)
+        stats = {}
+        for model, lane in lanes.items():
+            with lane._lock:
+                p50, p95 = lane.latencies.quantiles((0.5, HEDGE_QUANTILE))
+                counts = dict(lane.counts)
+            stats[model] = {
+                "limit": round(lane.limiter.limit, 1),
+                "in_flight": lane.limiter.in_flight,
+                "p50": p50,
+                "p95": p95,
+                **counts,
+            }
+        return stats
+
+
+@lru_cache(maxsize=1)
+def get_scheduler() -> CallScheduler:
+    """The scheduler shared by every chat model of the process, configured by the environment."""
+    return CallScheduler()
+
+
+def _retry_state(error: BaseException, attempt: int, delay: float):
+    # Callback handlers (LangSmith, instrumentation) take tenacity's view of a retry
+    from tenacity import RetryCallState
+
+    state = RetryCallState(None, None, (), {})
+    state.attempt_number = attempt
+    state.idle_for = delay
+    state.set_exception((type(error), error, error.__traceback__))
+    return state
+
+
+# The scheduled model is the traced run; its backends' requests are not traced again
+_UNTRACED = {"callbacks": []}
+
+
+class ScheduledChatModel(BaseChatModel):
+    """Chat model sending its requests through a CallScheduler, failing over between backends.
+
+    `models` names the backends, primary first; `factory(name)` builds each one on
+    first use. Prompts keep their cache markers only for backends that take them.
+    """
+
+    model: str
+    models: list
+    factory: Any
+    scheduler: Any
+    tool_binding: Any = None
+
+    _backends: dict = PrivateAttr(default_factory=dict)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "scheduled"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"model": self.model, "models": self.models}
+
+    def _backend(self, index: int):
+        with self._lock:
+            backend = self._backends.get(index)
+            if backend is None:
+                backend = self.factory(self.models[index])
+                if self.tool_binding is not None:
+                    tools, kwargs = self.tool_binding
+                    backend = backend.bind_tools(tools, **kwargs)
+                self._backends[index] = backend
+            return backend
+
+    @property
+    def primary(self):
+        return self._backend(0)
+
+    def bind_tools(self, tools, **kwargs):
+        bound = self.model_copy(update={"tool_binding": (list(tools), kwargs)})
+        bound._backends, bound._lock = {}, threading.Lock()
+        return bound
+
+    def _requests(self, request) -> list:
+        return [(name, lambda index=index: request(self._backend(index))) for index, name in enumerate(self.models)]
+
+    @staticmethod
+    def _on_retry(run_manager):
+        if run_manager is None:
+            return None
+        return lambda error, attempt, delay: run_manager.on_retry(_retry_state(error, attempt, delay))
+
+    @staticmethod
+    def _aon_retry(run_manager):
+        if run_manager is None:
+            return None
+
+        async def on_retry(error, attempt, delay):
+            await run_manager.on_retry(_retry_state(error, attempt, delay))
+
+        return on_retry
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        message = self.scheduler.call(
+            self._requests(lambda backend: backend.invoke(for_model(messages, backend), _UNTRACED, stop=stop, **kwargs)),
+            on_retry=self._on_retry(run_manager),
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        message = await self.scheduler.acall(
+            self._requests(lambda backend: backend.ainvoke(for_model(messages, backend), _UNTRACED, stop=stop, **kwargs)),
+            on_retry=self._aon_retry(run_manager),
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        chunks = self.scheduler.stream(
+            self._requests(lambda backend: backend.stream(for_model(messages, backend), _UNTRACED, stop=stop, **kwargs)),
+            on_retry=self._on_retry(run_manager),
+        )
+        for chunk in chunks:
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        chunks = self.scheduler.astream(
+            self._requests(lambda backend: backend.astream(for_model(messages, backend), _UNTRACED, stop=stop, **kwargs)),
+            on_retry=self._aon_retry(run_manager),
+        )
+        async for chunk in chunks:
+            yield ChatGenerationChunk(message=chunk)
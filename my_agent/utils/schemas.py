@@ -0,0 +1,142 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from my_agent.utils.tokens import count_tokens
+
+DEFAULT_SCHEMAS_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "schemas.json")
+
+RENDER_FORMATS = ("repr", "json", "table")
+
+
+def _infer_type(value) -> str:
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, int):
+        return "integer"
+    if isinstance(value, float):
+        return "number"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, (list, tuple)):
+        return "array"
+    if isinstance(value, dict):
+        return "object"
+    if isinstance(value, datetime):
+        return "date"
+    if value is None:
+        return "null"
+    return type(value).__name__
+
+
+class SchemaRegistry:
+    """Indexes collection schemas for constant-time lookup and caches their prompt renderings.
+
+    Schemas use the `{"collection": ..., "fields": {name: {"type", "description"}}}`
+    layout of `my_agent/schemas.json`. The `cache_size` most recently used
+    renderings are kept.
+    """
+
+    def __init__(self, schemas: list[dict], cache_size: int = 256):
+        self.schemas = schemas
+        self.cache_size = cache_size
+        self._by_collection = {schema["collection"]: schema for schema in schemas}
+        self._renderings = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path: str) -> "SchemaRegistry":
+        """Loads schemas from a JSON file, or from YAML if the extension is .yaml/.yml."""
+        with open(path) as f:
+            if path.endswith((".yaml", ".yml")):
+                import yaml
+
+                return cls(yaml.safe_load(f))
+            return cls(json.load(f))
+
+    @classmethod
+    def from_collections(cls, db, collections: list[str], sample_size: int = 100) -> "SchemaRegistry":
+        """Infers schemas by sampling documents from live (or mongomock) collections.
+
+        Args:
+            db: database handle
+            collections: names of the collections to sample
+            sample_size: number of documents to sample per collection
+        """
+        schemas = []
+        for name in collections:
+            fields = {}
+            for document in db[name].find({}, limit=sample_size):
+                for field, value in document.items():
+                    if field != "_id" and field not in fields:
+                        fields[field] = {"type": _infer_type(value), "description": ""}
+            schemas.append({"collection": name, "fields": fields})
+        return cls(schemas)
+
+    @property
+    def collections(self) -> list[str]:
+        return list(self._by_collection)
+
+    def get(self, collection: str) -> dict | None:
+        return self._by_collection.get(collection)
+
+    def field(self, collection: str, path: str) -> dict | None:
+        """Returns the schema of a field, resolving dotted paths by their top-level field."""
+        schema = self._by_collection.get(collection)
+        if schema is None:
+            return None
+        return schema["fields"].get(path.split(".", 1)[0])
+
+    def projection(self, collection: str, fields: list[str] | None = None) -> dict:
+        """Builds a find() projection of schema fields, optionally restricted to `fields`."""
+        schema = self._by_collection.get(collection)
+        if schema is None:
+            return {}
+        names = schema["fields"] if fields is None else [f for f in fields if self.field(collection, f)]
+        return {"_id": 0, **{name: 1 for name in names}}
+
+    def render(self, collections: list[str] | None = None, fmt: str = "json") -> str:
+        """Renders the schemas of `collections` (all by default) for a prompt.
+
+        Args:
+            collections: collection names, in the order they should appear
+            fmt: 'json' for compact JSON, 'table' for a terse field table, or
+                'repr' for the Python repr of the schema dicts
+        """
+        # Collection lists come from the model: unknown and repeated names are dropped before caching
+        names = self.collections if collections is None else [name for name in dict.fromkeys(collections) if name in self._by_collection]
+        key = (tuple(names), fmt)
+        with self._lock:
+            rendered = self._renderings.get(key)
+            if rendered is not None:
+                self._renderings.move_to_end(key)
+        if rendered is None:
+            schemas = [self._by_collection[name] for name in names]
+            if fmt == "json":
+                rendered = json.dumps(schemas, separators=(",", ":"))
+            elif fmt == "table":
+                rendered = "\n".join(
+                    f"{schema['collection']}:\n"
+                    + "\n".join(f" {name}:{spec['type']}|{spec.get('description', '')}" for name, spec in schema["fields"].items())
+                    for schema in schemas
+                )
+            elif fmt == "repr":
+                rendered = str(schemas)
+            else:
+                raise ValueError(f"Unsupported schema format: {fmt}")
+            with self._lock:
+                self._renderings[key] = rendered
+                while len(self._renderings) > self.cache_size:
+                    self._renderings.popitem(last=False)
+        return rendered
+
+    def token_counts(self, collections: list[str] | None = None) -> dict[str, int]:
+        """Returns the token count of each rendering of `collections`."""
+        return {fmt: count_tokens(self.render(collections, fmt)) for fmt in RENDER_FORMATS}
+
+
+def load_schema_registry() -> SchemaRegistry:
+    """Loads the registry from AGENT_SCHEMAS_PATH, or the bundled `my_agent/schemas.json`."""
+    return SchemaRegistry.from_file(os.environ.get("AGENT_SCHEMAS_PATH", DEFAULT_SCHEMAS_PATH))
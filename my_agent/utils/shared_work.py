@@ -0,0 +1,118 @@
+import asyncio
+import threading
+from collections import Counter
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+
+class SharedWork:
+    """Runs identical calls once and hands every caller the same result.
+
+    Calls are identified by a kind ("route", "query", "execute", ...) and a key.
+    Outside a batch only calls in flight at the same time are merged; inside
+    `batch()` finished results are kept as well, so every question of the batch
+    reuses them until the outermost batch ends. Failures are never kept.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._results = {}
+        self._batches = 0
+        self.shared = Counter()
+        self.computed = Counter()
+
+    @contextmanager
+    def batch(self):
+        with self._lock:
+            self._batches += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batches -= 1
+                if not self._batches:
+                    self._results.clear()
+
+    def seed(self, kind: str, key, value) -> None:
+        """Stores a result computed ahead of time, e.g. by a batched LLM call; ignored outside a batch."""
+        with self._lock:
+            if self._batches:
+                self._results[(kind, key)] = value
+
+    def _claim(self, slot, make_future):
+        # Returns (result, None) for a kept result, (future, False) to wait on, (future, True) to compute
+        with self._lock:
+            if slot in self._results:
+                self.shared[slot[0]] += 1
+                return self._results[slot], None
+            future = self._inflight.get(slot)
+            if future is not None:
+                self.shared[slot[0]] += 1
+                return future, False
+            future = self._inflight[slot] = make_future()
+            self.computed[slot[0]] += 1
+            return future, True
+
+    def _release(self, slot, value=None, failed: bool = False, keep=None) -> None:
+        with self._lock:
+            self._inflight.pop(slot, None)
+            if self._batches and not failed:
+                self._results[keep or slot] = value
+
+    def do(self, kind: str, key, func):
+        """Returns `func()`, or the result of an identical call in flight or kept by the batch."""
+        slot = (kind, key)
+        future, owner = self._claim(slot, Future)
+        if owner is None:
+            return future
+        if not owner:
+            return future.result()
+        try:
+            value = func()
+        except BaseException as e:
+            self._release(slot, failed=True)
+            future.set_exception(e)
+            raise
+        self._release(slot, value)
+        future.set_result(value)
+        return value
+
+    async def ado(self, kind: str, key, afunc):
+        """Async version of do; `afunc` returns the awaitable to share."""
+        loop = asyncio.get_running_loop()
+        # In-flight futures belong to one event loop, kept results to all of them
+        with self._lock:
+            if (kind, key) in self._results:
+                self.shared[kind] += 1
+                return self._results[(kind, key)]
+        slot = (kind, key, id(loop))
+        future, owner = self._claim(slot, loop.create_future)
+        if owner is None:
+            return future
+        if not owner:
+            return await asyncio.shield(future)
+        try:
+            value = await afunc()
+        except asyncio.CancelledError:
+            self._release(slot, failed=True)
+            future.cancel()
+            raise
+        except BaseException as e:
+            self._release(slot, failed=True)
+            future.set_exception(e)
+            # Nobody may be waiting; don't log the exception as never retrieved
+            future.exception()
+            raise
+        self._release(slot, value, keep=(kind, key))
+        future.set_result(value)
+        return value
+
+    def stats(self) -> dict:
+        return {"computed": dict(self.computed), "shared": dict(self.shared)}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._results.clear()
+            self.shared.clear()
+            self.computed.clear()
@@ -1,6 +1,34 @@
 from langgraph.graph import add_messages
 from langchain_core.messages import BaseMessage
-from typing import TypedDict, Annotated, Sequence
+from typing import TypedDict, Annotated, Sequence, NotRequired
+
+
+class PlanStep(TypedDict):
+    id: int
+    description: str
+    # Tool expected to carry out the step, None for the final answer
+    tool: str | None
+    # "pending", "done", "failed" or "skipped"
+    status: str
+    result: NotRequired[str]
+
+
+def merge_plan(current: list[PlanStep] | None, update: dict | list[dict]) -> list[PlanStep]:
+    """Applies a plan diff to the current plan.
+
+    The diff is either `{"replace": [steps]}` for a new plan, or a list of step
+    patches (`{"id": ..., **fields}`) that update existing steps or append new ones.
+    """
+    if isinstance(update, dict):
+        return list(update["replace"])
+    steps = {step["id"]: step for step in current or []}
+    for patch in update:
+        steps[patch["id"]] = {**steps.get(patch["id"], {}), **patch}
+    return sorted(steps.values(), key=lambda step: step["id"])
+
 
 class AgentState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], add_messages]
+    plan: Annotated[list[PlanStep], merge_plan]
+    # Number of times the plan was rewritten by the LLM for the current question
+    replans: int
@@ -0,0 +1,265 @@
+import asyncio
+import os
+import re
+import threading
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from langchain_core.runnables.config import ensure_config
+
+from my_agent.utils import mongo
+from my_agent.utils.index_advisor import IndexAdvisor
+from my_agent.utils.query import QueryCompiler
+from my_agent.utils.query_cache import build_query_cache, get_query_cache
+from my_agent.utils.rollups import load_rollup_store
+from my_agent.utils.router import CollectionRouter
+from my_agent.utils.schemas import SchemaRegistry
+
+# A run picks its database with config["configurable"]["database"], like call_model's model_name.
+CONFIG_KEY = "database"
+# Tenants kept besides the default one; beyond this the least recently used is released.
+MAX_TENANTS = int(os.environ.get("TENANT_CACHE_SIZE", 16))
+# Comma-separated databases runs may select besides the default one; "*" allows any
+# valid name. When unset, runs can only use the default database.
+ALLOWED_TENANTS = frozenset(name.strip() for name in os.environ.get("MONGODB_TENANTS", "").split(",") if name.strip())
+ANY_TENANT = "*"
+# MongoDB's own databases are never selectable, even with "*".
+SYSTEM_DATABASES = frozenset({"admin", "local", "config"})
+# Connection string with a {database} placeholder for tenants on their own cluster or credentials;
+# when unset, every tenant's database is reached through the shared client.
+TENANT_URI = os.environ.get("MONGODB_TENANT_URI")
+# Directory of <database>.json (or .yaml) schema files for tenants whose collections differ.
+SCHEMAS_DIR = os.environ.get("TENANT_SCHEMAS_DIR")
+# No dots, slashes, spaces or other characters MongoDB rejects in database names.
+DATABASE_NAME = re.compile(r"^[A-Za-z0-9_-]{1,63}$")
+SCHEMA_EXTENSIONS = (".json", ".yaml", ".yml")
+
+
+class Tenant:
+    """One tenant database with its connections, schemas, query cache, query guard and rollups.
+
+    Tenants without schemas of their own share the default registry, compiler and
+    router (`schemas` names the tenant whose schemas they use). Rollups are loaded
+    on first use. close() releases everything once no query is `using()` the tenant.
+    """
+
+    def __init__(
+        self,
+        database: str,
+        registry: SchemaRegistry,
+        compiler: QueryCompiler,
+        router: CollectionRouter,
+        schemas: str | None = None,
+        connect=None,
+        aconnect=None,
+        query_cache=None,
+        rollup_store=None,
+    ):
+        self.database = database
+        self.schema_registry = registry
+        self.query_compiler = compiler
+        self.collection_router = router
+        self.schemas = schemas or database
+        self.query_cache = query_cache or build_query_cache(self.db)
+        self.index_advisor = IndexAdvisor()
+        self._connect = connect
+        self._aconnect = aconnect
+        self._client = None
+        # Async clients are bound to the event loop they were created on.
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._rollup_store = rollup_store
+        self._users = 0
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def db(self):
+        """Returns the tenant's database, on its own client or on the shared one."""
+        if self._connect is None:
+            return mongo.get_database(self.database)
+        with self._lock:
+            if self._client is None:
+                self._client = self._connect(self.database)
+            return self._client[self.database]
+
+    def adb(self):
+        """Returns the tenant's database on an async client of the running event loop."""
+        if self._aconnect is None:
+            return mongo.get_async_database(self.database)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = self._async_clients[loop] = self._aconnect(self.database)
+            return client[self.database]
+
+    @property
+    def rollup_store(self):
+        with self._lock:
+            if self._rollup_store is None:
+                # Only the default tenant's rollups are kept in ROLLUP_STORE_PATH
+                self._rollup_store = load_rollup_store(self.schema_registry, self.db, path=":memory:")
+            return self._rollup_store
+
+    @contextmanager
+    def using(self):
+        """Keeps the tenant's connections open for the block, even if it is evicted meanwhile."""
+        with self._lock:
+            self._users += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._users -= 1
+                release = self._closed and not self._users
+            if release:
+                self._release()
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            release = not self._users
+        if release:
+            self._release()
+
+    def _release(self) -> None:
+        self.query_cache.versions.stop()
+        self.query_cache.clear()
+        self.index_advisor.clear()
+        with self._lock:
+            client, self._client = self._client, None
+            async_clients = list(self._async_clients.items())
+            self._async_clients.clear()
+            store, self._rollup_store = self._rollup_store, None
+        if store is not None:
+            store.close()
+        if client is not None:
+            client.close()
+        for loop, async_client in async_clients:
+            result = async_client.close()
+            if asyncio.iscoroutine(result):
+                if loop.is_closed():
+                    result.close()
+                else:
+                    asyncio.run_coroutine_threadsafe(result, loop)
+
+    def stats(self) -> dict:
+        return {"schemas": self.schemas, "in_use": self._users, "query_cache": self.query_cache.stats()}
+
+
+class TenantPool:
+    """Tenants by database name, created on first use and kept in LRU order.
+
+    Beyond `maxsize` tenants the least recently used one is closed, so idle tenants
+    release their connections and caches while busy ones stay warm. The default
+    tenant (MONGODB_DATABASE) uses the shared client, the default query cache and
+    the ROLLUP_STORE_PATH rollups, and is never evicted.
+
+    Args:
+        registry, compiler, router: the default schemas, shared by tenants without their own
+        maxsize: tenants kept besides the default one
+        allowed: databases runs may select besides the default one, any valid name
+            but MongoDB's own databases when it holds "*"; none when empty
+        connect: database name -> MongoClient for tenants on their own client,
+            built from MONGODB_TENANT_URI by default; None shares the process client
+        aconnect: the same for async clients
+        schemas_dir: directory of per-tenant schema files
+    """
+
+    def __init__(
+        self,
+        registry: SchemaRegistry,
+        compiler: QueryCompiler,
+        router: CollectionRouter,
+        maxsize: int = MAX_TENANTS,
+        allowed=ALLOWED_TENANTS,
+        connect=None,
+        aconnect=None,
+        schemas_dir: str | None = SCHEMAS_DIR,
+    ):
+        if connect is None and TENANT_URI:
+            connect = lambda database: mongo.connect(TENANT_URI.format(database=database))  # noqa: E731
+            aconnect = aconnect or (lambda database: mongo.aconnect(TENANT_URI.format(database=database)))  # noqa: E731
+        self.maxsize = maxsize
+        self.allowed = frozenset(allowed)
+        self.schemas_dir = schemas_dir
+        self._connect = connect
+        self._aconnect = aconnect
+        self.default = Tenant(
+            mongo.default_database(), registry, compiler, router,
+            query_cache=get_query_cache(), rollup_store=load_rollup_store(registry),
+        )
+        self._tenants = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evicted = 0
+
+    def current(self, config=None) -> Tenant:
+        """Returns the tenant of `config`, or of the graph run being executed when omitted."""
+        return self.get(ensure_config(config).get("configurable", {}).get(CONFIG_KEY))
+
+    def get(self, database: str | None = None) -> Tenant:
+        """Returns the tenant of `database`, the default one when None.
+
+        Raises:
+            ValueError: the name is not a valid database name, is a system database or is not in `allowed`
+        """
+        if not database or database == self.default.database:
+            return self.default
+        with self._lock:
+            tenant = self._tenants.get(database)
+            if tenant is not None:
+                self._tenants.move_to_end(database)
+                return tenant
+        if not DATABASE_NAME.match(database):
+            raise ValueError(f"Invalid database name: {database!r}")
+        if database in SYSTEM_DATABASES or (database not in self.allowed and ANY_TENANT not in self.allowed):
+            raise ValueError(f"Unknown database: {database!r}")
+        tenant = self._create(database)
+        with self._lock:
+            existing = self._tenants.get(database)
+            if existing is not None:
+                # Created concurrently; the new one holds nothing yet
+                self._tenants.move_to_end(database)
+                return existing
+            self._tenants[database] = tenant
+            self.created += 1
+            evicted = []
+            while len(self._tenants) > self.maxsize:
+                evicted.append(self._tenants.popitem(last=False)[1])
+            self.evicted += len(evicted)
+        for old in evicted:
+            old.close()
+        return tenant
+
+    def _create(self, database: str) -> Tenant:
+        default = self.default
+        registry, compiler, router, schemas = default.schema_registry, default.query_compiler, default.collection_router, None
+        for extension in SCHEMA_EXTENSIONS if self.schemas_dir else ():
+            path = os.path.join(self.schemas_dir, f"{database}{extension}")
+            if os.path.exists(path):
+                registry = SchemaRegistry.from_file(path)
+                compiler, router, schemas = QueryCompiler(registry), CollectionRouter(registry.schemas), database
+                break
+        return Tenant(
+            database, registry, compiler, router,
+            schemas=schemas or default.schemas, connect=self._connect, aconnect=self._aconnect,
+        )
+
+    def close(self) -> None:
+        """Releases every tenant but the default one."""
+        with self._lock:
+            tenants = list(self._tenants.values())
+            self._tenants.clear()
+        for tenant in tenants:
+            tenant.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            tenants = dict(self._tenants)
+        return {
+            "open": len(tenants),
+            "created": self.created,
+            "evicted": self.evicted,
+            "tenants": {name: tenant.stats() for name, tenant in [(self.default.database, self.default), *tenants.items()]},
+        }
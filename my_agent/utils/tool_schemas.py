@@ -0,0 +1,78 @@
+"""Prebuilt tool schemas, so binding tools does not rebuild them from signatures and docstrings.
+
+`bind_tools` converts every tool to a JSON schema, parsing docstrings and building
+pydantic models, each time a worker starts. tool_schemas() serves the schemas
+from a JSON file instead, keyed by a fingerprint of each tool's name, description
+and signature; a tool whose fingerprint is not in the file (it was added or
+changed since the file was written) is converted as usual. Regenerate the file with
+
+    python -m my_agent.utils.tool_schemas
+"""
+import hashlib
+import inspect
+import json
+import os
+from functools import lru_cache
+
+DEFAULT_TOOL_SCHEMAS_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "tool_schemas.json")
+TOOL_SCHEMAS_PATH = os.environ.get("TOOL_SCHEMAS_PATH", DEFAULT_TOOL_SCHEMAS_PATH)
+
+
+def fingerprint(tool) -> str:
+    """Hashes what a tool's schema is derived from: its name, description and signature."""
+    func = getattr(tool, "func", None) or getattr(tool, "coroutine", None) or tool
+    name = getattr(tool, "name", None) or func.__name__
+    description = getattr(tool, "description", None) or func.__doc__ or ""
+    try:
+        signature = str(inspect.signature(func))
+    except (TypeError, ValueError):
+        signature = ""
+    return hashlib.sha256(f"{name}\0{description}\0{signature}".encode()).hexdigest()[:16]
+
+
+@lru_cache(maxsize=4)
+def _load(path: str, mtime: float) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def _prebuilt(path: str) -> dict:
+    try:
+        return _load(path, os.path.getmtime(path))
+    except (OSError, ValueError):
+        return {}
+
+
+def tool_schemas(tools, path: str = TOOL_SCHEMAS_PATH) -> list:
+    """OpenAI-format schemas for `tools`, to pass to `bind_tools` in their place.
+
+    Schemas come from the prebuilt file when it has the tool's fingerprint; the
+    others are derived with convert_to_openai_tool.
+    """
+    prebuilt = _prebuilt(path)
+    schemas = []
+    for tool in tools:
+        schema = prebuilt.get(fingerprint(tool))
+        if schema is None:
+            from langchain_core.utils.function_calling import convert_to_openai_tool
+
+            schema = convert_to_openai_tool(tool)
+        schemas.append(schema)
+    return schemas
+
+
+def write_tool_schemas(tools, path: str = TOOL_SCHEMAS_PATH) -> int:
+    """Writes the schemas of `tools` to `path`, replacing its contents; returns how many were written."""
+    from langchain_core.utils.function_calling import convert_to_openai_tool
+
+    schemas = {fingerprint(tool): convert_to_openai_tool(tool) for tool in tools}
+    with open(path, "w") as f:
+        json.dump(schemas, f, indent=1, sort_keys=True)
+        f.write("\n")
+    return len(schemas)
+
+
+if __name__ == "__main__":
+    from my_agent import agent
+
+    print(f"wrote {write_tool_schemas(agent.tools)} tool schemas to {TOOL_SCHEMAS_PATH}")
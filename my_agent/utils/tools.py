@@ -1,3 +1,16 @@
-from langchain_community.tools.tavily_search import TavilySearchResults
+from functools import lru_cache
 
-tools = [TavilySearchResults(max_results=1)]
\ No newline at end of file
+
+@lru_cache(maxsize=1)
+def get_tools() -> list:
+    """The tools of the call_model graph, built on first use so importing it stays fast."""
+    from langchain_community.tools.tavily_search import TavilySearchResults
+
+    return [TavilySearchResults(max_results=1)]
+
+
+def __getattr__(name: str):
+    # `tools` is still importable, but only built when it is first accessed
+    if name == "tools":
+        return get_tools()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
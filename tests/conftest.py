@@ -0,0 +1,52 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+# The agent's tools are built at import; nothing here reaches the network.
+os.environ.setdefault("TAVILY_API_KEY", "unused")
+os.environ.setdefault("OPENAI_API_KEY", "unused")
+os.environ.setdefault("METRICS_ENABLED", "0")
+
+import mongomock  # noqa: E402
+import pytest  # noqa: E402
+
+from benchmarks.dataset import seed_database  # noqa: E402
+from benchmarks.fakes import FakeAsyncClient, FakeChatModel  # noqa: E402
+from my_agent.utils import models, mongo  # noqa: E402
+from my_agent.utils.schemas import load_schema_registry  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    """A mongomock client with the generated university dataset in the default database.
+
+    Async runs of the graph read the same database through FakeAsyncClient.
+    """
+    client = mongomock.MongoClient()
+    seed_database(client[mongo.default_database()], load_schema_registry())
+    mongo.set_client_factory(lambda: client)
+    mongo.set_async_client_factory(lambda: FakeAsyncClient(client[mongo.default_database()], 0))
+    return client
+
+
+@pytest.fixture
+def chat_model(monkeypatch):
+    """Sets the chat model every call gets; returns a function taking the model's policy."""
+
+    def use(policy) -> FakeChatModel:
+        model = FakeChatModel(policy=policy, calls=[])
+        models.set_chat_model_factory(lambda **kwargs: model)
+        return model
+
+    yield use
+    models.set_chat_model_factory(None)
+
+
+@pytest.fixture
+def agent(client, chat_model):
+    from my_agent import agent
+
+    agent.get_response_cache().backend.clear()
+    # The assistant's model is built on first use, from the chat model the test sets
+    agent.llm = agent.llm_with_tools = None
+    return agent
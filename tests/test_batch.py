@@ -0,0 +1,37 @@
+import asyncio
+import json
+
+from langchain_core.messages import AIMessage
+
+from benchmarks.fakes import text
+from my_agent.utils.cache import normalize_query
+from my_agent.utils.query import QueryCompiler
+from my_agent.utils.router import CollectionRouter
+from my_agent.utils.schemas import load_schema_registry
+from my_agent.utils.tenants import TenantPool
+
+LABS = [{"collection": "labs", "fields": {"bench": {"type": "string", "description": "Lab bench number"}}}]
+
+
+def test_routes_are_prefetched_with_the_tenant_schemas(agent, chat_model, client, tmp_path):
+    from my_agent import batch
+
+    (tmp_path / "valdosta_state.json").write_text(json.dumps(LABS))
+    registry = load_schema_registry()
+    tenants = TenantPool(
+        registry, QueryCompiler(registry), CollectionRouter(registry.schemas),
+        allowed=["valdosta_state"], connect=lambda database: client, schemas_dir=str(tmp_path),
+    )
+    tenant = tenants.get("valdosta_state")
+    model = chat_model(lambda messages: AIMessage(content="labs, rooms"))
+    # The tenant's router is sure of the first question; the default one, which has no labs, is not
+    questions = ["How many labs are there?", "Where can I study?"]
+
+    with agent.shared_work.batch():
+        assert asyncio.run(batch.prefetch_routes(questions, tenant=tenant)) == 1
+        route = agent.shared_work.do("route", (tenant.schemas, normalize_query(questions[1])), lambda: None)
+    tenants.close()
+
+    assert route == ["labs"]
+    assert len(model.calls) == 1
+    assert '"collection":"labs"' in "".join(text(message) for message in model.calls[0])
@@ -0,0 +1,72 @@
+import asyncio
+import json
+import os
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from benchmarks.cassettes import Cassette, CassetteMiss, cassette_factory, prompt_key
+from benchmarks.fakes import FakeChatModel
+from my_agent.utils import models
+
+BENCHMARKS = os.path.join(os.path.dirname(__file__), "..", "benchmarks")
+PROMPT = [SystemMessage(content="You are a helpful assistant."), HumanMessage(content="How many rooms are there?")]
+
+
+def test_prompt_key_ignores_tool_call_ids_and_content_blocks():
+    call = {"name": "execute_pymongo", "args": {"query": "db.rooms.count_documents({})"}}
+    first = [*PROMPT, AIMessage(content="", tool_calls=[{**call, "id": "call_1"}]), ToolMessage(content="400", tool_call_id="call_1")]
+    second = [
+        SystemMessage(content=[{"type": "text", "text": "You are a helpful assistant.", "cache_control": {"type": "ephemeral"}}]),
+        PROMPT[1],
+        AIMessage(content="", tool_calls=[{**call, "id": "call_2"}]),
+        ToolMessage(content="400", tool_call_id="call_2"),
+    ]
+    assert prompt_key("gpt-4o", [], first) == prompt_key("gpt-4o", [], second)
+
+
+def test_prompt_key_depends_on_the_model_tools_and_messages():
+    key = prompt_key("gpt-4o", ["a", "b"], PROMPT)
+    assert prompt_key("gpt-4o", ["b", "a"], PROMPT) == key
+    assert prompt_key("claude-3-sonnet-20240229", ["a", "b"], PROMPT) != key
+    assert prompt_key("gpt-4o", ["a"], PROMPT) != key
+    assert prompt_key("gpt-4o", ["a", "b"], PROMPT[:1]) != key
+
+
+def test_recorded_responses_replay_in_order(tmp_path):
+    path = str(tmp_path / "cassette.json")
+    replies = iter(["400", "401"])
+    inner = FakeChatModel(policy=lambda messages: AIMessage(content=next(replies)))
+    recording = Cassette(path)
+    model = cassette_factory(recording, lambda **kwargs: inner)(model="gpt-4o")
+    assert [model.invoke(PROMPT).content for _ in range(2)] == ["400", "401"]
+    recording.save()
+
+    cassette = Cassette(path)
+    model = cassette_factory(cassette, latency_scale=0)(model="gpt-4o")
+    # The last response repeats once the recorded ones are played
+    assert [model.invoke(PROMPT).content for _ in range(3)] == ["400", "401", "401"]
+    cassette.rewind()
+    assert asyncio.run(model.ainvoke(PROMPT)).content == "400"
+    assert "".join(chunk.content for chunk in model.stream(PROMPT)) == "401"
+
+
+def test_unrecorded_prompts_miss(tmp_path):
+    model = cassette_factory(Cassette(str(tmp_path / "empty.json")), latency_scale=0)(model="gpt-4o")
+    with pytest.raises(CassetteMiss):
+        model.invoke(PROMPT)
+
+
+def test_the_offline_cassette_replays_the_corpus(agent):
+    # Fails when the agent's prompts no longer match the recordings; re-record with BENCH_MODE=script
+    cassette = Cassette(os.path.join(BENCHMARKS, "cassettes", "offline.json"))
+    with open(os.path.join(BENCHMARKS, "corpus.json")) as f:
+        corpus = json.load(f)
+    models.set_chat_model_factory(cassette_factory(cassette, latency_scale=0))
+    graph = agent.builder.compile()
+    agent.rollup_store.refresh()
+    for entry in corpus:
+        cassette.rewind()
+        agent.get_response_cache().backend.clear()
+        answer = graph.invoke({"messages": [("user", entry["question"])]})["messages"][-1].content
+        assert answer.startswith("Here is what I found"), (entry["id"], answer)
@@ -0,0 +1,116 @@
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage, ToolMessage
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph import START, MessagesState, StateGraph
+
+from my_agent.utils.checkpoint import DeltaSQLiteSaver
+
+THREAD = {"configurable": {"thread_id": "thread-1"}}
+# Shared by every turn, so it is stored once
+PAYLOAD = '{"results": [' + ",".join(f'{{"name": "Room {i}"}}' for i in range(60)) + "]}"
+
+
+def answer(state: MessagesState) -> dict:
+    n = int(state["messages"][-1].id.split("-")[1])
+    return {"messages": [
+        ToolMessage(content=PAYLOAD, tool_call_id=f"call-{n}", id=f"tool-{n}"),
+        AIMessage(content=f"Answer {n}: " + "x" * (n * 40), id=f"ai-{n}"),
+    ]}
+
+
+def compile_graph(saver):
+    builder = StateGraph(MessagesState)
+    builder.add_node("answer", answer)
+    builder.add_edge(START, "answer")
+    return builder.compile(checkpointer=saver)
+
+
+def turn(graph, n: int, config=THREAD) -> None:
+    messages = [HumanMessage(content=f"Question {n}", id=f"human-{n}")]
+    if n % 5 == 4:
+        # Drop an earlier answer, as history trimming does
+        messages.append(RemoveMessage(id=f"ai-{n - 3}"))
+    graph.invoke({"messages": messages}, config)
+
+
+def converse(saver, turns: int):
+    graph = compile_graph(saver)
+    for n in range(turns):
+        turn(graph, n)
+    return graph
+
+
+def transcript(messages) -> list[tuple]:
+    return [(message.type, message.id, message.content) for message in messages]
+
+
+def history(graph, config=THREAD) -> dict[int, list[tuple]]:
+    """The messages of every checkpoint of the thread, by step."""
+    return {
+        snapshot.metadata["step"]: transcript(snapshot.values.get("messages", []))
+        for snapshot in graph.get_state_history(config)
+    }
+
+
+def test_matches_the_in_memory_saver_over_many_turns():
+    expected = converse(InMemorySaver(), 40)
+    graph = converse(DeltaSQLiteSaver(":memory:", keep_last=0, keyframe_every=4, blob_min_bytes=64), 40)
+    assert transcript(graph.get_state(THREAD).values["messages"]) == transcript(expected.get_state(THREAD).values["messages"])
+    assert history(graph) == history(expected)
+
+
+def test_forks_from_an_older_checkpoint():
+    graphs = [converse(saver, 12) for saver in (InMemorySaver(), DeltaSQLiteSaver(":memory:", keep_last=0, keyframe_every=4))]
+    forks = []
+    for graph in graphs:
+        older = next(s for s in graph.get_state_history(THREAD) if s.metadata["step"] == 10)
+        turn(graph, 100, older.config)
+        forks.append(transcript(graph.get_state(THREAD).values["messages"]))
+        # The branch left behind is still readable
+        assert len(graph.get_state(older.config).values["messages"]) == len(older.values["messages"])
+    assert forks[0] == forks[1]
+    assert forks[1][-3][1] == "human-100"
+
+
+def test_reopens_a_file(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite")
+    saver = DeltaSQLiteSaver(path, keep_last=0, keyframe_every=4)
+    expected = history(converse(saver, 10))
+    saver.close()
+
+    saver = DeltaSQLiteSaver(path, keep_last=0, keyframe_every=4)
+    graph = compile_graph(saver)
+    assert history(graph) == expected
+    turn(graph, 10)
+    assert graph.get_state(THREAD).values["messages"][-3].id == "human-10"
+    saver.close()
+
+
+def test_keep_last_leaves_readable_chains_across_keyframes(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite")
+    expected = history(converse(InMemorySaver(), 30))
+    saver = DeltaSQLiteSaver(path, keep_last=5, keyframe_every=3, blob_min_bytes=64)
+    converse(saver, 30)
+    saver.close()
+
+    # A new saver has no cached reference lists: every delta chain is read from disk
+    saver = DeltaSQLiteSaver(path, keep_last=5, keyframe_every=3, blob_min_bytes=64)
+    kept = history(compile_graph(saver))
+    assert 5 <= len(kept) <= 6
+    assert kept == {step: expected[step] for step in kept}
+    saver.close()
+
+
+def test_garbage_collection_keeps_referenced_blobs(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite")
+    expected = history(converse(InMemorySaver(), 30))
+    saver = DeltaSQLiteSaver(path, keep_last=5, keyframe_every=3, blob_min_bytes=64, gc_every=0)
+    converse(saver, 30)
+    collected = saver.collect_garbage()
+    assert collected["deleted_blobs"] > 0
+    saver.close()
+
+    saver = DeltaSQLiteSaver(path, keep_last=5, keyframe_every=3, blob_min_bytes=64, gc_every=0)
+    kept = history(compile_graph(saver))
+    assert kept and kept == {step: expected[step] for step in kept}
+    assert saver.collect_garbage()["deleted_blobs"] == 0
+    saver.close()
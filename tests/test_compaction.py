@@ -0,0 +1,111 @@
+import json
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+from benchmarks.fakes import is_agent_prompt
+from my_agent.utils.compaction import HistoryCompactor
+
+
+def turn(i: int, documents: int = 30) -> list:
+    """A question answered with one query returning `documents` courses."""
+    payload = json.dumps({
+        "results": [{"course_id": f"C{i}-{j}", "name": f"Course {j}", "department": "Mathematics"} for j in range(documents)],
+        "returned": documents, "total": 120,
+    })
+    return [
+        HumanMessage(content=f"Which math courses are in block {i}?", id=f"human-{i}"),
+        AIMessage(
+            content="",
+            tool_calls=[{"name": "execute_pymongo", "args": {"query": f"db.courses.find({{'block': {i}}})"}, "id": f"call-{i}"}],
+            id=f"ai-{i}",
+        ),
+        ToolMessage(content=payload, name="execute_pymongo", tool_call_id=f"call-{i}", id=f"tool-{i}"),
+        AIMessage(content=f"There are 120 math courses in block {i}; here are the first 30.", id=f"answer-{i}"),
+    ]
+
+
+def session(turns: int) -> list:
+    return [message for i in range(turns) for message in turn(i)]
+
+
+def questions(messages) -> list[str]:
+    return [m.id for m in messages if isinstance(m, HumanMessage)]
+
+
+def summarized(message) -> bool:
+    return isinstance(message, ToolMessage) and message.id.endswith(":summary")
+
+
+def test_fitting_histories_are_unchanged():
+    messages = session(3)
+    compactor = HistoryCompactor(budget=100_000)
+    assert compactor.compact(messages) == messages
+
+
+@pytest.mark.parametrize("budget", [0, 500, 2000])
+def test_the_last_turns_are_kept_verbatim(budget):
+    messages = session(6)
+    compacted = HistoryCompactor(budget=budget, keep_turns=2).compact(messages)
+    assert compacted[-8:] == messages[-8:]
+    assert all(a is b for a, b in zip(compacted[-8:], messages[-8:]))
+
+
+def test_tool_outputs_are_summarized_before_any_turn_is_dropped():
+    messages = session(6)
+    compactor = HistoryCompactor(budget=100_000, keep_turns=2, summary_min_tokens=150)
+    # Just enough for every turn once the older tool outputs are summarized
+    summaries = [compactor.summarize(m) if isinstance(m, ToolMessage) and m.id not in ("tool-4", "tool-5") else m for m in messages]
+    compactor.budget = compactor.tokens(summaries)
+
+    compacted = compactor.compact(messages)
+    assert questions(compacted) == questions(messages)
+    assert [m.id for m in compacted if summarized(m)] == [f"tool-{i}:summary" for i in range(4)]
+    # Summaries keep the call id, so every call still has its result
+    assert all(m.tool_call_id == m.id.removesuffix(":summary").replace("tool", "call") for m in compacted if summarized(m))
+    assert "Preview:" in compacted[2].content and len(compacted[2].content) < len(messages[2].content)
+
+    # One token less and the oldest turn goes, its neighbours' outputs already summarized
+    compactor.budget -= 1
+    compacted = compactor.compact(messages)
+    assert questions(compacted) == questions(messages)[1:]
+    assert [m.id for m in compacted if summarized(m)] == [f"tool-{i}:summary" for i in range(1, 4)]
+
+
+def test_small_tool_outputs_are_kept():
+    messages = [m for i in range(4) for m in turn(i, documents=1)]
+    compacted = HistoryCompactor(budget=0, keep_turns=2, summary_min_tokens=150).compact(messages)
+    assert not any(summarized(m) for m in compacted)
+    assert questions(compacted) == ["human-2", "human-3"]
+
+
+@pytest.mark.parametrize("budget", range(0, 6000, 500))
+def test_tool_calls_are_never_split_from_their_results(budget):
+    # Two parallel calls in the same turn as well
+    messages = session(5)
+    messages[5:7] = [
+        AIMessage(content="", tool_calls=[{"name": "execute_pymongo", "args": {"query": "db.rooms.find({})"}, "id": f"call-1{c}"} for c in "ab"], id="ai-1ab"),
+        *[ToolMessage(content="[]", name="execute_pymongo", tool_call_id=f"call-1{c}", id=f"tool-1{c}") for c in "ab"],
+    ]
+    compacted = HistoryCompactor(budget=budget, keep_turns=1, summary_min_tokens=50).compact(messages)
+    calls = [call["id"] for m in compacted if isinstance(m, AIMessage) for call in m.tool_calls]
+    results = [m.tool_call_id for m in compacted if isinstance(m, ToolMessage)]
+    assert calls == results
+    assert isinstance(compacted[0], HumanMessage)
+
+
+def test_the_graph_state_keeps_the_full_history(agent, chat_model, monkeypatch):
+    model = chat_model(lambda messages: AIMessage(content="Done." if is_agent_prompt(messages) else "1. Answer the user"))
+    monkeypatch.setattr(agent, "history", HistoryCompactor(budget=0, keep_turns=2))
+    monkeypatch.setattr(agent, "FAST_PATH", False)
+    graph = agent.builder.compile(checkpointer=InMemorySaver())
+    config = {"configurable": {"thread_id": "compaction"}}
+    graph.update_state(config, {"messages": session(6)})
+
+    messages = graph.invoke({"messages": [HumanMessage(content="And in block 6?", id="human-6")]}, config)["messages"]
+    # The state holds every message; only the prompt was compacted
+    assert [m.id for m in messages[:24]] == [m.id for m in session(6)]
+    assert messages[24].id == "human-6" and messages[-1].content == "Done."
+    prompt = [messages for messages in model.calls if is_agent_prompt(messages)][-1]
+    assert questions(prompt) == ["human-5", "human-6"]
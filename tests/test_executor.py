@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+from langchain_core.messages import AIMessage
+
+from my_agent.utils import fast_path
+from my_agent.utils.executor import ParallelToolNode
+
+
+def identify_relevant_mongodb_collections(user_query: str) -> list[str]:
+    """Returns the collections relevant to the user query."""
+    return ["rooms", "buildings"]
+
+
+def state(*calls) -> dict:
+    tool_calls = [{"name": name, "args": args, "id": f"call_{i}"} for i, (name, args) in enumerate(calls)]
+    return {"messages": [AIMessage(content="", tool_calls=tool_calls)]}
+
+
+def test_list_results_are_sent_as_json():
+    node = ParallelToolNode([identify_relevant_mongodb_collections])
+    call = ("identify_relevant_mongodb_collections", {"user_query": "rooms"})
+    for result in (node.invoke(state(call)), asyncio.run(node.ainvoke(state(call)))):
+        (message,) = result["messages"]
+        assert message.content == '["rooms", "buildings"]'
+
+
+def test_unknown_tool_is_an_error_message():
+    node = ParallelToolNode([identify_relevant_mongodb_collections])
+    (message,) = node.invoke(state(("nope", {})))["messages"]
+    assert message.status == "error" and message.content.startswith("Error: nope is not a valid tool")
+
+
+def test_fast_path_transcript_sends_list_results_as_json():
+    steps = fast_path.no_collections_steps("rooms") + [("mongodb_schemas_for_collections", {"collections": ["rooms"]}, "{}")]
+    _, empty, schemas = fast_path.transcript(steps)
+    assert empty.content == "[]" and schemas.content == "{}"
+
+
+def slow_tool(seconds: float) -> str:
+    """Sleeps for `seconds`."""
+    time.sleep(seconds)
+    return "slept"
+
+
+def fast_tool() -> str:
+    """Returns at once."""
+    return "done"
+
+
+def test_sync_timeouts_run_concurrently():
+    node = ParallelToolNode([slow_tool], timeouts={"default": 0.3})
+    start = time.monotonic()
+    messages = node.invoke(state(*[("slow_tool", {"seconds": 1.0})] * 3))["messages"]
+    assert time.monotonic() - start < 0.8
+    assert all(message.content == "Error: slow_tool timed out after 0.3s" for message in messages)
+
+
+def test_timed_out_call_gives_up_its_slot():
+    node = ParallelToolNode([slow_tool, fast_tool], concurrency={"default": 1}, timeouts={"default": 0.3})
+    start = time.monotonic()
+    slow, fast = node.invoke(state(("slow_tool", {"seconds": 1.5}), ("fast_tool", {})))["messages"]
+    assert "timed out" in slow.content and fast.content == "done"
+    assert time.monotonic() - start < 1.0
+    # The group's semaphore is whole again once the abandoned thread finishes
+    time.sleep(1.5)
+    assert node._semaphores["default"]._value == 1
+
+
+def test_async_semaphores_are_per_event_loop():
+    node = ParallelToolNode([fast_tool], concurrency={"default": 1})
+    for _ in range(2):
+        (message,) = asyncio.run(node.ainvoke(state(("fast_tool", {}))))["messages"]
+        assert message.content == "done"
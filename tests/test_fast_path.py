@@ -0,0 +1,110 @@
+import asyncio
+import json
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from benchmarks.fakes import COUNT_ROOMS, count_rooms_policy, is_agent_prompt, is_draft_prompt
+
+QUESTION = "How many rooms are there?"
+
+
+def drafting(query):
+    """The agent's policy, with the fast path's draft answered by `query`."""
+
+    def policy(messages) -> AIMessage:
+        if is_draft_prompt(messages):
+            return AIMessage(content=json.dumps({"query": query}))
+        return count_rooms_policy(messages)
+
+    return policy
+
+
+def run(agent, messages, asynchronous: bool) -> tuple[list, list[str]]:
+    """Runs the graph; returns the messages the fast path added and the progress events emitted."""
+    graph, inputs, mode = agent.builder.compile(), {"messages": messages}, ["updates", "custom"]
+    if asynchronous:
+        async def collect():
+            return [part async for part in graph.astream(inputs, stream_mode=mode)]
+
+        parts = asyncio.run(collect())
+    else:
+        parts = list(graph.stream(inputs, stream_mode=mode))
+    added = [
+        message for kind, data in parts if kind == "updates" and "fast_path" in data
+        for message in (data["fast_path"] or {}).get("messages", [])
+    ]
+    return added, [data["event"] for kind, data in parts if kind == "custom"]
+
+
+def agent_turns(model) -> int:
+    return sum(1 for messages in model.calls if is_agent_prompt(messages))
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_answers_with_one_assistant_turn(agent, chat_model, asynchronous):
+    model = chat_model(drafting(COUNT_ROOMS))
+    added, events = run(agent, [("user", QUESTION)], asynchronous)
+    assert [call["name"] for call in added[0].tool_calls] == [
+        "identify_relevant_mongodb_collections", "mongodb_schemas_for_collections", "create_mongodb_query", "execute_pymongo",
+    ]
+    assert "fast_path_drafted" in events and "fast_path_fallback" not in events
+    assert agent_turns(model) == 1
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+@pytest.mark.parametrize("query", [
+    None,
+    "I cannot answer that",
+    "db.rooms.drop()",
+    "db.rooms.find({'$where': 'this.capacity > 10'})",
+], ids=["no_query", "not_a_query", "not_allowed", "not_compiling"])
+def test_drafts_without_a_runnable_query_fall_back_to_the_agent_loop(agent, chat_model, query, asynchronous):
+    model = chat_model(drafting(query))
+    added, events = run(agent, [("user", QUESTION)], asynchronous)
+    assert added == [] and "fast_path_fallback" in events
+    # The assistant starts from the question, as if there was no fast path
+    assert agent_turns(model) == 2
+    first = next(messages for messages in model.calls if is_agent_prompt(messages))
+    assert [m.content for m in first if isinstance(m, HumanMessage)] == [QUESTION]
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_failed_executions_fall_back_to_the_agent_loop(agent, chat_model, monkeypatch, asynchronous):
+    model = chat_model(drafting("db.rooms.count_documents({'capacity': {'$gt': 1000}})"))
+
+    def fail(*args, **kwargs):
+        raise ConnectionError("connection refused")
+
+    async def afail(*args, **kwargs):
+        fail()
+
+    monkeypatch.setattr(agent, "execute_plan", fail)
+    monkeypatch.setattr(agent, "aexecute_plan", afail)
+    added, events = run(agent, [("user", QUESTION)], asynchronous)
+    assert added == []
+    assert events.index("fast_path_drafted") < events.index("fast_path_fallback")
+    assert agent_turns(model) == 2
+
+
+def test_follow_up_questions_skip_the_fast_path(agent, chat_model):
+    model = chat_model(drafting(COUNT_ROOMS))
+    history = [("user", "How many buildings are there?"), ("ai", "There are 12 buildings."), ("user", QUESTION)]
+    added, events = run(agent, history, asynchronous=False)
+    assert added == [] and events.count("fast_path_drafted") == 0
+    assert not any(is_draft_prompt(messages) for messages in model.calls)
+
+
+def test_rollup_questions_skip_the_fast_path(agent, chat_model):
+    model = chat_model(drafting(COUNT_ROOMS))
+    added, _ = run(agent, [("user", "How many rooms are there per building?")], asynchronous=False)
+    assert added == []
+    assert not any(is_draft_prompt(messages) for messages in model.calls)
+
+
+def test_can_be_turned_off(agent, chat_model, monkeypatch):
+    model = chat_model(drafting(COUNT_ROOMS))
+    monkeypatch.setattr(agent, "FAST_PATH", False)
+    added, _ = run(agent, [("user", QUESTION)], asynchronous=False)
+    assert added == [] and agent_turns(model) == 2
+    assert not any(is_draft_prompt(messages) for messages in model.calls)
@@ -0,0 +1,113 @@
+import asyncio
+import json
+
+import mongomock
+import pytest
+from langchain_core.messages import ToolMessage
+
+from my_agent.utils import planner
+from my_agent.utils.index_advisor import IndexAdvisor, parse_explain
+from my_agent.utils.query import QueryError, QueryPlan
+from my_agent.utils.results import serialize_results
+
+# A trimmed find explain from MongoDB 7 with the default "queryPlanner" verbosity: no executionStats.
+QUERY_PLANNER_EXPLAIN = {
+    "queryPlanner": {"winningPlan": {"stage": "LIMIT", "inputStage": {"stage": "COLLSCAN", "direction": "forward"}}},
+}
+EXECUTION_STATS_EXPLAIN = {
+    "queryPlanner": {"winningPlan": {"stage": "SORT", "inputStage": {"stage": "COLLSCAN", "direction": "forward"}}},
+    "executionStats": {"nReturned": 41, "totalKeysExamined": 0, "totalDocsExamined": 250000},
+}
+
+
+class FakeCollection:
+    def __init__(self, count):
+        self.count = count
+
+    def estimated_document_count(self):
+        return self.count
+
+
+class FakeDatabase:
+    """A database whose explain answers like a server's, with `count` documents per collection."""
+
+    def __init__(self, count, explain=QUERY_PLANNER_EXPLAIN):
+        self.count = count
+        self.explain = explain
+
+    def command(self, command):
+        return self.explain
+
+    def __getitem__(self, name):
+        return FakeCollection(self.count)
+
+
+class AsyncFakeCollection(FakeCollection):
+    async def estimated_document_count(self):
+        return self.count
+
+
+class AsyncFakeDatabase(FakeDatabase):
+    async def command(self, command):
+        return self.explain
+
+    def __getitem__(self, name):
+        return AsyncFakeCollection(self.count)
+
+
+def find(**kwargs) -> QueryPlan:
+    return QueryPlan("courses", "find", {"status": "active"}, **kwargs)
+
+
+def test_parse_explain_execution_stats():
+    explain = parse_explain(EXECUTION_STATS_EXPLAIN)
+    assert explain.collscan and explain.docs_examined == 250000 and explain.returned == 41
+
+
+def test_query_planner_explain_estimates_scanned_documents():
+    explain = IndexAdvisor().explain(find(), FakeDatabase(250000))
+    assert explain.collscan and explain.docs_examined == 250000 and not explain.estimated
+
+
+def test_guard_limits_large_collscan_from_query_planner_explain():
+    plan, warning = IndexAdvisor(scan_limit=1000, limit_to=50).guard(find(), FakeDatabase(250000))
+    assert plan.limit == 50
+    assert "250000 documents of courses" in warning
+
+
+def test_guard_blocks_large_collscan_from_query_planner_explain():
+    with pytest.raises(QueryError, match="Query blocked"):
+        IndexAdvisor(scan_limit=1000, action="block").guard(find(), FakeDatabase(250000))
+
+
+def test_guard_runs_small_collscan_unchanged():
+    plan, warning = IndexAdvisor(scan_limit=1000).guard(find(limit=5), FakeDatabase(200))
+    assert plan == find(limit=5) and warning is None
+
+
+def test_aguard_limits_large_collscan_from_query_planner_explain():
+    advisor = IndexAdvisor(scan_limit=1000, limit_to=50)
+    plan, warning = asyncio.run(advisor.aguard(find(), AsyncFakeDatabase(250000)))
+    assert plan.limit == 50 and warning
+
+
+def test_guard_estimates_from_indexes_without_explain():
+    db = mongomock.MongoClient().db
+    db.courses.insert_many([{"status": "active"} for _ in range(20)])
+    plan, warning = IndexAdvisor(scan_limit=10, limit_to=5).guard(find(), db)
+    assert plan.limit == 5 and warning
+    db.courses.create_index("status")
+    plan, warning = IndexAdvisor(scan_limit=10).guard(find(), db)
+    assert plan.limit == 0 and warning is None
+
+
+def test_limited_query_result_stays_json():
+    db = mongomock.MongoClient().db
+    db.courses.insert_many([{"status": "active", "n": i} for i in range(20)])
+    plan, warning = IndexAdvisor(scan_limit=10, limit_to=5).guard(find(), db)
+    output = serialize_results(db.courses.find(plan.filter).limit(plan.limit), warning=warning)
+    assert json.loads(output)["warning"] == warning and json.loads(output)["returned"] == 5
+    count = json.loads(serialize_results(12, warning=warning))
+    assert count == {"result": 12, "warning": warning}
+    message = ToolMessage(content=output, name="execute_pymongo", tool_call_id="call_0")
+    assert not planner._failed(message)
@@ -0,0 +1,103 @@
+import re
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from benchmarks.fakes import is_agent_prompt, is_draft_prompt, pipeline_policy, text
+from my_agent.utils import scheduler
+from my_agent.utils.instrumentation import Instrumentation
+
+QUESTION = {"messages": [("user", "How many rooms are there?")]}
+
+
+def flaky(policy):
+    """`policy`, with the first create_mongodb_query call failing on a dropped connection."""
+    failures = [ConnectionError("connection reset")]
+
+    def respond(messages) -> AIMessage:
+        query_prompt = not is_agent_prompt(messages) and not is_draft_prompt(messages) and "pymongo query" in text(messages[0])
+        if query_prompt and failures:
+            raise failures.pop()
+        return policy(messages)
+
+    return respond
+
+
+@pytest.fixture
+def recorder(agent, chat_model, monkeypatch):
+    """Runs the question through the agent loop, with the instrumentation bound as in my_agent/agent.py."""
+    chat_model(flaky(pipeline_policy()))
+    # The failed call is retried by the scheduler without waiting
+    calls = scheduler.CallScheduler(backoff_base=0.001, backoff_max=0.001)
+    monkeypatch.setattr(scheduler, "get_scheduler", lambda: calls)
+    recorder = Instrumentation(enabled=True)
+    monkeypatch.setattr(agent, "instrumentation", recorder)
+    monkeypatch.setattr(agent, "FAST_PATH", False)
+    agent.tenants.default.query_cache.clear()
+    recorder.instrument(agent.builder.compile()).invoke(QUESTION)
+    return recorder
+
+
+def spans(recorder: Instrumentation) -> list[dict]:
+    return recorder.export_spans()["resourceSpans"][0]["scopeSpans"][0]["spans"]
+
+
+def attributes(span: dict) -> dict:
+    return {a["key"]: next(iter(a["value"].values())) for a in span["attributes"]}
+
+
+def test_spans_nest_under_their_node_or_tool(recorder):
+    exported = spans(recorder)
+    by_id = {span["spanId"]: span for span in exported}
+
+    def path(span) -> list[str]:
+        names = [span["name"]]
+        while "parentSpanId" in span:
+            span = by_id[span["parentSpanId"]]
+            names.append(span["name"])
+        return names[::-1]
+
+    paths = {tuple(path(span)) for span in exported}
+    assert len({span["traceId"] for span in exported}) == 1
+    assert [span["name"] for span in exported if "parentSpanId" not in span] == ["graph LangGraph"]
+    assert ("graph LangGraph", "node tools", "tool create_mongodb_query", "llm gpt-4o") in paths
+    assert ("graph LangGraph", "node tools", "tool execute_pymongo", "mongo rooms.count_documents") in paths
+    assert ("graph LangGraph", "node assistant", "llm gpt-4o") in paths
+    assert all(span["status"] == {"code": 1} for span in exported if span["name"].startswith(("node", "tool", "mongo")))
+    # Exporting hands the spans over
+    assert spans(recorder) == []
+
+
+def test_tokens_and_retries_roll_up_to_the_node_or_tool(recorder):
+    exported = spans(recorder)
+    by_parent = {}
+    for span in exported:
+        by_parent.setdefault(span.get("parentSpanId"), []).append(span)
+    tool = next(span for span in exported if span["name"] == "tool create_mongodb_query")
+    llm_calls = [attributes(span) for span in by_parent[tool["spanId"]] if span["name"].startswith("llm ")]
+    assert attributes(tool)["gen_ai.usage.input_tokens"] == str(sum(int(a["gen_ai.usage.input_tokens"]) for a in llm_calls))
+    assert attributes(tool)["agent.retries"] == "1"
+
+    stats = recorder.stats()
+    assert stats[("tool", "create_mongodb_query")]["retries"] == 1
+    assert stats[("node", "assistant")]["retries"] == 0
+    assert stats[("node", "assistant")]["tokens_in"] > 0
+    assert stats[("tool", "execute_pymongo")]["tokens_in"] == 0
+    # Model calls count toward their closest node or tool only
+    assert stats[("node", "tools")]["tokens_in"] == 0
+    assert stats[("llm", "gpt-4o")]["tokens_in"] == stats[("node", "assistant")]["tokens_in"] + stats[("tool", "create_mongodb_query")]["tokens_in"]
+
+
+def test_prometheus_output(recorder):
+    metrics = recorder.render_prometheus()
+    samples = dict(re.findall(r"^(agent_\S+\}) (\S+)$", metrics, re.MULTILINE))
+    stats = recorder.stats()
+    assert "# TYPE agent_duration_seconds summary" in metrics and "# TYPE agent_tokens_total counter" in metrics
+    # Four tool steps and the answer
+    assert samples['agent_duration_seconds_count{kind="node",name="assistant"}'] == "5"
+    assert samples['agent_duration_seconds_count{kind="tool",name="execute_pymongo"}'] == "1"
+    assert samples['agent_retries_total{kind="tool",name="create_mongodb_query"}'] == "1"
+    assert samples['agent_tokens_total{kind="tool",name="create_mongodb_query",direction="input"}'] == str(stats[("tool", "create_mongodb_query")]["tokens_in"])
+    assert samples['agent_errors_total{kind="node",name="tools"}'] == "0"
+    for q in ("0.5", "0.95", "0.99"):
+        assert f'agent_duration_seconds{{kind="mongo",name="rooms.count_documents",quantile="{q}"}}' in samples
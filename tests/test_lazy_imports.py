@@ -0,0 +1,39 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+# Imported on first use only: model providers, the MongoDB driver and the search tool
+DEFERRED = [
+    "langchain_openai", "langchain_anthropic", "openai", "anthropic", "pymongo", "bson",
+    "langchain_community", "tavily",
+]
+
+LOADED = """
+import json, sys
+import {module}
+print(json.dumps(sorted({{name.split(".")[0] for name in sys.modules}} & set({deferred!r}))))
+"""
+
+
+def loaded(module: str) -> list[str]:
+    """The deferred packages imported with `module`, in a fresh interpreter."""
+    env = dict(os.environ, PYTHONPATH=ROOT, OPENAI_API_KEY="unused", TAVILY_API_KEY="unused")
+    env.pop("CHECKPOINT_PATH", None)
+    result = subprocess.run(
+        [sys.executable, "-c", LOADED.format(module=module, deferred=DEFERRED)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+@pytest.mark.parametrize("module", ["my_agent.agent", "my_agent.batch"])
+def test_importing_the_agent_defers_providers_and_drivers(module):
+    assert loaded(module) == []
+
+
+def test_the_check_sees_deferred_imports():
+    assert loaded("langchain_openai") == ["langchain_openai", "openai"]
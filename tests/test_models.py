@@ -0,0 +1,23 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fake_llm_server import FakeLLMServer
+from my_agent.utils.models import build_chat_model
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = FakeLLMServer(latency=0.0).start()
+    monkeypatch.setenv("OPENAI_BASE_URL", f"{server.url}/v1")
+    monkeypatch.setenv("OPENAI_API_KEY", "unused")
+    yield server
+    server.stop()
+
+
+def test_one_model_serves_successive_event_loops(server):
+    model = build_chat_model("gpt-4o", max_retries=0)
+    for _ in range(3):
+        assert asyncio.run(model.ainvoke("How many rooms are there?")).content
+    assert model.invoke("How many rooms are there?").content
+    assert server.counts["requests"] == 4
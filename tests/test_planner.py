@@ -0,0 +1,108 @@
+import asyncio
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from benchmarks.fakes import FakeChatModel
+from my_agent.utils.planner import DEFAULT_STEPS, MAX_REPLANS, Planner, _failed, initial_plan, observe, render_plan
+from my_agent.utils.state import merge_plan
+
+QUESTION = "How many rooms are there?"
+TOOLS = [name for _, name in DEFAULT_STEPS if name]
+
+
+def tool_message(name: str, content: str, status: str = "success") -> ToolMessage:
+    return ToolMessage(content=content, name=name, tool_call_id=f"call_{name}", status=status)
+
+
+def planner(*replies) -> tuple[Planner, FakeChatModel]:
+    replies = iter(replies)
+    model = FakeChatModel(policy=lambda messages: AIMessage(content=next(replies)), calls=[])
+    tools = [type(name, (), {"name": name, "description": f"{name} tool"}) for name in TOOLS]
+    return Planner(tools, model=model), model
+
+
+def state_after(*results: ToolMessage, plan=None, replans: int = 0) -> dict:
+    return {
+        "messages": [HumanMessage(content=QUESTION), AIMessage(content=""), *results],
+        "plan": plan or initial_plan(),
+        "replans": replans,
+    }
+
+
+def test_render_plan_points_at_the_next_pending_step():
+    plan = merge_plan(initial_plan(), [{"id": 1, "status": "done"}])
+    rendered = render_plan(plan)
+    assert rendered.startswith("Plan:\n1. [done] Identify")
+    assert rendered.endswith(f"Next step: {DEFAULT_STEPS[1][0]}")
+    assert "Next step" not in render_plan(merge_plan(plan, [{"id": i, "status": "done"} for i in range(2, 6)]))
+
+
+def test_failed_results():
+    assert _failed(tool_message("execute_pymongo", "Unknown collection: labs"))
+    assert not _failed(tool_message("execute_pymongo", '{"results": [], "returned": 0}'))
+    assert not _failed(tool_message("execute_pymongo", "400"))
+    assert _failed(tool_message("create_mongodb_query", "I cannot answer that"))
+    assert not _failed(tool_message("create_mongodb_query", "db.rooms.count_documents({})"))
+    assert _failed(tool_message("mongodb_schemas_for_collections", "[]", status="error"))
+
+
+def test_observe_matches_results_to_steps():
+    patches, failures = observe(initial_plan(), [
+        tool_message("identify_relevant_mongodb_collections", "['rooms']"),
+        tool_message("mongodb_schemas_for_collections", "[...]"),
+        tool_message("execute_mongodb_shell_syntax", "not json"),
+    ])
+    assert [(patch["id"], patch["status"]) for patch in patches] == [(1, "done"), (2, "done"), (4, "failed")]
+    assert [message.name for message in failures] == ["execute_mongodb_shell_syntax"]
+
+
+def test_observe_skips_the_queries_without_relevant_collections():
+    patches, failures = observe(initial_plan(), [tool_message("identify_relevant_mongodb_collections", "[]")])
+    plan = merge_plan(initial_plan(), patches)
+    assert not failures
+    assert [step["status"] for step in plan] == ["done", "skipped", "skipped", "skipped", "pending"]
+    assert plan[-1]["description"] == "Tell the user we don't have any information on that topic"
+
+
+def test_new_questions_start_from_the_default_plan_without_the_model():
+    node, model = planner()
+    update = node.invoke({"messages": [HumanMessage(content=QUESTION)], "plan": [], "replans": 0})
+    assert update == {"plan": {"replace": initial_plan()}, "replans": 0}
+    assert not model.calls
+
+
+def test_successful_steps_are_patched_without_the_model():
+    node, model = planner()
+    update = node.invoke(state_after(tool_message("identify_relevant_mongodb_collections", "['rooms']")))
+    assert update == {"plan": [{"id": 1, "status": "done", "result": "['rooms']"}]}
+    assert not model.calls
+
+
+def test_failed_steps_are_replanned():
+    node, model = planner("1. Fix the query with create_mongodb_query\n2. Run it with execute_pymongo\n3. Answer")
+    done = merge_plan(initial_plan(), [{"id": i, "status": "done"} for i in (1, 2, 3)])
+    update = node.invoke(state_after(tool_message("execute_pymongo", "Unknown field"), plan=done))
+    steps = update["plan"]["replace"]
+    assert update["replans"] == 1
+    assert [(step["id"], step["status"], step["tool"]) for step in steps] == [
+        (1, "done", "identify_relevant_mongodb_collections"),
+        (2, "done", "mongodb_schemas_for_collections"),
+        (3, "done", "create_mongodb_query"),
+        (4, "pending", "create_mongodb_query"),
+        (5, "pending", "execute_pymongo"),
+        (6, "pending", None),
+    ]
+    assert "execute_pymongo failed: Unknown field" in model.calls[0][-1].content
+
+
+def test_replans_are_bounded():
+    node, model = planner()
+    update = node.invoke(state_after(tool_message("execute_pymongo", "Unknown field"), replans=MAX_REPLANS))
+    assert update["plan"][0]["status"] == "failed"
+    assert not model.calls
+
+
+def test_unparseable_replans_keep_the_patched_plan():
+    node, _ = planner("I am not sure what to do.")
+    update = asyncio.run(node.ainvoke(state_after(tool_message("identify_relevant_mongodb_collections", "oops", status="error"))))
+    assert update == {"plan": [{"id": 1, "status": "failed", "result": "oops"}]}
@@ -0,0 +1,81 @@
+from langchain_anthropic import ChatAnthropic
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_openai import ChatOpenAI
+
+from my_agent.utils.prompts import CACHE_CONTROL, for_model, layout, static_system, supports_cache_control
+from my_agent.utils.scheduler import CallScheduler, ScheduledChatModel
+
+ANTHROPIC = ChatAnthropic(model="claude-3-sonnet-20240229", api_key="unused")
+OPENAI = ChatOpenAI(model="gpt-4o", api_key="unused")
+
+
+def breakpoints(messages) -> list[tuple[int, int]]:
+    """(message, block) positions of the cache_control markers."""
+    return [
+        (i, j) for i, message in enumerate(messages) if isinstance(message.content, list)
+        for j, block in enumerate(message.content) if isinstance(block, dict) and "cache_control" in block
+    ]
+
+
+def conversation() -> list:
+    call = {"name": "execute_pymongo", "args": {"query": "db.rooms.count_documents({})"}, "id": "call_1"}
+    return [
+        static_system("You are a helpful assistant."),
+        HumanMessage(content="How many rooms are there?"),
+        AIMessage(content="", tool_calls=[call]),
+        ToolMessage(content="400", tool_call_id="call_1"),
+        AIMessage(content="There are 400 rooms."),
+        HumanMessage(content="And buildings?"),
+    ]
+
+
+def test_layout_puts_the_variable_part_last():
+    system, user = layout("Rules", "Schemas A", "Schemas B", variable="The question")
+    assert system.content == [{"type": "text", "text": "Rules", "cache_control": CACHE_CONTROL}]
+    assert [block["text"] for block in user.content] == ["Schemas A", "Schemas B", "The question"]
+    # Everything but the question is a cacheable prefix
+    assert breakpoints([system, user]) == [(0, 0), (1, 0), (1, 1)]
+
+
+def test_supports_cache_control_sees_through_bindings_and_scheduling():
+    assert supports_cache_control(ANTHROPIC)
+    assert supports_cache_control(ANTHROPIC.bind_tools([]))
+    assert not supports_cache_control(OPENAI)
+    assert not supports_cache_control(OPENAI.bind_tools([]))
+    scheduled = ScheduledChatModel(
+        model="claude-3-sonnet-20240229", models=["claude-3-sonnet-20240229", "gpt-4o"], scheduler=CallScheduler(),
+        factory=lambda name: ANTHROPIC if name.startswith("claude") else OPENAI,
+    )
+    assert supports_cache_control(scheduled)
+    assert supports_cache_control(scheduled.bind_tools([]))
+
+
+def test_anthropic_breakpoints_follow_the_system_prompt_and_the_latest_message():
+    messages = conversation()
+    marked = for_model(messages, ANTHROPIC, cache_history=True)
+    assert breakpoints(marked) == [(0, 0), (5, 0)]
+    assert marked[5].content == [{"type": "text", "text": "And buildings?", "cache_control": CACHE_CONTROL}]
+    # The history itself is not changed
+    assert breakpoints(messages) == [(0, 0)] and messages[5].content == "And buildings?"
+    assert breakpoints(for_model(messages, ANTHROPIC)) == [(0, 0)]
+
+
+def test_openai_messages_are_left_unmarked():
+    messages = conversation() + layout("Rules", "Schemas", variable="The question")
+    stripped = for_model(messages, OPENAI, cache_history=True)
+    assert breakpoints(stripped) == []
+    assert stripped[0].content == "You are a helpful assistant."
+    assert stripped[-1].content == "Schemas\n\nThe question"
+    assert stripped[1:6] == messages[1:6]
+
+
+def test_the_assistant_prompt_marks_the_history_but_not_the_plan(agent, monkeypatch):
+    state = {"messages": conversation()[1:], "plan": [{"id": 1, "description": "Count the buildings", "tool": None, "status": "pending"}]}
+    monkeypatch.setattr(agent, "llm", ANTHROPIC)
+    monkeypatch.setattr(agent, "llm_with_tools", ANTHROPIC)
+    prompt = agent._prompt(state)
+    assert isinstance(prompt[-1], SystemMessage) and "Count the buildings" in prompt[-1].content
+    assert breakpoints(prompt) == [(0, 0), (len(prompt) - 2, 0)]
+
+    monkeypatch.setattr(agent, "llm", OPENAI)
+    assert breakpoints(agent._prompt(state)) == []
@@ -0,0 +1,101 @@
+import mongomock
+import pytest
+
+from my_agent.utils.query import QueryCompiler, QueryError, execute_plan
+from my_agent.utils.schemas import load_schema_registry
+
+ACCEPTED = [
+    'db.rooms.count_documents({})',
+    'db.rooms.find({"capacity": {"$gt": 30}}, {"_id": 0, "name": 1}).sort("capacity", -1).limit(5)',
+    'db.courses.aggregate([{"$unwind": "$departments"}, {"$group": {"_id": "$departments", "n": {"$sum": 1}}}])',
+    'db.rooms.distinct("buildingDisplayName")',
+]
+REJECTED = {
+    'db.rooms.drop()': "not allowed",
+    'db.rooms.find({"$where": "sleep(1000)"})': "'$where' is not allowed",
+    'db.rooms.find({"colour": "red"})': "'colour' is not in the rooms schema",
+    'db.courses.aggregate([{"$out": "courses_copy"}])': "'$out' is not allowed",
+    '__import__("os").system("true")': "must start with db",
+    'db.rooms.find({}).limit(5000)': "exceeds the maximum",
+    'db.rooms.find({}).limit(-5)': "non-negative integer",
+    'db.rooms.find({}).limit(True)': "non-negative integer",
+    'db.rooms.find({}, limit=-5)': "non-negative integer",
+    'db.rooms.find({}, limit=5000)': "exceeds the maximum",
+    'db.rooms.find({}, limit="x")': "non-negative integer",
+    'db.rooms.find({}, skip=True)': "non-negative integer",
+    'db.rooms.count_documents({}, limit=-1)': "non-negative integer",
+    'db.rooms.aggregate([{"$lookup": {"from": "users", "localField": "name", "foreignField": "name", "as": "u"}}])': "'users' in $lookup",
+    'db.rooms.aggregate([{"$unionWith": "system.users"}])': "'system.users' in $unionWith",
+    'db.rooms.aggregate([{"$unionWith": {"coll": "secrets", "pipeline": []}}])': "'secrets' in $unionWith",
+    'db.rooms.aggregate([{"$graphLookup": {"from": "secrets", "startWith": "$name", "connectFromField": "a", "connectToField": "b", "as": "g"}}])': "'secrets' in $graphLookup",
+    'db.rooms.aggregate([{"$lookup": {"from": "courses", "pipeline": [{"$unionWith": "secrets"}], "as": "c"}}])': "'secrets' in $unionWith",
+    'db.rooms.aggregate([{"$lookup": {"from": "courses", "pipeline": [{"$merge": "courses"}], "as": "c"}}])': "'$merge' is not allowed",
+    'db.rooms.aggregate([{"$facet": {"a": [{"$lookup": {"from": "secrets", "pipeline": [], "as": "s"}}]}}])': "'secrets' in $lookup",
+    'db.rooms.aggregate([{"$match": {"$expr": {"$function": {"body": "", "args": [], "lang": "js"}}}}])': "'$function' is not allowed",
+    # Malformed drafts are QueryErrors too, so the model gets them back as feedback
+    'db.rooms.find({1: 2})': "Field names must be strings",
+    'db.rooms.find({"$or": [{1: 2}]})': "Field names must be strings",
+    'db.rooms.find({"lastEdited": ISODate("bad")})': "Invalid date",
+    'db.rooms.find({"_id": ObjectId("zz")})': "Invalid ObjectId",
+    'db.rooms.find({"capacity": NumberInt("abc")})': "Invalid NumberInt",
+    'db.rooms.find({}).sort([5])': "sort() takes",
+    'db.rooms.find({}).sort([("name",)])': "sort() takes",
+    'db.rooms.find({}).sort({1: 1})': "sort() takes",
+    'db.rooms.find({}).sort("name", 1, 2)': "sort() takes",
+    'db.rooms.find({}, sort=[5])': "sort() takes",
+}
+
+
+@pytest.fixture(scope="module")
+def compiler():
+    return QueryCompiler(load_schema_registry())
+
+
+@pytest.fixture(scope="module")
+def db():
+    db = mongomock.MongoClient().abraham_baldwin
+    db.rooms.insert_many([{"name": f"R{i}", "capacity": i % 80, "buildingDisplayName": f"B{i % 7}"} for i in range(500)])
+    db.courses.insert_many([{"name": f"C{i}", "departments": [f"D{i % 5}"]} for i in range(200)])
+    return db
+
+
+@pytest.mark.parametrize("query", ACCEPTED)
+def test_accepted_queries_match_eval(compiler, db, query):
+    expected = eval(query)
+    result = execute_plan(compiler.compile(query), db)
+    assert (list(expected) == list(result)) if hasattr(expected, "next") else expected == result
+
+
+@pytest.mark.parametrize("query, error", REJECTED.items())
+def test_rejected_queries(compiler, query, error):
+    with pytest.raises(QueryError) as raised:
+        compiler.compile(query)
+    assert error in str(raised.value)
+
+
+def test_shell_syntax(compiler):
+    plan = compiler.compile("db.rooms.find({capacity: {$gte: 30}, name: null}).sort({capacity: -1}).skip(2).limit(3)")
+    assert plan.filter == {"capacity": {"$gte": 30}, "name": None}
+    assert (plan.sort, plan.skip, plan.limit) == ([("capacity", -1)], 2, 3)
+    assert compiler.compile("db.rooms.find({}).count()").operation == "count_documents"
+    assert compiler.compile("db.rooms.findOne({})").operation == "find_one"
+
+
+def test_keyword_limit_and_skip(compiler):
+    plan = compiler.compile("db.rooms.find({}, skip=10, limit=20)")
+    assert (plan.skip, plan.limit) == (10, 20)
+    plan = compiler.compile("db.rooms.count_documents({}, limit=5)")
+    assert (plan.operation, plan.limit) == ("count_documents", 5)
+
+
+def test_known_collections_in_nested_pipelines(compiler):
+    plan = compiler.compile(
+        'db.rooms.aggregate([{"$unionWith": {"coll": "buildings", "pipeline": [{"$lookup": {"from": "rooms", "pipeline": [], "as": "r"}}]}}])'
+    )
+    assert plan.operation == "aggregate"
+    assert compiler.compile('db.rooms.aggregate([{"$unionWith": "buildings"}])').operation == "aggregate"
+
+
+def test_default_projection_uses_schema_fields(compiler):
+    plan = compiler.compile('db.rooms.find({"capacity": 30})')
+    assert plan.projection and all(compiler.registry.field("rooms", field) for field in plan.projection if field != "_id")
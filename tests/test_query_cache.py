@@ -0,0 +1,127 @@
+import mongomock
+import pytest
+
+from benchmarks.dataset import seed_database
+from my_agent.utils.query import QueryCompiler
+from my_agent.utils.query_cache import CollectionVersions, QueryResultCache, canonical_query, plan_collections
+from my_agent.utils.schemas import load_schema_registry
+
+COUNT = "db.rooms.count_documents({'capacity': {'$gte': 30}, 'online': True})"
+
+
+@pytest.fixture(scope="module")
+def compile_query(registry):
+    return QueryCompiler(registry).compile
+
+
+@pytest.fixture(scope="module")
+def registry():
+    return load_schema_registry()
+
+
+@pytest.fixture
+def db(registry):
+    """The generated dataset: of its collections, only courses has the lastEdited watermark."""
+    db = mongomock.MongoClient().abraham_baldwin
+    seed_database(db, registry, sizes={"departments": 12, "buildings": 20, "rooms": 60, "professors": 30, "courses": 80})
+    return db
+
+
+@pytest.fixture
+def cache(db):
+    cache = QueryResultCache(CollectionVersions(lambda: db, poll_interval=60), maxsize=2)
+    yield cache
+    cache.versions.stop()
+
+
+def test_canonical_query_ignores_filter_order_and_number_spelling(compile_query):
+    key = canonical_query(compile_query(COUNT))
+    assert canonical_query(compile_query("db.rooms.count_documents({'online': True, 'capacity': {'$gte': 30.0}})")) == key
+    assert canonical_query(compile_query("db.rooms.count_documents({'online': True, 'capacity': {'$gte': 31}})")) != key
+    # Sort order is part of the query
+    by_name = canonical_query(compile_query("db.rooms.find({}).sort([('capacity', 1), ('name', 1)])"))
+    assert canonical_query(compile_query("db.rooms.find({}).sort([('name', 1), ('capacity', 1)])")) != by_name
+
+
+def test_plan_collections_include_lookups(compile_query):
+    plan = compile_query("db.rooms.aggregate([{'$lookup': {'from': 'buildings', 'localField': 'building', 'foreignField': 'name', 'as': 'b'}}])")
+    assert plan_collections(plan) == ("buildings", "rooms")
+
+
+def test_results_are_cached_per_plan(cache, compile_query):
+    plan = compile_query(COUNT)
+    assert cache.get(plan) is None
+    cache.set(plan, "3", cache.stamp(plan))
+    assert cache.get(compile_query("db.rooms.count_documents({'online': True, 'capacity': {'$gte': 30}})")) == "3"
+    assert cache.get(compile_query("db.rooms.count_documents({})")) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_changed_collections_invalidate_their_entries(cache, compile_query):
+    rooms, buildings = compile_query(COUNT), compile_query("db.buildings.count_documents({})")
+    cache.set(rooms, "3", cache.stamp(rooms))
+    cache.set(buildings, "7", cache.stamp(buildings))
+    cache.invalidate("rooms")
+    assert cache.get(rooms) is None
+    assert cache.get(buildings) == "7"
+
+
+def test_results_read_before_a_change_are_stale(cache, compile_query):
+    plan = compile_query(COUNT)
+    stamp = cache.stamp(plan)
+    cache.invalidate("rooms")
+    cache.set(plan, "3", stamp)
+    assert cache.get(plan) is None
+
+
+def cached(cache, plan) -> None:
+    # A collection is watched once a lookup tracks it; its first watermark bumps it
+    cache.stamp(plan)
+    cache.versions.poll()
+    cache.set(plan, "3", cache.stamp(plan))
+    cache.versions.poll()
+    assert cache.get(plan) == "3"
+
+
+def test_polling_bumps_collections_whose_watermark_moved(cache, compile_query, db):
+    assert "lastEdited" in db.courses.find_one()
+    plan = compile_query("db.courses.count_documents({'status': 'active'})")
+    cached(cache, plan)
+    latest = db.courses.find_one(sort=[("lastEdited", -1)])["lastEdited"]
+    db.courses.update_one({}, {"$set": {"status": "inactive", "lastEdited": latest + 1}})
+    cache.versions.poll()
+    assert cache.get(plan) is None
+
+
+def test_polling_notices_in_place_updates_without_a_watermark(cache, compile_query, db):
+    assert "lastEdited" not in db.rooms.find_one()
+    plan = compile_query(COUNT)
+    cached(cache, plan)
+    db.rooms.update_one({"online": False}, {"$set": {"online": True}})
+    cache.versions.poll()
+    assert cache.get(plan) is None
+
+
+def test_collections_too_large_to_hash_are_not_cached(db, compile_query):
+    cache = QueryResultCache(CollectionVersions(lambda: db, poll_interval=60, hash_max_docs=10))
+    plan = compile_query(COUNT)
+    cache.stamp(plan)
+    cache.versions.poll()
+    cache.set(plan, "3", cache.stamp(plan))
+    assert cache.get(plan) is None
+    courses = compile_query("db.courses.count_documents({})")
+    cache.stamp(courses)
+    cache.versions.poll()
+    cache.set(courses, "80", cache.stamp(courses))
+    assert cache.get(courses) == "80"
+    cache.versions.stop()
+
+
+def test_least_recently_used_entries_are_evicted(cache, compile_query):
+    plans = [compile_query(f"db.rooms.count_documents({{'capacity': {capacity}}})") for capacity in (10, 20, 30)]
+    for plan in plans[:2]:
+        cache.set(plan, "1", cache.stamp(plan))
+    cache.get(plans[0])
+    cache.set(plans[2], "1", cache.stamp(plans[2]))
+    assert [cache.get(plan) for plan in plans] == ["1", None, "1"]
+    assert cache.stats()["size"] == 2
@@ -0,0 +1,48 @@
+import asyncio
+import json
+
+from langchain_core.messages import AIMessage
+
+from benchmarks.fakes import is_draft_prompt
+
+QUESTION = "How many rooms hold at least 30 people?"
+SCHEMAS = "rooms"
+GOOD = "db.rooms.count_documents({'capacity': {'$gte': 30}})"
+BAD = "db.rooms.drop()"
+
+
+def replies(*queries):
+    """A policy answering each query-drafting call with the next of `queries`."""
+    queries = iter(queries)
+
+    def policy(messages) -> AIMessage:
+        query = next(queries)
+        return AIMessage(content=json.dumps({"query": query}) if is_draft_prompt(messages) else query)
+
+    return policy
+
+
+def test_only_compiling_queries_are_cached(agent, chat_model):
+    model = chat_model(replies(BAD, GOOD, "unused"))
+    assert agent.create_mongodb_query(QUESTION, SCHEMAS) == BAD
+    assert agent.create_mongodb_query(QUESTION, SCHEMAS) == GOOD
+    assert agent.create_mongodb_query(QUESTION, SCHEMAS) == GOOD
+    assert len(model.calls) == 2
+
+
+def test_only_compiling_queries_are_cached_async(agent, chat_model):
+    model = chat_model(replies(BAD, GOOD, "unused"))
+
+    async def drafts():
+        return [await agent.acreate_mongodb_query(QUESTION, SCHEMAS) for _ in range(3)]
+
+    assert asyncio.run(drafts()) == [BAD, GOOD, GOOD]
+    assert len(model.calls) == 2
+
+
+def test_only_compiling_fast_path_drafts_are_cached(agent, chat_model):
+    model = chat_model(replies(BAD, GOOD, "unused"))
+    assert agent._draft_query(QUESTION, ["rooms"])[1] == BAD
+    assert asyncio.run(agent._adraft_query(QUESTION, ["rooms"]))[1] == GOOD
+    assert agent._draft_query(QUESTION, ["rooms"])[1] == GOOD
+    assert len(model.calls) == 2
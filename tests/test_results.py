@@ -0,0 +1,41 @@
+import json
+
+import mongomock
+
+from my_agent.utils.results import serialize_results
+
+BIG = {"name": "Powell 114", "capacity": 40, "notes": "x" * 5000, "campus": "Main", "log": ["entry"] * 2000}
+
+
+def test_small_documents_are_dumped_whole():
+    assert json.loads(serialize_results({"name": "Powell 114"})) == {"name": "Powell 114"}
+    assert serialize_results(47) == "47"
+
+
+def test_large_single_document_keeps_the_fields_that_fit():
+    output = serialize_results(BIG, max_bytes=1000)
+    assert len(output) <= 1000
+    assert json.loads(output) == {"name": "Powell 114", "capacity": 40, "campus": "Main", "_truncated": ["notes", "log"]}
+
+
+def test_large_single_document_respects_the_token_budget():
+    output = serialize_results(BIG, max_tokens=200)
+    assert json.loads(output)["_truncated"] == ["notes", "log"]
+
+
+def test_large_first_document_of_a_cursor_is_truncated():
+    collection = mongomock.MongoClient().db.rooms
+    collection.insert_many([{**BIG, "_id": i} for i in range(3)])
+    result = json.loads(serialize_results(collection.find(), max_bytes=1000))
+    assert result["returned"] == 1 and result["more_available"]
+    assert result["results"][0]["name"] == "Powell 114" and result["results"][0]["_truncated"] == ["notes", "log"]
+
+
+def test_cursor_stops_at_the_budget():
+    documents = [{"name": f"R{i}", "capacity": i} for i in range(100)]
+    result = json.loads(serialize_results(documents, max_docs=10))
+    assert (result["returned"], result["total"], result["more_available"]) == (10, None, True)
+    result = json.loads(serialize_results(documents, max_docs=10, count=lambda: 100))
+    assert result["total"] == 100
+    result = json.loads(serialize_results(documents[:5]))
+    assert (result["returned"], result["total"], result["more_available"]) == (5, 5, False)
@@ -0,0 +1,59 @@
+import mongomock
+import pytest
+
+from my_agent.utils.rollups import DEFAULT_ROLLUPS_PATH, RollupStore
+from my_agent.utils.schemas import load_schema_registry
+
+NOW = 1704067200
+
+
+@pytest.fixture
+def db():
+    db = mongomock.MongoClient().abraham_baldwin
+    db.courses.insert_many([
+        {"name": f"C{i}", "departments": ["Biology"], "college": "Science", "status": "active", "lastEdited": NOW - i}
+        for i in range(20)
+    ])
+    db.professors.insert_many([{"name": f"P{i}", "departments": ["Biology"], "type": "faculty", "status": "active"} for i in range(5)])
+    return db
+
+
+def store(db, **kwargs) -> RollupStore:
+    return RollupStore.from_file(DEFAULT_ROLLUPS_PATH, load_schema_registry(), lambda: db, **kwargs)
+
+
+def counts(store: RollupStore, rollup: str) -> dict:
+    return {row["group"]: row["count"] for row in store.query(rollup)}
+
+
+def test_edits_in_the_same_second_as_the_refresh_are_picked_up(db):
+    rollups = store(db, refresh_interval=float("inf"))
+    assert rollups.refresh()["courses"]["mode"] == "full"
+    # Edited after the refresh, but within the second of the latest watermark
+    db.courses.update_one({"name": "C0"}, {"$set": {"status": "inactive", "lastEdited": NOW}})
+    report = rollups.refresh("courses")["courses"]
+    assert (report["mode"], report["documents"]) == ("incremental", 1)
+    assert counts(rollups, "courses_per_status") == {"active": 19, "inactive": 1}
+    # Documents at the watermark are fetched again but not applied twice
+    assert rollups.refresh("courses")["courses"]["documents"] == 0
+    assert counts(rollups, "courses_per_status") == {"active": 19, "inactive": 1}
+
+
+def test_inserts_and_deletes_without_a_watermark_are_found(db):
+    rollups = store(db, refresh_interval=float("inf"))
+    rollups.refresh()
+    db.courses.insert_many([{"name": f"New{i}", "departments": ["Biology"], "college": "Arts", "status": "active"} for i in range(2)])
+    db.courses.delete_one({"name": "C5"})
+    rollups.refresh("courses")
+    assert counts(rollups, "courses_per_college") == {"Science": 19, "Arts": 2}
+
+
+def test_stale_full_rebuilds_run_in_the_background(db):
+    rollups = store(db, refresh_interval=0)
+    assert counts(rollups, "professors_per_type") == {"faculty": 5}
+    db.professors.insert_one({"name": "P5", "departments": ["Biology"], "type": "adjunct", "status": "active"})
+    # The stale collection is answered from the last build while it is rebuilt
+    assert counts(rollups, "professors_per_type") == {"faculty": 5}
+    rollups._rebuilding["professors"].join()
+    assert counts(rollups, "professors_per_type") == {"faculty": 5, "adjunct": 1}
+    rollups.close()
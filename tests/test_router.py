@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from my_agent.utils.router import CollectionRouter, tokenize
+from my_agent.utils.schemas import load_schema_registry
+
+LLM_ANSWER = "professors, `courses`, libraries"
+
+# Question, the router's collections, and whether it is unsure enough to ask the LLM
+ROUTES = [
+    ("How many rooms are there?", ["rooms"], False),
+    ("How many classrooms are in the science building?", ["rooms", "buildings"], False),
+    ("List the buildings on campus", ["buildings"], False),
+    ("What is the address of the library building?", ["buildings"], False),
+    ("Which rooms have a projector feature?", ["rooms"], False),
+    ("What is the capacity of room 101?", ["rooms"], False),
+    ("Show the seating capacity", ["rooms"], False),
+    ("How many professors are in the biology department?", ["professors", "departments"], False),
+    ("Show me the faculty emails", ["professors"], False),
+    ("How many courses are offered?", ["courses"], False),
+    ("List the classes with subject code BIO", ["courses"], False),
+    ("Which courses have more than three sections?", ["courses"], False),
+    ("How many departments are there?", ["departments"], False),
+    ("Who chairs the history dept?", ["departments"], False),
+    ("Which depts have an active schedule status?", ["departments"], False),
+    ("List the professors and the courses they teach", ["courses", "professors"], False),
+    ("Which rooms are in the Smith building?", ["rooms", "buildings"], False),
+    ("What floor is the chemistry lab on?", ["rooms"], False),
+    ("What is Dr. Smith's bio?", ["professors"], True),
+    ("What is the description of BIO100?", ["courses", "buildings"], True),
+    ("What is the email of the chair?", ["professors", "departments"], True),
+    ("What's the weather like today?", [], True),
+    ("How many credits is it worth?", [], True),
+]
+
+
+@pytest.fixture(scope="module")
+def router() -> CollectionRouter:
+    return CollectionRouter(load_schema_registry().schemas)
+
+
+def test_tokenize_stems_and_maps_synonyms():
+    assert tokenize("How many maxCapacity rooms do the Depts' faculties have?") == ["max", "capacity", "room", "department", "professor"]
+    assert tokenize("classrooms depts faculty classes") == ["room", "department", "professor", "course"]
+
+
+@pytest.mark.parametrize("question, collections, unsure", ROUTES, ids=[question for question, _, _ in ROUTES])
+def test_routes(router, agent, question, collections, unsure):
+    route = router.route(question)
+    # Collections that score the same come in any order
+    assert sorted(route.collections) == sorted(collections)
+    assert (route.confidence < agent.ROUTER_CONFIDENCE_THRESHOLD) == unsure
+
+
+@pytest.mark.parametrize("question, collections, unsure", ROUTES, ids=[question for question, _, _ in ROUTES])
+def test_only_unsure_routes_ask_the_llm(agent, chat_model, question, collections, unsure):
+    model = chat_model(lambda messages: AIMessage(content=LLM_ANSWER))
+    # Collections the schemas do not have are dropped from the LLM's answer
+    expected = ["professors", "courses"] if unsure else collections
+    assert sorted(agent.identify_relevant_mongodb_collections(question)) == sorted(expected)
+    assert sorted(asyncio.run(agent.aidentify_relevant_mongodb_collections(question))) == sorted(expected)
+    assert len(model.calls) == (2 if unsure else 0)
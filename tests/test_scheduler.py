@@ -0,0 +1,145 @@
+import asyncio
+import time
+
+import pytest
+
+from benchmarks.fake_llm_server import FakeLLMServer
+from my_agent.utils.models import build_chat_model
+from my_agent.utils.scheduler import AdaptiveLimiter, CallScheduler, ScheduledChatModel
+
+OPENAI, ANTHROPIC = "gpt-4o", "claude-3-sonnet-20240229"
+QUESTION = "How many rooms are there?"
+
+
+@pytest.fixture
+def servers(monkeypatch):
+    """Fake OpenAI and Anthropic servers, answering differently so failovers show."""
+    openai = FakeLLMServer(latency=0.0, reply="From OpenAI").start()
+    anthropic = FakeLLMServer(latency=0.0, reply="From Anthropic").start()
+    monkeypatch.setenv("OPENAI_BASE_URL", f"{openai.url}/v1")
+    monkeypatch.setenv("OPENAI_API_KEY", "unused")
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", anthropic.url)
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "unused")
+    yield openai, anthropic
+    openai.stop()
+    anthropic.stop()
+
+
+def scheduled(scheduler: CallScheduler, *models: str) -> ScheduledChatModel:
+    # The provider clients don't retry; the scheduler does
+    return ScheduledChatModel(
+        model=models[0], models=list(models), scheduler=scheduler,
+        factory=lambda name: build_chat_model(name, max_retries=0),
+    )
+
+
+def scheduler(**kwargs) -> CallScheduler:
+    return CallScheduler(**{"max_concurrency": 8, "backoff_base": 0.01, "backoff_max": 0.05, **kwargs})
+
+
+def test_a_429_halves_the_limit_and_fails_over(servers):
+    openai, anthropic = servers
+    openai.throttle_rate = 1.0
+    calls = scheduler()
+    assert scheduled(calls, OPENAI, ANTHROPIC).invoke(QUESTION).content == "From Anthropic"
+    stats = calls.stats()
+    assert stats[OPENAI]["limit"] == 4.0 and stats[OPENAI]["failovers"] == 1
+    assert (openai.counts["requests"], anthropic.counts["requests"]) == (1, 1)
+
+
+def test_retry_after_is_honoured_until_the_deadline(servers):
+    openai, _ = servers
+    openai.throttle_rate, openai.retry_after = 1.0, 0.3
+    calls = scheduler(max_retries=20, deadline=1.0)
+    start = time.monotonic()
+    with pytest.raises(Exception, match="Rate limit"):
+        scheduled(calls, OPENAI).invoke(QUESTION)
+    elapsed = time.monotonic() - start
+    requests = openai.counts["requests"]
+    # Every retry waited out the Retry-After, and none started after the deadline
+    assert requests >= 2 and elapsed >= 0.3 * (requests - 1)
+    assert requests <= 1 + 1.0 / 0.3
+    assert elapsed < 1.0 + 0.3
+
+
+def test_fails_over_after_consecutive_errors(servers):
+    openai, anthropic = servers
+    openai.error_rate = 1.0
+    calls = scheduler(failover_after=2)
+    assert asyncio.run(scheduled(calls, OPENAI, ANTHROPIC).ainvoke(QUESTION)).content == "From Anthropic"
+    assert (openai.counts["errors"], anthropic.counts["requests"]) == (2, 1)
+    assert calls.stats()[OPENAI]["limit"] == 8.0
+
+
+def test_streams_fail_over_before_their_first_chunk(servers):
+    openai, _ = servers
+    openai.throttle_rate = 1.0
+    chunks = [chunk.content for chunk in scheduled(scheduler(), OPENAI, ANTHROPIC).stream(QUESTION)]
+    assert "".join(chunks) == "From Anthropic"
+
+
+def test_streams_are_not_retried_after_their_first_chunk():
+    calls, requests = scheduler(), []
+
+    def broken():
+        requests.append(OPENAI)
+        yield "From"
+        raise ConnectionError("stream cut")
+
+    received = []
+    with pytest.raises(ConnectionError):
+        for chunk in calls.stream([(OPENAI, broken), (ANTHROPIC, lambda: iter(["From Anthropic"]))]):
+            received.append(chunk)
+    assert received == ["From"] and requests == [OPENAI]
+    assert calls.stats()[OPENAI]["in_flight"] == 0
+
+
+def test_requests_are_hedged_only_after_enough_latencies(servers):
+    openai, _ = servers
+    calls = scheduler(hedge=True, hedge_min_samples=3)
+    model = scheduled(calls, OPENAI)
+    openai.latency = 0.2
+    for _ in range(2):
+        model.invoke(QUESTION)
+    assert "hedges" not in calls.stats()[OPENAI]
+    # Enough fast requests that the slow ones are beyond the p95
+    openai.latency = 0.0
+    for _ in range(60):
+        model.invoke(QUESTION)
+    # A fast request delayed past the p95 on a busy machine is hedged too
+    hedges = calls.stats()[OPENAI].get("hedges", 0)
+    openai.latency = 0.2
+    assert model.invoke(QUESTION).content == "From OpenAI"
+    assert calls.stats()[OPENAI]["hedges"] == hedges + 1
+
+
+def test_a_waiter_cancelled_after_its_handoff_returns_the_slot():
+    async def scenario():
+        limiter = AdaptiveLimiter(1)
+        await limiter.aacquire()
+        waiter = asyncio.ensure_future(limiter.aacquire())
+        await asyncio.sleep(0)
+        # The slot is handed over to the waiter, which is cancelled before it resumes
+        limiter.release()
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return limiter.in_flight, limiter.try_acquire()
+
+    assert asyncio.run(scenario()) == (0, True)
+
+
+def test_a_waiter_cancelled_while_queued_takes_no_slot():
+    async def scenario():
+        limiter = AdaptiveLimiter(1)
+        await limiter.aacquire()
+        waiter = asyncio.ensure_future(limiter.aacquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        limiter.release()
+        return limiter.in_flight, limiter.try_acquire()
+
+    assert asyncio.run(scenario()) == (0, True)
@@ -0,0 +1,24 @@
+from my_agent.utils.schemas import SchemaRegistry, load_schema_registry
+
+
+def test_render_drops_unknown_and_repeated_collections():
+    registry = load_schema_registry()
+    expected = registry.render(["rooms", "buildings"])
+    assert registry.render(["rooms", "nope", "buildings", "rooms"]) == expected
+    assert registry.render(["nope"]) == "[]"
+    assert len(registry._renderings) == 2
+
+
+def test_render_cache_is_bounded():
+    registry = SchemaRegistry(load_schema_registry().schemas, cache_size=4)
+    for i in range(100):
+        registry.render(["rooms", f"made_up_{i}"])
+        registry.render(["courses"], fmt="table")
+    assert len(registry._renderings) <= 4
+    assert registry.render(["rooms"]) == registry.render(["rooms", "rooms"])
+
+
+def test_render_keeps_the_requested_order():
+    registry = load_schema_registry()
+    assert registry.render(["rooms", "buildings"]) != registry.render(["buildings", "rooms"])
+    assert registry.render() == registry.render(registry.collections)
@@ -0,0 +1,79 @@
+import asyncio
+import json
+
+import pytest
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from benchmarks.fakes import is_agent_prompt, is_draft_prompt, pipeline_policy
+
+QUERY = "db.rooms.find({})"
+QUESTION = {"messages": [("user", "Which rooms are there?")]}
+ANSWER = "The university has many rooms."
+
+
+def policy():
+    """Walks the pipeline for a query returning more than one batch of rooms, then answers."""
+    steps = pipeline_policy()
+
+    def respond(messages) -> AIMessage:
+        if is_draft_prompt(messages):
+            return AIMessage(content=json.dumps({"query": QUERY}))
+        message = steps(messages)
+        for call in message.tool_calls:
+            if call["name"] == "execute_pymongo":
+                call["args"] = {"query": QUERY}
+        if is_agent_prompt(messages) and not message.tool_calls:
+            return AIMessage(content=ANSWER)
+        return message
+
+    return respond
+
+
+def stream(graph, mode, asynchronous: bool) -> list:
+    if not asynchronous:
+        return list(graph.stream(QUESTION, stream_mode=mode))
+
+    async def collect():
+        return [part async for part in graph.astream(QUESTION, stream_mode=mode)]
+
+    return asyncio.run(collect())
+
+
+@pytest.fixture
+def graph(agent, chat_model):
+    chat_model(policy())
+    agent.tenants.default.query_cache.clear()
+    return agent.builder.compile()
+
+
+@pytest.mark.parametrize("fast_path", [False, True])
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_query_progress_is_streamed_on_the_custom_mode(agent, graph, monkeypatch, fast_path, asynchronous):
+    monkeypatch.setattr(agent, "FAST_PATH", fast_path)
+    events = [event for event in stream(graph, "custom", asynchronous) if event["event"] != "fast_path_drafted"]
+    assert events[0] == {"event": "query_compiled", "collection": "rooms", "operation": "find"}
+    fetched = [event for event in events if event["event"] == "documents_fetched"]
+    assert [event["count"] for event in fetched] == [10, 20, 30, 40, 50, 50]
+    assert [event["done"] for event in fetched] == [False] * 5 + [True]
+    # Only the first batch is sent, for the client to show while the rest is read
+    assert [i for i, event in enumerate(fetched) if "partial_results" in event] == [0]
+    assert len(json.loads(fetched[0]["partial_results"])) == 10
+
+    # The same query again is answered from the query cache
+    events = [event for event in stream(graph, "custom", asynchronous) if event["event"] != "fast_path_drafted"]
+    assert events == [
+        {"event": "query_compiled", "collection": "rooms", "operation": "find"},
+        {"event": "query_cached", "collection": "rooms"},
+    ]
+
+
+@pytest.mark.parametrize("fast_path", [False, True])
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_only_the_assistant_streams_tokens(agent, graph, monkeypatch, fast_path, asynchronous):
+    monkeypatch.setattr(agent, "FAST_PATH", fast_path)
+    parts = stream(graph, "messages", asynchronous)
+    chunks = [(chunk, metadata["langgraph_node"]) for chunk, metadata in parts if isinstance(chunk, AIMessageChunk)]
+    # Routing, drafting, query writing and planning calls are tagged nostream
+    assert {node for _, node in chunks} == {"assistant"}
+    assert "".join(chunk.content for chunk, _ in chunks).endswith(ANSWER)
+    assert not any("db.rooms" in str(chunk.content) for chunk, _ in chunks)
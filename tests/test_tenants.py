@@ -0,0 +1,74 @@
+import json
+
+import mongomock
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from my_agent.utils.query import QueryCompiler
+from my_agent.utils.rollups import Rollup, RollupStore
+from my_agent.utils.router import CollectionRouter
+from my_agent.utils.schemas import load_schema_registry
+from my_agent.utils.tenants import TenantPool
+
+
+def pool(client, **kwargs) -> TenantPool:
+    registry = load_schema_registry()
+    return TenantPool(
+        registry, QueryCompiler(registry), CollectionRouter(registry.schemas), connect=lambda database: client, **kwargs
+    )
+
+
+def test_only_the_default_database_without_an_allow_list(client):
+    tenants = pool(client, allowed=())
+    assert tenants.get() is tenants.default
+    assert tenants.get(tenants.default.database) is tenants.default
+    with pytest.raises(ValueError, match="Unknown database"):
+        tenants.get("other_university")
+
+
+def test_allow_list(client):
+    tenants = pool(client, allowed=["valdosta_state"])
+    assert tenants.get("valdosta_state").database == "valdosta_state"
+    with pytest.raises(ValueError, match="Unknown database"):
+        tenants.get("other_university")
+    tenants.close()
+
+
+@pytest.mark.parametrize("database", ["admin", "local", "config"])
+def test_system_databases_are_refused_even_with_any(client, database):
+    with pytest.raises(ValueError, match="Unknown database"):
+        pool(client, allowed=["*", database]).get(database)
+
+
+@pytest.mark.parametrize("database", ["a.b", "../x", "with space", "x" * 64])
+def test_invalid_names_are_refused(client, database):
+    with pytest.raises(ValueError, match="Invalid database name"):
+        pool(client, allowed=["*"]).get(database)
+
+
+def test_least_recently_used_tenants_are_evicted(client):
+    tenants = pool(client, allowed=["*"], maxsize=2)
+    first = tenants.get("inst_1")
+    tenants.get("inst_2")
+    tenants.get("inst_1")
+    tenants.get("inst_3")
+    stats = tenants.stats()
+    assert (stats["open"], stats["evicted"]) == (2, 1)
+    assert set(stats["tenants"]) == {tenants.default.database, "inst_1", "inst_3"}
+    assert tenants.get("inst_1") is first
+    tenants.close()
+
+
+def test_materialized_statistics_reads_the_rollups_of_the_runs_tenant(client, agent, monkeypatch):
+    monkeypatch.setattr(agent, "tenants", pool(client, allowed=["inst_1"]))
+    db = mongomock.MongoClient().inst_1
+    db.rooms.insert_many([{"name": f"R{i}", "floor": i % 2} for i in range(5)])
+    # A rollup only this tenant has
+    agent.tenants.get("inst_1")._rollup_store = RollupStore([Rollup("rooms_per_floor", "rooms", "floor")], lambda: db)
+    statistics = RunnableLambda(lambda args: agent.materialized_statistics(**args))
+
+    result = json.loads(statistics.invoke({"rollup": "rooms_per_floor"}, {"configurable": {"database": "inst_1"}}))
+    assert result["group_by"] == "floor"
+    assert {group["group"]: group["count"] for group in result["groups"]} == {0: 3, 1: 2}
+    assert statistics.invoke({"rollup": "rooms_per_floor"}).startswith("Unknown rollup")
+    agent.tenants.close()